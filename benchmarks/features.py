@@ -0,0 +1,86 @@
+"""
+benchmark the per frame computation of the feature modules
+
+generates a synthetic pose file with synthetic static objects and times
+per_frame() of each base and landmark feature module for one identity. The
+quantities shared between feature modules (scaled poses, bearings, convex
+hulls) are computed before timing, so each time is for the feature module
+itself. Run from the root of the repository:
+
+    python -m benchmarks.features --frames 108000 --features food_hopper
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import src.pose_estimation
+from src.feature_extraction.base_features import BaseFeatureGroup
+from src.feature_extraction.landmark_features.corner import \
+    BearingToCorner, CornerDistanceInfo, DistanceToCorner
+from src.feature_extraction.landmark_features.food_hopper import FoodHopper
+from src.feature_extraction.landmark_features.lixit import DistanceToLixit
+from benchmarks.pose_open import write_v4_pose_file
+
+
+def main():
+    feature_classes = {
+        **BaseFeatureGroup._features,
+        DistanceToCorner.name(): DistanceToCorner,
+        BearingToCorner.name(): BearingToCorner,
+        DistanceToLixit.name(): DistanceToLixit,
+        FoodHopper.name(): FoodHopper,
+    }
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=108000,
+                        help="number of frames in the synthetic pose file")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="number of times to compute each feature")
+    parser.add_argument('--features', nargs='+', choices=feature_classes,
+                        default=list(feature_classes),
+                        help="feature modules to time, defaults to all")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'benchmark_pose_est_v4.h5'
+        write_v4_pose_file(path, args.frames, 1)
+        pose_est = src.pose_estimation.open_pose_file(path)
+
+    # static objects in the same (y, x) pixel coordinates as the poses
+    pose_est.static_objects['corners'] = np.asarray(
+        [[51, 67], [55, 777], [763, 69], [760, 777]], dtype=np.uint16)
+    pose_est.static_objects['lixit'] = np.asarray([[62, 166]], dtype=np.uint16)
+    pose_est.static_objects['food_hopper'] = np.asarray(
+        [[7, 291], [7, 528], [44, 296], [44, 518]], dtype=np.uint16)
+
+    identity = 0
+    pixel_scale = 1.0
+    pose_est.get_identity_poses(identity, pixel_scale)
+    pose_est.compute_all_bearings(identity)
+    pose_est.get_identity_hull_centroids(identity)
+
+    print(f"per frame features for a {args.frames} frame identity "
+          f"(best of {args.repeat} runs)")
+    for name in args.features:
+        times = []
+        for _ in range(args.repeat):
+            # the corner features need the corner distances, which are
+            # cached so create new ones for each run
+            if name in [DistanceToCorner.name(), BearingToCorner.name()]:
+                feature = feature_classes[name](
+                    pose_est, pixel_scale,
+                    CornerDistanceInfo(pose_est, pixel_scale))
+            else:
+                feature = feature_classes[name](pose_est, pixel_scale)
+            start = time.perf_counter()
+            feature.per_frame(identity)
+            times.append(time.perf_counter() - start)
+        print(f"  {name:<32} {min(times):.4f}s  mean: {np.mean(times):.4f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+benchmark the time to open a pose file without a cache directory
+
+generates a synthetic pose file with the requested number of frames and
+identities and times open_pose_file on it. Run from the root of the
+repository:
+
+    python -m benchmarks.pose_open --frames 108000 --identities 4
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+import src.pose_estimation
+
+
+def write_v4_pose_file(path: Path, num_frames: int, num_identities: int,
+                       seed: int = 0):
+    """
+    write a synthetic v4 pose file. Each identity is assigned to a random
+    instance slot in each frame, identities are sometimes missing, and some
+    keypoints have zero confidence
+    """
+    rng = np.random.default_rng(seed)
+    max_instances = num_identities + 1
+    num_keypoints = len(src.pose_estimation.PoseEstimation.KeypointIndex)
+
+    points = rng.integers(0, 800, (num_frames, max_instances, num_keypoints, 2),
+                          dtype=np.uint16)
+    confidence = rng.random((num_frames, max_instances, num_keypoints),
+                            dtype=np.float32)
+    confidence[confidence < 0.1] = 0
+
+    id_mask = np.ones((num_frames, max_instances), dtype=np.uint8)
+    instance_embed_id = np.zeros((num_frames, max_instances), dtype=np.uint32)
+    slots = rng.permuted(
+        np.tile(np.arange(max_instances), (num_frames, 1)), axis=1)
+    for identity in range(num_identities):
+        present = rng.random(num_frames) > 0.05
+        frames = np.flatnonzero(present)
+        id_mask[frames, slots[frames, identity]] = 0
+        instance_embed_id[frames, slots[frames, identity]] = identity + 1
+
+    with h5py.File(path, 'w') as pose_h5:
+        group = pose_h5.create_group('poseest')
+        group.attrs['version'] = np.array([4, 0], dtype=np.uint16)
+        group.create_dataset('points', data=points)
+        group.create_dataset('confidence', data=confidence)
+        group.create_dataset('id_mask', data=id_mask)
+        group.create_dataset('instance_embed_id', data=instance_embed_id)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=108000,
+                        help="number of frames in the synthetic pose file")
+    parser.add_argument('--identities', type=int, default=4,
+                        help="number of identities in the synthetic pose file")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="number of times to open the pose file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'benchmark_pose_est_v4.h5'
+        write_v4_pose_file(path, args.frames, args.identities)
+
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            pose_est = src.pose_estimation.open_pose_file(path)
+            times.append(time.perf_counter() - start)
+
+    print(f"opened {args.frames} frame, {pose_est.num_identities} identity "
+          f"v4 pose file without cache")
+    print(f"  best: {min(times):.3f}s  mean: {np.mean(times):.3f}s "
+          f"({args.repeat} runs)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 
 import argparse
+import json
+import pickle
 import re
 import sys
 import typing
@@ -11,15 +13,26 @@ import numpy as np
 from src import APP_NAME
 from src.classifier import Classifier, ClassifierType
 from src.cli import cli_progress_bar
+from src.feature_extraction import FeatureStore
 from src.feature_extraction.features import IdentityFeatures
 from src.pose_estimation import open_pose_file
 from src.project import Project, load_training_data, ProjectDistanceUnit
 
 DEFAULT_FPS = 30
 
+# number of frames classified at once
+CLASSIFY_CHUNK_SIZE = 2 ** 16
+
 # find out which classifiers are supported in this environment
 __CLASSIFIER_CHOICES = Classifier().classifier_choices()
 
+# errors raised when loading a file that is not a classifier, or a classifier
+# that can't be loaded in this environment. Classifier.load() raises a
+# ValueError for pickles that aren't a supported classifier, the others come
+# from unpickling
+_LOAD_ERRORS = (ValueError, OSError, EOFError, LookupError,
+                pickle.UnpicklingError, AttributeError, ImportError)
+
 
 def get_pose_stem(pose_path: Path):
     """
@@ -57,19 +70,104 @@ def train_and_classify(
 def classify_pose(classifier: Classifier, input_pose_file: Path, out_dir: Path,
                   behavior: str, window_size: int, use_social: bool,
                   fps=DEFAULT_FPS, feature_dir: typing.Optional[str] = None):
+    _classify_pose([{
+        'classifier': classifier,
+        'behavior': behavior,
+        'window_size': window_size,
+        'use_social': use_social
+    }], input_pose_file, out_dir, fps, feature_dir)
+
+
+def classify_pose_batch(classifiers: typing.List[Classifier],
+                        input_pose_file: Path, out_dir: Path,
+                        fps=DEFAULT_FPS,
+                        feature_dir: typing.Optional[str] = None):
+    """
+    classify a pose file with several trained classifiers. The pose file is
+    opened once, and classifiers that use the same window size, social
+    features, extended features and distance unit share one feature matrix
+    per identity, so the features are only computed or loaded once for them
+    :param classifiers: trained classifiers, each for a different behavior
+    :param input_pose_file: pose file to classify
+    :param out_dir: output directory, predictions for each behavior are
+    written to a subdirectory named for the behavior
+    :param fps: frames per second of the video
+    :param feature_dir: optional feature cache directory
+    :return: None
+    """
+    _classify_pose([{
+        'classifier': classifier,
+        'behavior': classifier.behavior_name,
+        'window_size': classifier.window_size,
+        'use_social': classifier.uses_social
+    } for classifier in classifiers], input_pose_file, out_dir, fps,
+        feature_dir)
+
+
+def _classify_pose(jobs: typing.List[dict], input_pose_file: Path,
+                   out_dir: Path, fps, feature_dir: typing.Optional[str]):
+    """
+    classify a pose file for each job, a dict with the classifier and the
+    behavior, window size and use_social to classify with
+    """
     pose_est = open_pose_file(input_pose_file)
     pose_stem = get_pose_stem(input_pose_file)
 
-    # allocate numpy arrays to write to h5 file
-    prediction_labels = np.full(
-        (pose_est.num_identities, pose_est.num_frames), -1,
-        dtype=np.int8)
-    prediction_prob = np.zeros_like(prediction_labels, dtype=np.float32)
+    # group the jobs that can share a feature matrix
+    groups = {}
+    for job in jobs:
+        classifier = job['classifier']
+        key = (job['window_size'], job['use_social'],
+               json.dumps(classifier.extended_features, sort_keys=True),
+               classifier.distance_unit)
+        groups.setdefault(key, []).append(job)
+
+    predictions = []
+    for group_jobs in groups.values():
+        group_predictions = _classify_group(group_jobs, pose_est,
+                                            input_pose_file, fps, feature_dir)
+        if group_predictions is not None:
+            predictions.extend(group_predictions)
+
+    if not predictions:
+        return
+
+    print(f"Writing predictions to {out_dir}")
+
+    for behavior, prediction_labels, prediction_prob in predictions:
+        behavior_out_dir = out_dir / Project.to_safe_name(behavior)
+        try:
+            behavior_out_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            sys.exit(f"Unable to create output directory: {e}")
+        behavior_out_path = behavior_out_dir / (pose_stem + '.h5')
+
+        Project.write_predictions(
+            behavior_out_path,
+            prediction_labels,
+            prediction_prob,
+            pose_est
+        )
+
+
+def _classify_group(jobs: typing.List[dict], pose_est, input_pose_file: Path,
+                    fps, feature_dir: typing.Optional[str]):
+    """
+    classify a pose file with classifiers that share the same feature
+    settings
+    :return: list of (behavior, prediction labels, prediction probabilities)
+    for each job, or None if the pose file doesn't support the features used
+    by the classifiers
+    """
+    classifier = jobs[0]['classifier']
+    window_size = jobs[0]['window_size']
+    use_social = jobs[0]['use_social']
+    behaviors = ', '.join(job['behavior'] for job in jobs)
 
     if use_social and pose_est.format_major_version < 3:
-        print(f"Skipping {input_pose_file}")
+        print(f"Skipping {input_pose_file} for {behaviors}")
         print("  classifier requires v3 or higher pose files")
-        return
+        return None
 
     # make sure the pose file supports all required extended features
     supported_features = IdentityFeatures.get_available_extended_features(
@@ -84,67 +182,122 @@ def classify_pose(classifier: Classifier, input_pose_file: Path, out_dir: Path,
                 if f not in supported_features[group]:
                     extended_feature_check_ok = False
     if not extended_feature_check_ok:
-        print(f"Skipping {input_pose_file}")
+        print(f"Skipping {input_pose_file} for {behaviors}")
         print("  pose file does not support all required features")
-        return
+        return None
 
     distance_scale_factor = 1.0
     if classifier.distance_unit == ProjectDistanceUnit.CM:
         if pose_est.cm_per_pixel is None:
-            print(f"Skipping {input_pose_file}")
+            print(f"Skipping {input_pose_file} for {behaviors}")
             print("  classifier uses cm distance units but pose file does not have cm_per_pixel attribute")
-            return
+            return None
         else:
             distance_scale_factor = pose_est.cm_per_pixel
 
     print(f"Classifying {input_pose_file}...")
+    if len(jobs) > 1:
+        print(f"  Behaviors: {behaviors}")
+
+    # allocate numpy arrays to write to h5 file
+    prediction_labels = np.full(
+        (len(jobs), pose_est.num_identities, pose_est.num_frames), -1,
+        dtype=np.int8)
+    prediction_prob = np.zeros_like(prediction_labels, dtype=np.float32)
+
+    # features of every identity are kept in a single feature store for the
+    # pose file when there is a feature directory
+    store = None
+    if feature_dir is not None:
+        store = FeatureStore.for_video(feature_dir, input_pose_file)
 
     # run prediction for each identity
     for curr_id in pose_est.identities:
         cli_progress_bar(curr_id, len(pose_est.identities),
                          complete_as_percent=False, suffix='identities')
 
-        features = IdentityFeatures(
+        identity_features = IdentityFeatures(
             input_pose_file, curr_id, feature_dir, pose_est, fps=fps,
             distance_scale_factor=distance_scale_factor,
             extended_features=classifier.extended_features
-        ).get_features(window_size, use_social)
-
-        data = Classifier.combine_data(
-            features['per_frame'],
-            features['window']
         )
 
-        if data.shape[0] > 0:
-            pred = classifier.predict(data)
-            pred_prob = classifier.predict_proba(data)
-
-            # Keep the probability for the predicted class only.
-            # The following code uses some
-            # numpy magic to use the pred array as column indexes
-            # for each row of the pred_prob array we just computed.
-            pred_prob = pred_prob[np.arange(len(pred_prob)), pred]
-
-            prediction_labels[curr_id, features['frame_indexes']] = pred
-            prediction_prob[curr_id, features['frame_indexes']] = pred_prob
+        # classify in chunks of frames so long videos don't need the feature
+        # matrix for the whole video in memory. With a feature directory, the
+        # chunks are read from the video's feature store. Every classifier
+        # classifies each chunk while it is in memory
+        for features in identity_features.iter_feature_matrix(
+                window_size, use_social, store, CLASSIFY_CHUNK_SIZE):
+            # the chunks are float32, which the tree based classifiers all
+            # predict from, so the classifiers don't convert them again
+            chunk = features['data']
+            frame_indexes = features['frame_indexes']
+
+            for i, job in enumerate(jobs):
+                # the predicted class and the probability of the predicted
+                # class from one evaluation of the classifier
+                pred, pred_prob = job['classifier'].predict_with_probability(
+                    chunk)
+
+                prediction_labels[i, curr_id, frame_indexes] = pred
+                prediction_prob[i, curr_id, frame_indexes] = pred_prob
     cli_progress_bar(len(pose_est.identities), len(pose_est.identities),
                      complete_as_percent=False, suffix='identities')
 
-    print(f"Writing predictions to {out_dir}")
+    return [(job['behavior'], prediction_labels[i], prediction_prob[i])
+            for i, job in enumerate(jobs)]
+
+
+def load_classifiers(paths: typing.List[Path]) -> typing.List[Classifier]:
+    """
+    load trained classifiers
+    :param paths: classifier files, or directories of classifier files.
+    Files in a directory that can't be loaded as classifiers are skipped,
+    with a message saying why
+    :return: list of classifiers
+    """
+    classifiers = []
+    for path in paths:
+        if path.is_dir():
+            for classifier_path in sorted(p for p in path.iterdir()
+                                          if p.is_file()):
+                try:
+                    classifiers.append(_load_classifier(classifier_path))
+                except _LOAD_ERRORS as e:
+                    print(f"Skipping {classifier_path}: unable to load "
+                          f"classifier ({type(e).__name__}: {e})")
+        else:
+            try:
+                classifiers.append(_load_classifier(path))
+            except _LOAD_ERRORS as e:
+                print(f"Unable to load classifier from {path}:")
+                sys.exit(e)
+    return classifiers
 
-    behavior_out_dir = out_dir / Project.to_safe_name(behavior)
+
+def _load_classifier(path: Path) -> Classifier:
+    classifier = Classifier()
+    classifier.load(path)
+
+    print(f"Classifying using trained classifier: {path}")
     try:
-        behavior_out_dir.mkdir(parents=True, exist_ok=True)
-    except OSError as e:
-        sys.exit(f"Unable to create output directory: {e}")
-    behavior_out_path = behavior_out_dir / (pose_stem + '.h5')
-
-    Project.write_predictions(
-        behavior_out_path,
-        prediction_labels,
-        prediction_prob,
-        pose_est
-    )
+        print(
+            f"  Classifier type: {__CLASSIFIER_CHOICES[classifier.classifier_type]}")
+    except KeyError:
+        sys.exit("Error: Classifier type not supported on this platform")
+    print(f"  Behavior: {classifier.behavior_name}")
+    print(f"  Window Size: {classifier.window_size}")
+    print(f"  Social: {classifier.uses_social}")
+    print(f"  Distance Unit: {classifier.distance_unit.name}")
+    return classifier
+
+
+def threshold_type(x):
+    x = float(x)
+    if not 0 <= x <= 1:
+        raise argparse.ArgumentTypeError(
+            "threshold must be between 0 and 1")
+    return x
 
 
 def train(
@@ -247,12 +400,15 @@ def classify_main():
     training_group.add_argument(
         '--training', help=f'Training data h5 file exported from {APP_NAME}')
     training_group.add_argument(
-        '--classifier',
-        help=f'Classifier file produced from the `{script_name()} train` command')
+        '--classifier', nargs='+',
+        help=f'Classifier file produced from the `{script_name()} train` '
+             'command. Multiple classifier files, or directories of '
+             'classifier files, can be given to classify several behaviors '
+             'with one pass over each pose file')
 
     required_args.add_argument(
-        '--input-pose',
-        help='input HDF5 pose file (v2, v3, or v4).',
+        '--input-pose', nargs='+',
+        help='input HDF5 pose file(s) (v2, v3, or v4).',
         required=True,
     )
     required_args.add_argument(
@@ -271,43 +427,45 @@ def classify_main():
         help="Feature cache dir. If present, look here for features before "
         "computing. If features need to be computed, they will be saved here."
     )
+    parser.add_argument(
+        '--threshold',
+        help="minimum probability of the behavior for a frame to be "
+             "classified as the behavior, overrides the threshold saved with "
+             f"the classifier. default={Classifier.DEFAULT_THRESHOLD}",
+        type=threshold_type
+    )
 
     args = parser.parse_args(classify_args)
 
     out_dir = Path(args.out_dir)
-    in_pose_path = Path(args.input_pose)
+    in_pose_paths = [Path(p) for p in args.input_pose]
 
     if args.training is not None:
-        train_and_classify(Path(args.training), in_pose_path, out_dir,
-                           override_classifier=args.classifier,
-                           fps=args.fps, feature_dir=args.feature_dir)
+        # train once, then classify every pose file
+        classifier = train(Path(args.training), args.classifier_type)
+        if args.threshold is not None:
+            classifier.threshold = args.threshold
+        for in_pose_path in in_pose_paths:
+            classify_pose_batch([classifier], in_pose_path, out_dir,
+                                fps=args.fps, feature_dir=args.feature_dir)
     elif args.classifier is not None:
-
-        try:
-            classifier = Classifier()
-            classifier.load(Path(args.classifier))
-        except ValueError as e:
-            print(f"Unable to load classifier from {args.classifier}:")
-            sys.exit(e)
-
-        behavior = classifier.behavior_name
-        window_size = classifier.window_size
-        use_social = classifier.uses_social
-        distance_unit = classifier.distance_unit
-
-        print(f"Classifying using trained classifier: {args.classifier}")
-        try:
-            print(
-                f"  Classifier type: {__CLASSIFIER_CHOICES[classifier.classifier_type]}")
-        except KeyError:
-            sys.exit("Error: Classifier type not supported on this platform")
-        print(f"  Behavior: {behavior}")
-        print(f"  Window Size: {window_size}")
-        print(f"  Social: {use_social}")
-        print(f"  Distance Unit: {distance_unit.name}")
-
-        classify_pose(classifier, in_pose_path, out_dir, behavior, window_size,
-                      use_social, fps=args.fps, feature_dir=args.feature_dir)
+        classifiers = load_classifiers([Path(p) for p in args.classifier])
+        if not classifiers:
+            sys.exit("Error: no classifiers found")
+
+        behaviors = [c.behavior_name for c in classifiers]
+        duplicates = sorted({b for b in behaviors if behaviors.count(b) > 1})
+        if duplicates:
+            sys.exit("Error: more than one classifier for behavior(s): "
+                     f"{', '.join(duplicates)}")
+
+        if args.threshold is not None:
+            for classifier in classifiers:
+                classifier.threshold = args.threshold
+
+        for pose_path in in_pose_paths:
+            classify_pose_batch(classifiers, pose_path, out_dir,
+                                fps=args.fps, feature_dir=args.feature_dir)
 
 
 def train_main():
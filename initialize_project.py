@@ -22,7 +22,14 @@ DEFAULT_WINDOW_SIZE = 5
 
 
 def generate_files_worker(params: dict):
-    """ worker function used for generating project feature and cache files """
+    """
+    worker function used for generating project feature and cache files
+
+    features are generated for all identities of a video by the same worker,
+    so the pose file is only opened once and the social features can share
+    the distances between identities that are computed for the video
+    :return: number of identities processed
+    """
     project = params['project']
     pose_est = project.load_pose_est(
         project.video_path(params['video']))
@@ -32,29 +39,28 @@ def generate_files_worker(params: dict):
     else:
         distance_scale_factor = pose_est.cm_per_pixel
 
-    features = src.feature_extraction.IdentityFeatures(
-        params['video'], params['identity'], project.feature_dir, pose_est,
-        force=params['force'], distance_scale_factor=distance_scale_factor,
-        extended_features=project.extended_features
-    )
-
-    # unlike per frame features, window features are not automatically
-    # generated when opening the file. They are computed as needed based
-    # on the requested window size. Force each window size to be
-    # pre-computed by fetching it
-    for w in params['window_sizes']:
-
-        # get the social features if they are supported, although this doesn't
-        # matter with current implementation, as they are always computed if
-        # the file supports them, they are just not included in the returned
-        # features if this param is false
-        use_social = pose_est.format_major_version > 2
-        _ = features.get_window_features(w, use_social,
-                                         force=params['force'])
+    for identity in pose_est.identities:
+        features = src.feature_extraction.IdentityFeatures(
+            params['video'], identity, project.feature_dir, pose_est,
+            force=params['force'], distance_scale_factor=distance_scale_factor,
+            extended_features=project.extended_features
+        )
+
+        # unlike per frame features, window features are not automatically
+        # generated when opening the file. They are computed as needed based
+        # on the requested window size. Force each window size to be
+        # pre-computed and saved. All window sizes are computed together, in
+        # chunks of frames, so the work shared between window sizes is only
+        # done once and long videos don't need all the window features in
+        # memory at once
+        features.cache_window_features(params['window_sizes'],
+                                       force=params['force'])
 
     for identity in pose_est.identities:
         _ = pose_est.get_identity_convex_hulls(identity)
 
+    return len(pose_est.identities)
+
 
 def validate_video_worker(params: dict):
     """ worker function for validating project video """
@@ -211,16 +217,13 @@ def main():
     def feature_job_producer():
         """ producer for Pool.imap_unordered """
         for video in project.videos:
-            for identity in project.load_pose_est(
-                    project.video_path(video)).identities:
-                yield ({
-                    'video': video,
-                    'identity': identity,
-                    'project': project,
-                    'force': args.force,
-                    'window_sizes': window_sizes,
-                    'force_pixel_distance': args.force_pixel_distances
-                })
+            yield ({
+                'video': video,
+                'project': project,
+                'force': args.force,
+                'window_sizes': window_sizes,
+                'force_pixel_distance': args.force_pixel_distances
+            })
 
     # print the initial progress bar with 0% complete
     cli_progress_bar(0, total_identities,
@@ -228,9 +231,10 @@ def main():
 
     # compute features in parallel
     complete = 0
-    for _ in pool.imap_unordered(generate_files_worker, feature_job_producer()):
+    for num_identities in pool.imap_unordered(generate_files_worker,
+                                              feature_job_producer()):
         # update progress bar
-        complete += 1
+        complete += num_identities
         cli_progress_bar(complete, total_identities,
                          prefix=" Computing Features: ")
 
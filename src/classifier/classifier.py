@@ -1,3 +1,4 @@
+import math
 import random
 import typing
 from enum import IntEnum
@@ -15,8 +16,9 @@ from sklearn.metrics import (
     precision_recall_fscore_support,
     confusion_matrix
 )
-from sklearn.model_selection import train_test_split, LeaveOneGroupOut
+from sklearn.model_selection import train_test_split
 
+import src.feature_extraction as fe
 from src.project import TrackLabels
 from src.project import ProjectDistanceUnit
 
@@ -50,6 +52,20 @@ except Exception:
 class Classifier:
     LABEL_THRESHOLD = 20
 
+    # largest fraction of the training data that can change since a
+    # classifier was trained for train(warm_start=True) to update the trained
+    # estimator instead of training a new one
+    WARM_START_MAX_CHANGE = 0.1
+
+    # default minimum probability of the behavior class for a frame to be
+    # classified as the behavior
+    DEFAULT_THRESHOLD = 0.5
+
+    # number of boosting rounds of a new XGBoost classifier (the XGBoost
+    # default), a classifier updated past twice as many rounds is trained
+    # again from scratch
+    _XGBOOST_ROUNDS = 100
+
     _classifier_names = {
         ClassifierType.RANDOM_FOREST: "Random Forest",
         ClassifierType.GRADIENT_BOOSTING: "Gradient Boosting",
@@ -73,6 +89,8 @@ class Classifier:
         self._distance_unit = None
         self._n_jobs = n_jobs
         self._version = _VERSION
+        self._training_sources = None
+        self._threshold = self.DEFAULT_THRESHOLD
 
         # make sure the value passed for the classifier parameter is valid
         if classifier not in _classifier_choices:
@@ -116,6 +134,24 @@ class Classifier:
         """
         return self._distance_unit
 
+    @property
+    def threshold(self) -> float:
+        """
+        decision threshold: frames are classified as the behavior when the
+        probability of the behavior class is greater than the threshold
+        """
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, threshold: float):
+        if not 0 <= threshold <= 1:
+            raise ValueError("threshold must be between 0 and 1")
+        self._threshold = threshold
+
+    @property
+    def feature_importances(self) -> np.ndarray:
+        return self._classifier.feature_importances_
+
     @staticmethod
     def train_test_split(per_frame_features, window_features, label_data):
         """
@@ -168,11 +204,17 @@ class Classifier:
                             groups):
         """
         implements "leave one group out" data splitting strategy
+
+        The rows are sorted by group once, so the test data of each split is
+        a view of the sorted rows and only the training data of the split
+        being consumed is copied.
+
         :param per_frame_features: per frame features for all labeled data
         :param window_features: window features for all labeled data
         :param labels: labels corresponding to each feature row
         :param groups: group id corresponding to each feature row
-        :return: dictionary of training and test data and labels:
+        :return: dictionary of training and test data and labels, the rows
+        are in group order:
         {
             'training_data': list of numpy arrays,
             'test_data': list of numpy arrays,
@@ -180,38 +222,83 @@ class Classifier:
             'test_labels': numpy_array,
         }
         """
-        logo = LeaveOneGroupOut()
-        x = Classifier.combine_data(per_frame_features, window_features)
-        splits = list(logo.split(x, labels, groups))
-
-        # pick random split, make sure we pick a split where the test data
-        # has sufficient labels of both classes
-        random.shuffle(splits)
-        count = 0
-        for split in splits:
-
-            behavior_count = np.count_nonzero(
-                labels[split[1]] == TrackLabels.Label.BEHAVIOR)
-            not_behavior_count = np.count_nonzero(
-                labels[split[1]] == TrackLabels.Label.NOT_BEHAVIOR)
-
-            if (behavior_count >= Classifier.LABEL_THRESHOLD and
-                    not_behavior_count >= Classifier.LABEL_THRESHOLD):
-                count += 1
-                yield {
-                    'training_labels': labels[split[0]],
-                    'training_data': x[split[0]],
-                    'test_labels': labels[split[1]],
-                    'test_data': x[split[1]],
-                    'test_group': groups[split[1]][0]
-                }
-
-        # number of splits exhausted without finding at least one that meets
-        # criteria
+        group_ids, order, offsets = Classifier.group_offsets(groups)
+
+        x = Classifier.combine_data_rows(per_frame_features, window_features,
+                                         order)
+        labels = labels[order]
+
+        for group in Classifier.leave_one_group_out_splits(
+                labels, group_ids, offsets):
+            start, stop = offsets[group], offsets[group + 1]
+            yield {
+                'training_labels': np.concatenate(
+                    (labels[:start], labels[stop:])),
+                'training_data': np.concatenate((x[:start], x[stop:])),
+                'test_labels': labels[start:stop],
+                'test_data': x[start:stop],
+                'test_group': group_ids[group]
+            }
+
+    @staticmethod
+    def group_offsets(groups):
+        """
+        find the rows of each group, so the rows of a group can be selected
+        without searching all the rows
+        :param groups: group id corresponding to each feature row
+        :return: tuple of (group ids, row order, offsets) where the rows
+        order[offsets[i]:offsets[i + 1]] are the rows of group_ids[i], in
+        their original order
+        """
+        group_ids, codes = np.unique(groups, return_inverse=True)
+        order = np.argsort(codes, kind='stable')
+        offsets = np.zeros(len(group_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(group_ids)),
+                  out=offsets[1:])
+        return group_ids, order, offsets
+
+    @staticmethod
+    def leave_one_group_out_splits(sorted_labels, group_ids, offsets):
+        """
+        pick the "leave one group out" splits in random order, skipping
+        splits where the test data does not have enough labels of both
+        classes. Splits are picked lazily, nothing is allocated per split
+        :param sorted_labels: labels sorted by group, see group_offsets()
+        :param group_ids: group ids returned by group_offsets()
+        :param offsets: offsets returned by group_offsets()
+        :return: generator of the index into group_ids of the group left out
+        of each split
+        :raises ValueError: if there are fewer than two groups or no group
+        has enough labels of both classes
+        """
+        if len(group_ids) < 2:
+            # there is no data left to train on
+            raise ValueError("unable to split data")
+
+        # count the labels of each group, the rows of each group are a
+        # contiguous range of the sorted labels
+        behavior_counts = np.add.reduceat(
+            sorted_labels == TrackLabels.Label.BEHAVIOR, offsets[:-1],
+            dtype=np.int64)
+        not_behavior_counts = np.add.reduceat(
+            sorted_labels == TrackLabels.Label.NOT_BEHAVIOR, offsets[:-1],
+            dtype=np.int64)
+
+        # make sure we pick a split where the test data has sufficient labels
+        # of both classes
+        candidates = np.flatnonzero(
+            (behavior_counts >= Classifier.LABEL_THRESHOLD) &
+            (not_behavior_counts >= Classifier.LABEL_THRESHOLD)).tolist()
+
+        # no split meets the criteria
         # the UI won't allow us to reach this case
-        if count == 0:
+        if len(candidates) == 0:
             raise ValueError("unable to split data")
 
+        # pick random split
+        random.shuffle(candidates)
+        yield from candidates
+
     def set_classifier(self, classifier):
         """ change the type of the classifier being used """
         if classifier not in _classifier_choices:
@@ -237,7 +324,8 @@ class Classifier:
     def train(self, data, behavior: str, window_size: int, uses_social: bool,
               extended_features: typing.Dict,
               distance_unit: ProjectDistanceUnit,
-              random_seed: typing.Optional[int] = None):
+              random_seed: typing.Optional[int] = None,
+              warm_start: bool = False):
         """
         train the classifier
         :param data: dict returned from train_test_split()
@@ -248,6 +336,16 @@ class Classifier:
         :param distance_unit: the distance unit used for training
         :param random_seed: optional random seed (used when we want reproducible
         results between trainings)
+        :param warm_start: if true, update the trained estimator instead of
+        training a new one when only a small part of the training data changed
+        since this classifier was trained with the same settings. This needs
+        data['sources'] (see Project.get_labeled_features()) to find how much
+        of the data changed. Random forests replace a matching fraction of
+        their trees with trees grown on the new data, XGBoost continues
+        boosting on the new data. Other classifiers are always trained again.
+        An updated estimator still partly reflects the old training data and
+        is not the estimator a full training with random_seed would produce,
+        so this is only used when the project enables it
         :return: None
 
         NOTE: window_size, uses_social, extended_features, and distance_unit
@@ -258,13 +356,30 @@ class Classifier:
         features = data['training_data']
         labels = data['training_labels']
 
+        changed = None
+        if warm_start:
+            changed = self.__changed_fraction(
+                data, behavior, window_size, uses_social, extended_features,
+                distance_unit)
+
         self._uses_social = uses_social
         self._window_size = window_size
         self._behavior = behavior
         self._distance_unit = distance_unit
         self._extended_features = extended_features
-
-        if self._classifier_type == ClassifierType.RANDOM_FOREST:
+        self._training_sources = data.get('sources')
+
+        if changed == 0:
+            # nothing changed since the estimator was trained
+            return
+        elif changed is not None:
+            if self._classifier_type == ClassifierType.RANDOM_FOREST:
+                self._classifier = self._update_random_forest(
+                    features, labels, changed, random_seed=random_seed)
+            else:
+                self._classifier = self._update_xgboost(
+                    features, labels, changed, random_seed=random_seed)
+        elif self._classifier_type == ClassifierType.RANDOM_FOREST:
             self._classifier = self._fit_random_forest(features, labels,
                                                        random_seed=random_seed)
         elif self._classifier_type == ClassifierType.GRADIENT_BOOSTING:
@@ -276,11 +391,81 @@ class Classifier:
         else:
             raise ValueError("Unsupported classifier")
 
+    def __changed_fraction(self, data, behavior, window_size, uses_social,
+                           extended_features, distance_unit
+                           ) -> typing.Optional[float]:
+        """
+        get the fraction of the training data that changed since the
+        estimator was trained
+        :return: the fraction, or None if the estimator can't be updated with
+        the data and needs to be trained again
+        """
+        sources = data.get('sources')
+        previous = self._training_sources
+        if sources is None or previous is None or self._classifier is None:
+            return None
+
+        if self._classifier_type == ClassifierType.RANDOM_FOREST:
+            if not isinstance(self._classifier, RandomForestClassifier):
+                return None
+        elif (self._classifier_type == ClassifierType.XGBOOST and
+              _xgboost is not None):
+            if (not isinstance(self._classifier, _xgboost.XGBClassifier) or
+                    self._classifier.get_booster().num_boosted_rounds() >=
+                    2 * self._XGBOOST_ROUNDS):
+                return None
+        else:
+            return None
+
+        if (behavior, window_size, uses_social, extended_features,
+                distance_unit) != (self._behavior, self._window_size,
+                                   self._uses_social, self._extended_features,
+                                   self._distance_unit):
+            return None
+        if self._classifier.n_features_in_ != data['training_data'].shape[1]:
+            return None
+
+        # rows of videos that are new or changed, and rows of videos that
+        # changed or were removed since the estimator was trained
+        added = sum(rows for video, (signature, rows) in sources.items()
+                    if previous.get(video, (None,))[0] != signature)
+        removed = sum(rows for video, (signature, rows) in previous.items()
+                      if sources.get(video, (None,))[0] != signature)
+
+        changed = max(added, removed) / max(len(data['training_labels']), 1)
+        return changed if changed <= self.WARM_START_MAX_CHANGE else None
+
     def predict(self, features):
         """
         predict classes for a given set of features
         """
-        return self._classifier.predict(features)
+        return self.predict_with_probability(features)[0]
+
+    def predict_with_probability(self, features):
+        """
+        predict classes for a given set of features, and the probability of
+        each predicted class, from a single evaluation of the estimator
+        :param features: feature matrix with shape (#frames, #features)
+        :return: tuple of (predicted classes, probability of the predicted
+        class) arrays with shape (#frames,)
+        """
+        prob = self._classifier.predict_proba(features)
+        classes = list(self._classifier.classes_)
+        behavior_prob = prob[:, classes.index(TrackLabels.Label.BEHAVIOR)]
+        not_behavior_prob = prob[
+            :, classes.index(TrackLabels.Label.NOT_BEHAVIOR)]
+
+        # the same as behavior_prob > threshold, except at the default
+        # threshold where it picks the most probable class exactly like the
+        # estimators' predict() does, even when the probabilities don't add
+        # up to exactly one
+        behavior = (behavior_prob * (1 - self._threshold) >
+                    not_behavior_prob * self._threshold)
+
+        predictions = np.where(behavior, TrackLabels.Label.BEHAVIOR,
+                               TrackLabels.Label.NOT_BEHAVIOR)
+        return predictions, np.where(behavior, behavior_prob,
+                                     not_behavior_prob)
 
     def predict_proba(self, features):
         return self._classifier.predict_proba(features)
@@ -309,6 +494,11 @@ class Classifier:
         self._uses_social = c._uses_social
         self._classifier_type = c._classifier_type
         self._distance_unit = c._distance_unit
+        self._extended_features = c._extended_features
+        # classifiers saved before warm starts were supported don't have
+        # training sources, and are always trained again
+        self._training_sources = getattr(c, '_training_sources', None)
+        self._threshold = getattr(c, '_threshold', self.DEFAULT_THRESHOLD)
 
     def _update_classifier_type(self):
         # we may need to update the classifier type based on
@@ -341,24 +531,24 @@ class Classifier:
         :param window: window feature dictionary
         :return: numpy array with shape #frames,#features
         """
-        datasets = []
-        # add per frame features to our data set
-        # sort the feature names in the dict so the order is consistent
-        for feature in sorted(per_frame):
-            datasets.append(per_frame[feature])
+        return fe.IdentityFeatures.combine_features(per_frame, window)
 
-        # add window features to our data set
-        # sort the feature names in the dict so the order is consistent
-        for feature in sorted(window):
-            # [source_feature_name][operator_applied] : numpy array
-            # iterate over operator names
-            for op in sorted(window[feature]):
-                # append the numpy array to the dataset
-                datasets.append(window[feature][op])
-
-        # expand any 1D features to 2D so that we can concatenate in one call
-        datasets = [(d[:, np.newaxis] if d.ndim == 1 else d) for d in datasets]
-        return np.concatenate(datasets, axis=1)
+    @staticmethod
+    def combine_data_rows(per_frame, window, rows):
+        """
+        combine the selected rows of the feature sets, the rows of each
+        feature are selected before combining so only the selected rows are
+        copied
+        :param per_frame: per frame features dictionary
+        :param window: window feature dictionary
+        :param rows: index array of the rows to select, in the order to
+        select them
+        :return: numpy array with shape len(rows),#features
+        """
+        return Classifier.combine_data(
+            {f: v[rows] for f, v in per_frame.items()},
+            {f: {op: v[rows] for op, v in ops.items()}
+             for f, ops in window.items()})
 
     def _fit_random_forest(self, features, labels,
                            random_seed: typing.Optional[int] = None):
@@ -387,15 +577,62 @@ class Classifier:
         classifier.fit(features, labels)
         return classifier
 
-    def print_feature_importance(self, feature_list, limit=20):
+    def _update_random_forest(self, features, labels, changed: float,
+                              random_seed: typing.Optional[int] = None):
+        """
+        grow new trees on the training data to replace the oldest trees, the
+        fraction of trees replaced matches the fraction of the training data
+        that changed
+        """
+        classifier = self._classifier
+        num_trees = len(classifier.estimators_)
+        replace = min(num_trees, math.ceil(num_trees * changed))
+
+        if random_seed is not None:
+            classifier.set_params(random_state=random_seed)
+        classifier.set_params(warm_start=True, n_jobs=self._n_jobs,
+                              n_estimators=num_trees + replace)
+        classifier.fit(features, labels)
+
+        # drop the oldest trees and restore the number of trees
+        del classifier.estimators_[:replace]
+        classifier.set_params(warm_start=False, n_estimators=num_trees)
+        return classifier
+
+    def _update_xgboost(self, features, labels, changed: float,
+                        random_seed: typing.Optional[int] = None):
+        """
+        continue boosting the trained model on the training data, with a
+        number of rounds proportional to the fraction of the training data
+        that changed
+        """
+        rounds = math.ceil(self._XGBOOST_ROUNDS * changed)
+        if random_seed is not None:
+            classifier = _xgboost.XGBClassifier(n_jobs=self._n_jobs,
+                                                n_estimators=rounds,
+                                                random_state=random_seed)
+        else:
+            classifier = _xgboost.XGBClassifier(n_jobs=self._n_jobs,
+                                                n_estimators=rounds)
+        classifier.fit(features, labels,
+                       xgb_model=self._classifier.get_booster())
+        return classifier
+
+    def print_feature_importance(self, feature_list, limit=20,
+                                 importances=None):
         """
         print the most important features and their importance
         :param feature_list:
         :param limit:
+        :param importances: optional feature importances to print instead of
+        the importances of this classifier, for example the importances of a
+        classifier trained in another process
         :return:
         """
         # Get numerical feature importance
-        importances = list(self._classifier.feature_importances_)
+        if importances is None:
+            importances = self.feature_importances
+        importances = list(importances)
         # List of tuples with variable and importance
         feature_importance = [(feature, round(importance, 2)) for
                               feature, importance in
@@ -0,0 +1,215 @@
+import itertools
+import multiprocessing
+import os
+import typing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .classifier import Classifier, ClassifierType
+
+# state of each cross validation worker process, set by _init_worker()
+_worker = {}
+
+# number of rows combined at once when building the feature matrix
+_COMBINE_ROWS = 2 ** 14
+
+
+def available_cores() -> int:
+    """ number of cores this process is allowed to run on """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity is not available on all platforms
+        return os.cpu_count() or 1
+
+
+def available_memory() -> typing.Optional[int]:
+    """
+    physical memory currently available in bytes, or None if it can't be
+    determined on this platform
+    """
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        # sysconf is not available on all platforms
+        return None
+
+
+def budget_cores(num_folds: int,
+                 processes: typing.Optional[int] = None,
+                 fold_bytes: typing.Optional[int] = None,
+                 memory: typing.Optional[int] = None
+                 ) -> typing.Tuple[int, int]:
+    """
+    divide the available cores between training folds concurrently and
+    training each fold's estimator with multiple jobs. Folds are run
+    concurrently first, since every fold spends time in single threaded
+    work (gradient boosting never uses more than one core), and any cores
+    left over are given to the estimators. The number of concurrent folds is
+    also limited so their training data fits in memory
+    :param num_folds: number of cross validation folds
+    :param processes: optional number of cores to use, defaults to all
+    available cores
+    :param fold_bytes: optional size in bytes of the training data each
+    fold copies
+    :param memory: memory available for the folds' training data in bytes,
+    defaults to available_memory(). Only used if fold_bytes is given
+    :return: tuple of (number of fold worker processes, n_jobs for each
+    fold's estimator)
+    """
+    cores = max(1, processes or available_cores())
+    workers = max(1, min(num_folds, cores))
+
+    if fold_bytes:
+        if memory is None:
+            memory = available_memory()
+        if memory is not None:
+            workers = max(1, min(workers, memory // fold_bytes))
+
+    return workers, max(1, cores // workers)
+
+
+def cross_validate(classifier_type: ClassifierType, per_frame, window,
+                   labels: np.ndarray, groups: np.ndarray,
+                   k: typing.Optional[int] = None,
+                   processes: typing.Optional[int] = None
+                   ) -> typing.Generator[dict, None, None]:
+    """
+    run "leave one group out" cross validation, training the folds
+    concurrently in a pool of worker processes
+
+    The combined feature matrix is built once as float32, in group order,
+    directly in shared memory that every worker maps, instead of pickling
+    the training and test data of each fold and sending it to a worker.
+    Workers are only sent the group left out of each fold.
+
+    :param classifier_type: type of classifier to train for each fold
+    :param per_frame: per frame features for all labeled data
+    :param window: window features for all labeled data
+    :param labels: labels corresponding to each feature row
+    :param groups: group id corresponding to each feature row
+    :param k: maximum number of folds, defaults to all splits that have
+    enough labels in the test group
+    :param processes: optional number of cores to use, see budget_cores()
+    :return: generator of results for each fold, yielded as the folds
+    finish, which is not necessarily the order of the folds:
+    {
+        'fold': index of the fold,
+        'test_group': group id of the test data,
+        'accuracy': accuracy score,
+        'precision_recall': result of Classifier.precision_recall_score(),
+        'confusion': confusion matrix,
+        'feature_importances': feature importances of the fold's classifier
+    }
+    :raises ValueError: if the data can not be split
+    """
+    group_ids, order, offsets = Classifier.group_offsets(groups)
+    labels = labels[order]
+    folds = list(enumerate(itertools.islice(
+        Classifier.leave_one_group_out_splits(labels, group_ids, offsets),
+        k)))
+
+    # each fold trains on a float32 copy of the rows outside its test group,
+    # which is the dtype the estimators train on, so they don't copy it again
+    num_rows = len(order)
+    num_columns = Classifier.combine_data_rows(per_frame, window,
+                                               order[:1]).shape[1]
+    shape = (num_rows, num_columns)
+    nbytes = num_rows * num_columns * np.dtype(np.float32).itemsize
+
+    memory = available_memory()
+    if memory is not None:
+        # the combined matrix is held in memory along with the folds'
+        # copies of their training data
+        memory = max(0, memory - nbytes)
+    workers, n_jobs = budget_cores(len(folds), processes, nbytes, memory)
+
+    # the rows are sorted by group, so the test data of a fold is a slice of
+    # the matrix
+    if workers == 1:
+        x = np.empty(shape, dtype=np.float32)
+        _combine_rows(per_frame, window, order, x)
+        for fold, group in folds:
+            yield _train_fold(x, labels, group_ids, offsets, classifier_type,
+                              n_jobs, fold, group)
+        return
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+    try:
+        _combine_rows(per_frame, window, order,
+                      np.ndarray(shape, dtype=np.float32, buffer=shm.buf))
+
+        # spawn instead of fork, since the GUI runs cross validation from a
+        # Qt thread, and forking a multithreaded process isn't safe
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(shm.name, shape, np.float32, labels,
+                                    group_ids, offsets, classifier_type,
+                                    n_jobs)) as pool:
+            yield from pool.imap_unordered(_run_fold, folds)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _combine_rows(per_frame, window, order, out):
+    """
+    combine the features of the rows in order into out, one chunk of rows at
+    a time, so there is never a second full copy of the feature matrix
+    """
+    for start in range(0, len(order), _COMBINE_ROWS):
+        stop = start + _COMBINE_ROWS
+        out[start:stop] = Classifier.combine_data_rows(per_frame, window,
+                                                       order[start:stop])
+
+
+def _init_worker(shm_name, shape, dtype, labels, group_ids, offsets,
+                 classifier_type, n_jobs):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker.update({
+        'shm': shm,
+        'x': np.ndarray(shape, dtype=dtype, buffer=shm.buf),
+        'labels': labels,
+        'group_ids': group_ids,
+        'offsets': offsets,
+        'classifier_type': classifier_type,
+        'n_jobs': n_jobs,
+    })
+
+
+def _run_fold(args):
+    fold, group = args
+    return _train_fold(_worker['x'], _worker['labels'], _worker['group_ids'],
+                       _worker['offsets'], _worker['classifier_type'],
+                       _worker['n_jobs'], fold, group)
+
+
+def _train_fold(x, labels, group_ids, offsets, classifier_type, n_jobs, fold,
+                group) -> dict:
+    """
+    train and evaluate the classifier for one fold, x and labels are sorted
+    by group and group is the index into group_ids of the test group. x is
+    float32, so the concatenated training data is the only copy made
+    """
+    start, stop = offsets[group], offsets[group + 1]
+
+    classifier = Classifier(classifier_type, n_jobs=n_jobs)
+    # the classifier is discarded after it is evaluated, so the metadata
+    # that is only used when saving a classifier is not needed
+    classifier.train({
+        'training_data': np.concatenate((x[:start], x[stop:])),
+        'training_labels': np.concatenate((labels[:start], labels[stop:]))
+    }, None, None, None, None, None)
+
+    test_labels = labels[start:stop]
+    predictions = classifier.predict(x[start:stop])
+    return {
+        'fold': fold,
+        'test_group': group_ids[group],
+        'accuracy': Classifier.accuracy_score(test_labels, predictions),
+        'precision_recall': Classifier.precision_recall_score(test_labels,
+                                                              predictions),
+        'confusion': Classifier.confusion_matrix(test_labels, predictions),
+        'feature_importances': classifier.feature_importances,
+    }
@@ -1,4 +1,6 @@
 from .features import IdentityFeatures
 from .features import FEATURE_VERSION
+from .features import FeatureVersionException, DistanceScaleException
+from .feature_store import FeatureStore
 
 DEFAULT_WINDOW_SIZE = 5
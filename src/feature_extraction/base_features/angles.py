@@ -1,3 +1,5 @@
+import typing
+
 import numpy as np
 import scipy.stats
 
@@ -22,6 +24,7 @@ class Angles(Feature):
         "mean": lambda x: scipy.stats.circmean(x, high=360),
         "std_dev": lambda x: scipy.stats.circstd(x, high=360),
     }
+    _circular_range = (0, 360)
 
     def __init__(self, poses: PoseEstimation, pixel_scale: float):
         super().__init__(poses, pixel_scale)
@@ -118,6 +121,12 @@ class Angles(Feature):
         # with circular values
         return self._window_circular(identity, window_size, per_frame_values)
 
+    def window_multi(self, identity: int, window_sizes: typing.Iterable[int],
+                     per_frame_values: np.ndarray,
+                     frame_mask: typing.Optional[np.ndarray] = None) -> dict:
+        return self._window_circular_multi(identity, window_sizes,
+                                           per_frame_values, frame_mask)
+
     @staticmethod
     def _compute_angles(
             a: np.ndarray, b: np.ndarray, c: np.ndarray
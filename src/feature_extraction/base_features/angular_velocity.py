@@ -28,31 +28,27 @@ class AngularVelocity(Feature):
         bearings = self._poses.compute_all_bearings(identity)
         velocities = np.zeros_like(bearings)
 
-        for i in range(len(bearings) - 1):
-
-            angle1 = bearings[i]
-            angle1 = angle1 % 360
-            if angle1 < 0:
-                angle1 += 360
-
-            angle2 = bearings[i + 1]
-            angle2 = angle2 % 360
-            if angle2 < 0:
-                angle2 += 360
-
-            diff1 = angle2 - angle1
-            abs_diff1 = abs(diff1)
-            diff2 = (360 + angle2) - angle1
-            abs_diff2 = abs(diff2)
-            diff3 = angle2 - (360 + angle1)
-            abs_diff3 = abs(diff3)
-
-            if abs_diff1 <= abs_diff2 and abs_diff1 <= abs_diff3:
-                velocities[i] = diff1
-            elif abs_diff2 <= abs_diff3:
-                velocities[i] = diff2
-            else:
-                velocities[i] = diff3
+        # convert bearings to the range [0, 360). The differences are
+        # computed in float64 and stored as float32, the same as the
+        # frame by frame computation using numpy float32 scalars
+        angles = bearings.astype(np.float64) % 360
+        angles = np.where(angles < 0, angles + 360, angles)
+        angle1 = angles[:-1]
+        angle2 = angles[1:]
+
+        # the change in bearing between consecutive frames is the candidate
+        # difference with the smallest magnitude, preferring diff1 then
+        # diff2 when there are ties
+        diff1 = angle2 - angle1
+        abs_diff1 = np.abs(diff1)
+        diff2 = (360 + angle2) - angle1
+        abs_diff2 = np.abs(diff2)
+        diff3 = angle2 - (360 + angle1)
+        abs_diff3 = np.abs(diff3)
+
+        velocities[:-1] = np.where(
+            (abs_diff1 <= abs_diff2) & (abs_diff1 <= abs_diff3), diff1,
+            np.where(abs_diff2 <= abs_diff3, diff2, diff3))
         velocities = velocities * fps
 
         return smooth(velocities, smoothing_window=self._SMOOTHING_WINDOW)
@@ -6,6 +6,8 @@ from . import Angles, PairwisePointDistances, PointSpeeds, \
     LeftFrontPawVelocityDir, LeftFrontPawVelocityMag, \
     RightFrontPawVelocityDir, RightFrontPawVelocityMag, \
     AngularVelocity
+from .point_velocities import PointVelocityDir, PointVelocityMag, \
+    PointVelocityInfo
 
 
 class BaseFeatureGroup(FeatureGroup):
@@ -34,10 +36,28 @@ class BaseFeatureGroup(FeatureGroup):
     def _init_feature_mods(self, identity: int):
         """
         initialize all of the feature modules specified in the current config
-        :param identity: unused, specified by abstract base class
+        :param identity: identity used for the velocities shared by the point
+        velocity features
         :return: dictionary of initialized feature modules for this group
         """
+        velocity_features = [
+            feature for feature in self._enabled_features
+            if issubclass(self._features[feature],
+                          (PointVelocityDir, PointVelocityMag))
+        ]
+
+        # the point velocity features share one PointVelocityInfo so the
+        # velocities of all their keypoints are computed together
+        velocity_info = PointVelocityInfo(
+            self._poses, identity, self._pixel_scale,
+            dict.fromkeys(self._features[feature]._point_index
+                          for feature in velocity_features)
+        )
+
         return {
-            feature: self._features[feature](self._poses, self._pixel_scale)
+            feature: self._features[feature](self._poses, self._pixel_scale,
+                                             velocity_info)
+            if feature in velocity_features else
+            self._features[feature](self._poses, self._pixel_scale)
             for feature in self._enabled_features
         }
@@ -24,6 +24,7 @@ class CentroidVelocityDir(Feature):
         "mean": lambda x: scipy.stats.circmean(x, low=-180, high=180),
         "std_dev": lambda x: scipy.stats.circstd(x, low=-180, high=180),
     }
+    _circular_range = (-180, 180)
 
     def __init__(self, poses: PoseEstimation, pixel_scale: float):
         super().__init__(poses, pixel_scale)
@@ -31,20 +32,16 @@ class CentroidVelocityDir(Feature):
     def per_frame(self, identity: int) -> np.ndarray:
         values = np.zeros(self._poses.num_frames, dtype=np.float32)
         bearings = self._poses.compute_all_bearings(identity)
-        frame_valid = self._poses.identity_mask(identity)
 
         # compute the velocity of the center of mass.
-        # first, grab convex hulls for this identity
-        convex_hulls = self._poses.get_identity_convex_hulls(identity)
+        # first, grab convex hull centroids for this identity
+        centroids = self._poses.get_identity_hull_centroids(identity)
 
         # get an array of the indexes of valid frames only
-        indexes = np.arange(self._poses.num_frames)[frame_valid == 1]
+        indexes = self._poses.get_identity_valid_frames(identity)
 
         # get centroids for all frames where this identity is present
-        centroids = [convex_hulls[i].centroid for i in indexes]
-
-        # convert to numpy array of x,y points of the centroids
-        points = np.asarray([[p.x, p.y] for p in centroids])
+        points = centroids[indexes]
 
         if points.shape[0] > 1:
             # compute x,y velocities
@@ -66,6 +63,12 @@ class CentroidVelocityDir(Feature):
         # with circular values
         return self._window_circular(identity, window_size, per_frame_values)
 
+    def window_multi(self, identity: int, window_sizes: typing.Iterable[int],
+                     per_frame_values: np.ndarray,
+                     frame_mask: typing.Optional[np.ndarray] = None) -> dict:
+        return self._window_circular_multi(identity, window_sizes,
+                                           per_frame_values, frame_mask)
+
 
 class CentroidVelocityMag(Feature):
     """ feature for the magnitude of the center of mass velocity """
@@ -84,20 +87,16 @@ class CentroidVelocityMag(Feature):
         """
         values = np.zeros(self._poses.num_frames, dtype=np.float32)
         fps = self._poses.fps
-        frame_valid = self._poses.identity_mask(identity)
 
         # compute the velocity of the center of mass.
-        # first, grab convex hulls for this identity
-        convex_hulls = self._poses.get_identity_convex_hulls(identity)
+        # first, grab convex hull centroids for this identity
+        centroids = self._poses.get_identity_hull_centroids(identity)
 
         # get an array of the indexes of valid frames only
-        indexes = np.arange(self._poses.num_frames)[frame_valid == 1]
+        indexes = self._poses.get_identity_valid_frames(identity)
 
         # get centroids for all frames where this identity is present
-        centroids = [convex_hulls[i].centroid for i in indexes]
-
-        # convert to numpy array of x,y points of the centroids
-        points = np.asarray([[p.x, p.y] for p in centroids])
+        points = centroids[indexes]
 
         if points.shape[0] > 1:
             # compute x,y velocities
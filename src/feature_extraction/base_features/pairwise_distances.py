@@ -4,6 +4,7 @@ import numpy as np
 
 from src.pose_estimation import PoseEstimation
 from src.feature_extraction.feature_base_class import Feature
+from src.utils.geometry import point_pair_distances
 from src.utils.utilities import n_choose_r
 
 
@@ -35,20 +36,10 @@ class PairwisePointDistances(Feature):
                 :param identity: identity to compute features for
                 :return: np.ndarray with feature values
                 """
-        values = np.zeros(
-            (self._poses.num_frames, self._num_distances), dtype=np.float32)
-
         points, _ = self._poses.get_identity_poses(identity, self._pixel_scale)
 
+        # compute euclidean distance between the ith and jth points for
+        # every i < j
         npoints = len(PoseEstimation.KeypointIndex)
-        d = 0
-        for i in range(0, npoints):
-            for j in range(i+1, npoints):
-                # compute euclidean distance between ith and jth points
-                values[:, d] = np.sqrt(
-                    np.square(points[:, i, 0] - points[:, j, 0]) +
-                    np.square(points[:, i, 1] - points[:, j, 1])
-                )
-                d += 1
-
-        return values
+        i, j = np.triu_indices(npoints, k=1)
+        return point_pair_distances(points, points, i, j)
@@ -9,51 +9,144 @@ from src.pose_estimation import PoseEstimation
 from src.feature_extraction.feature_base_class import Feature
 
 
-# TODO: merge each of these pairs into a single feature with a 2D numpy array of values
-# these are currently separate features in the features file, so we keep them
-# separate here for ease of implementation, but this results in duplicated
-# work computing each feature. Fix at next update to feature h5 file format.
+class PointVelocityInfo:
+    """
+    velocity magnitude and direction of several keypoints of an identity.
+    The velocities are computed together the first time any of them is
+    needed and shared by the point velocity features, so the gradient of
+    each keypoint is computed once for both the magnitude and direction
+    features.
+    """
+
+    def __init__(self, poses: PoseEstimation, identity: int,
+                 pixel_scale: float,
+                 point_indexes: typing.Iterable[PoseEstimation.KeypointIndex]):
+        """
+        :param poses: PoseEstimation object
+        :param identity: identity to compute velocities for
+        :param pixel_scale: scale factor to convert pixel coordinates
+        :param point_indexes: keypoints to compute velocities for
+        """
+        self._poses = poses
+        self._identity = identity
+        self._pixel_scale = pixel_scale
+        self._point_indexes = list(point_indexes)
+        self._magnitudes = None
+        self._directions = None
+
+    @property
+    def identity(self) -> int:
+        return self._identity
+
+    @property
+    def point_indexes(self) -> typing.List[PoseEstimation.KeypointIndex]:
+        return self._point_indexes
+
+    def magnitude(self, point_index: PoseEstimation.KeypointIndex) -> np.ndarray:
+        """
+        get the smoothed velocity magnitude of a keypoint
+        :param point_index: keypoint, must be one of point_indexes
+        :return: numpy array (#frames,)
+        """
+        if self._magnitudes is None:
+            self._compute()
+        return self._magnitudes[self._point_indexes.index(point_index)]
 
-class PointVelocityDir(Feature, abc.ABC):
-    """ feature for the direction of the point velocity """
+    def direction(self, point_index: PoseEstimation.KeypointIndex) -> np.ndarray:
+        """
+        get the smoothed velocity direction of a keypoint relative to the
+        bearing of the identity
+        :param point_index: keypoint, must be one of point_indexes
+        :return: numpy array (#frames,)
+        """
+        if self._directions is None:
+            self._compute()
+        return self._directions[self._point_indexes.index(point_index)]
 
-    # subclass must override this
-    _point_index = None
+    def _compute(self):
+        fps = self._poses.fps
+        num_frames = self._poses.num_frames
+        points, mask = self._poses.get_identity_poses(self._identity,
+                                                      self._pixel_scale)
+        bearings = self._poses.compute_all_bearings(self._identity)
 
-    # override for circular values
-    _window_operations = {
-        "mean": lambda x: scipy.stats.circmean(x, low=-180, high=180),
-        "std_dev": lambda x: scipy.stats.circstd(x, low=-180, high=180),
-    }
+        self._magnitudes = []
+        self._directions = []
+        for point_index in self._point_indexes:
+            mag = np.zeros(num_frames, dtype=np.float32)
+            direction = np.zeros(num_frames, dtype=np.float32)
 
-    def __init__(self, poses: PoseEstimation, pixel_scale: float):
-        super().__init__(poses, pixel_scale)
+            # get an array of the indexes where this point exists
+            indexes = np.flatnonzero(mask[:, point_index] == 1)
 
-    def per_frame(self, identity: int) -> np.ndarray:
-        points, mask = self._poses.get_identity_poses(identity, self._pixel_scale)
+            if indexes.shape[0] > 1:
+                # compute x,y velocities
+                # pass indexes so numpy can figure out spacing
+                v = np.gradient(points[indexes, point_index], indexes, axis=0)
+
+                mag[indexes] = np.sqrt(
+                    np.square(v[:, 0]) + np.square(v[:, 1])) * fps
 
-        bearings = self._poses.compute_all_bearings(identity)
+                # compute the orientation, and adjust based on the animal's
+                # bearing
+                d = np.degrees(np.arctan2(v[:, 1], v[:, 0]))
+                direction[indexes] = (((d - bearings[indexes]) + 360) % 360) - 180
 
-        # get an array of the indexes where this point exists
-        indexes = np.arange(self._poses.num_frames)[mask[:, self._point_index] == 1]
+                mag = smooth(mag, smoothing_window=Feature._SMOOTHING_WINDOW)
+                direction = smooth(direction,
+                                   smoothing_window=Feature._SMOOTHING_WINDOW)
 
-        # get points where this point exists
-        points = points[indexes, self._point_index]
+            self._magnitudes.append(mag)
+            self._directions.append(direction)
 
-        values = np.zeros(self._poses.num_frames, dtype=np.float32)
 
-        if indexes.shape[0] > 1:
-            # compute x,y velocities
-            # pass indexes so numpy can figure out spacing
-            v = np.gradient(points, indexes, axis=0)
+class _PointVelocityFeature(Feature, abc.ABC):
+    """
+    base class for features computed from a PointVelocityInfo
+    """
 
-            # compute the orientation, and adjust based on the animal's bearing
-            values[indexes] = (((np.degrees(np.arctan2(v[:, 1], v[:, 0])) - bearings[
-                indexes]) + 360) % 360) - 180
+    # subclass must override this
+    _point_index = None
+
+    def __init__(self, poses: PoseEstimation, pixel_scale: float,
+                 velocity_info: typing.Optional[PointVelocityInfo] = None):
+        """
+        :param poses: PoseEstimation object
+        :param pixel_scale: scale factor to convert pixel coordinates
+        :param velocity_info: optional PointVelocityInfo shared with other
+        point velocity features. If it is None or for a different identity
+        than the one passed to per_frame, the velocity of this feature's
+        keypoint is computed on its own.
+        """
+        super().__init__(poses, pixel_scale)
+        self._velocity_info = velocity_info
 
-            values = smooth(values, smoothing_window=self._SMOOTHING_WINDOW)
+    def _get_velocity_info(self, identity: int) -> PointVelocityInfo:
+        if (self._velocity_info is None or
+                self._velocity_info.identity != identity or
+                self._point_index not in self._velocity_info.point_indexes):
+            return PointVelocityInfo(self._poses, identity, self._pixel_scale,
+                                     [self._point_index])
+        return self._velocity_info
 
-        return values
+
+# TODO: merge each of these pairs into a single feature with a 2D numpy array of values
+# these are currently separate features in the features file, so we keep them
+# separate here for ease of implementation. The velocities are computed once
+# by a shared PointVelocityInfo. Fix at next update to feature h5 file format.
+
+class PointVelocityDir(_PointVelocityFeature, abc.ABC):
+    """ feature for the direction of the point velocity """
+
+    # override for circular values
+    _window_operations = {
+        "mean": lambda x: scipy.stats.circmean(x, low=-180, high=180),
+        "std_dev": lambda x: scipy.stats.circstd(x, low=-180, high=180),
+    }
+    _circular_range = (-180, 180)
+
+    def per_frame(self, identity: int) -> np.ndarray:
+        return self._get_velocity_info(identity).direction(self._point_index)
 
     def window(self, identity: int, window_size: int,
                per_frame_values: np.ndarray) -> dict:
@@ -61,15 +154,15 @@ class PointVelocityDir(Feature, abc.ABC):
         # with circular values
         return self._window_circular(identity, window_size, per_frame_values)
 
+    def window_multi(self, identity: int, window_sizes: typing.Iterable[int],
+                     per_frame_values: np.ndarray,
+                     frame_mask: typing.Optional[np.ndarray] = None) -> dict:
+        return self._window_circular_multi(identity, window_sizes,
+                                           per_frame_values, frame_mask)
 
-class PointVelocityMag(Feature, abc.ABC):
-    """ feature for the magnitude of point velocity """
-
-    # subclass must override this
-    _point_index = None
 
-    def __init__(self, poses: PoseEstimation, pixel_scale: float):
-        super().__init__(poses, pixel_scale)
+class PointVelocityMag(_PointVelocityFeature, abc.ABC):
+    """ feature for the magnitude of point velocity """
 
     def per_frame(self, identity: int) -> np.ndarray:
         """
@@ -77,30 +170,7 @@ class PointVelocityMag(Feature, abc.ABC):
         :param identity: identity to compute features for
         :return: np.ndarray with feature values
         """
-        fps = self._poses.fps
-        points, mask = self._poses.get_identity_poses(identity,
-                                                      self._pixel_scale)
-
-        # get an array of the indexes where this point exists
-        indexes = np.arange(self._poses.num_frames)[mask[:, self._point_index] == 1]
-
-        # get points where this point exists
-        points = points[indexes, self._point_index]
-
-        values = np.zeros(self._poses.num_frames, dtype=np.float32)
-
-        if indexes.shape[0] > 1:
-            # compute x,y velocities
-            # pass indexes so numpy can figure out spacing
-            v = np.gradient(points, indexes, axis=0)
-
-            # compute magnitude of velocities
-            values[indexes] = np.sqrt(
-                np.square(v[:, 0]) + np.square(v[:, 1])) * fps
-
-            values = smooth(values, smoothing_window=self._SMOOTHING_WINDOW)
-
-        return values
+        return self._get_velocity_info(identity).magnitude(self._point_index)
 
 
 class NoseVelocityDir(PointVelocityDir):
@@ -118,9 +188,6 @@ class NoseVelocityMag(PointVelocityMag):
     _feature_names = ['nose velocity magnitude']
     _point_index = PoseEstimation.KeypointIndex.NOSE
 
-    def __init__(self, poses: PoseEstimation, pixel_scale: float):
-        super().__init__(poses, pixel_scale)
-
 
 class BaseTailVelocityDir(PointVelocityDir):
     """ feature for the direction of the base_tail velocity """
@@ -135,9 +202,6 @@ class BaseTailVelocityDir(PointVelocityDir):
         "std_dev": lambda x: scipy.stats.circstd(x, low=-180, high=180),
     }
 
-    def __init__(self, poses: PoseEstimation, pixel_scale: float):
-        super().__init__(poses, pixel_scale)
-
 
 class BaseTailVelocityMag(PointVelocityMag):
     """ feature for the magnitude of the base_tail velocity """
@@ -146,9 +210,6 @@ class BaseTailVelocityMag(PointVelocityMag):
     _feature_names = ['base tail velocity magnitude']
     _point_index = PoseEstimation.KeypointIndex.BASE_TAIL
 
-    def __init__(self, poses: PoseEstimation, pixel_scale: float):
-        super().__init__(poses, pixel_scale)
-
 
 class LeftFrontPawVelocityDir(PointVelocityDir):
     """ feature for the direction of the left front paw velocity """
@@ -163,9 +224,6 @@ class LeftFrontPawVelocityDir(PointVelocityDir):
         "std_dev": lambda x: scipy.stats.circstd(x, low=-180, high=180),
     }
 
-    def __init__(self, poses: PoseEstimation, pixel_scale: float):
-        super().__init__(poses, pixel_scale)
-
 
 class LeftFrontPawVelocityMag(PointVelocityMag):
     """ feature for the magnitude of the left front paw velocity """
@@ -174,9 +232,6 @@ class LeftFrontPawVelocityMag(PointVelocityMag):
     _feature_names = ['left front paw velocity magnitude']
     _point_index = PoseEstimation.KeypointIndex.LEFT_FRONT_PAW
 
-    def __init__(self, poses: PoseEstimation, pixel_scale: float):
-        super().__init__(poses, pixel_scale)
-
 
 class RightFrontPawVelocityDir(PointVelocityDir):
     """ feature for the direction of the right front paw velocity """
@@ -191,9 +246,6 @@ class RightFrontPawVelocityDir(PointVelocityDir):
         "std_dev": lambda x: scipy.stats.circstd(x, low=-180, high=180),
     }
 
-    def __init__(self, poses: PoseEstimation, pixel_scale: float):
-        super().__init__(poses, pixel_scale)
-
 
 class RightFrontPawVelocityMag(PointVelocityMag):
     """ feature for the magnitude of the right front paw velocity """
@@ -201,6 +253,3 @@ class RightFrontPawVelocityMag(PointVelocityMag):
     _name = 'right_front_paw_velocity_mag'
     _feature_names = ['right front paw velocity magnitude']
     _point_index = PoseEstimation.KeypointIndex.RIGHT_FRONT_PAW
-
-    def __init__(self, poses: PoseEstimation, pixel_scale: float):
-        super().__init__(poses, pixel_scale)
@@ -5,6 +5,7 @@ import numpy as np
 
 from src.utils.utilities import rolling_window
 from src.pose_estimation import PoseEstimation
+from .window_statistics import WindowStatistics, CircularWindowStatistics
 
 
 class Feature(abc.ABC):
@@ -24,7 +25,9 @@ class Feature(abc.ABC):
 
     _SMOOTHING_WINDOW = 5
 
-    # _compute_window_feature uses numpy masked arrays, so we
+    # window() computes these operations with WindowStatistics, which only
+    # uses the keys. Any other operation falls back to
+    # _compute_window_feature, which uses numpy masked arrays, so we
     # need to use the np.ma.* versions of these functions
     # NOTE: Circular values need to override this as well as the window()
     _window_operations = {
@@ -35,6 +38,12 @@ class Feature(abc.ABC):
         "min": np.ma.amin
     }
 
+    # (low, high) range of the values of features with circular values. Used
+    # by _window_circular to compute the circular window operations with
+    # CircularWindowStatistics. Circular features that do not set this fall
+    # back to calling the functions in _window_operations for each frame
+    _circular_range = None
+
     def __init__(self, poses: PoseEstimation, pixel_scale: float):
         super().__init__()
         self._poses = poses
@@ -104,23 +113,80 @@ class Feature(abc.ABC):
         NOTE: some features may need to override this (for example, those with
         circular values such as angles)
         """
-        values = {}
-        for op in self._window_operations:
-            values[op] = self._compute_window_feature(
-                per_frame_values, self._poses.identity_mask(identity),
-                window_size, self._window_operations[op]
-            )
-        return values
+        return self.window_multi(
+            identity, [window_size], per_frame_values)[window_size]
+
+    def window_multi(self, identity: int,
+                     window_sizes: typing.Iterable[int],
+                     per_frame_values: np.ndarray,
+                     frame_mask: typing.Optional[np.ndarray] = None
+                     ) -> typing.Dict:
+        """
+        compute window feature values for several window sizes at once. The
+        cumulative sums used for the window statistics are computed once and
+        shared by all window sizes.
+
+        NOTE: features that override window() also need to override this
+        :param identity: subject identity
+        :param window_sizes: window sizes to compute
+        :param per_frame_values: per frame feature values
+        :param frame_mask: optional array indicating which frames are valid
+        for the identity, used when per_frame_values only covers a range of
+        frames. Defaults to the identity mask for the whole video
+        :return: dict mapping each window size to the dict that would be
+        returned by window() for that size
+        """
+        if frame_mask is None:
+            frame_mask = self._poses.identity_mask(identity)
+        window_stats = WindowStatistics(per_frame_values, frame_mask)
+
+        results = {}
+        for window_size in window_sizes:
+            values = {}
+            for op in self._window_operations:
+                if op in WindowStatistics.OPERATIONS:
+                    values[op] = window_stats.compute(op, window_size)
+                else:
+                    values[op] = self._compute_window_feature(
+                        per_frame_values, frame_mask, window_size,
+                        self._window_operations[op]
+                    )
+            results[window_size] = values
+        return results
 
     def _window_circular(self, identity: int, window_size: int,
                          per_frame_values: np.ndarray) -> typing.Dict:
+        return self._window_circular_multi(
+            identity, [window_size], per_frame_values)[window_size]
 
-        values = {}
-        for op_name, op in self._window_operations.items():
-            values[op_name] = self._compute_window_features_circular(
-                per_frame_values, self._poses.identity_mask(identity),
-                window_size, op, op_name == 'std_dev')
-        return values
+    def _window_circular_multi(
+            self, identity: int, window_sizes: typing.Iterable[int],
+            per_frame_values: np.ndarray,
+            frame_mask: typing.Optional[np.ndarray] = None) -> typing.Dict:
+        """
+        window_multi for features with circular values
+        """
+        if frame_mask is None:
+            frame_mask = self._poses.identity_mask(identity)
+        window_stats = None
+        if self._circular_range is not None:
+            window_stats = CircularWindowStatistics(
+                per_frame_values, frame_mask, *self._circular_range)
+
+        results = {}
+        for window_size in window_sizes:
+            values = {}
+            for op_name, op in self._window_operations.items():
+                if (window_stats is not None and
+                        op_name in CircularWindowStatistics.OPERATIONS):
+                    values[op_name] = window_stats.compute(op_name,
+                                                           window_size)
+                else:
+                    values[op_name] = self._compute_window_features_circular(
+                        per_frame_values, frame_mask, window_size, op,
+                        op_name == 'std_dev')
+            results[window_size] = values
+        return results
 
     @staticmethod
     def window_width(window_size: int) -> int:
@@ -135,7 +201,7 @@ class Feature(abc.ABC):
         window_width = self.window_width(window_size)
 
         # generate a numpy mask array to mask out invalid frames
-        mask = np.full(self._poses.num_frames, 1)
+        mask = np.full(len(frame_mask), 1)
         mask[frame_mask == 1] = 0
 
         # generate masks for all of the rolling windows
@@ -211,7 +277,7 @@ class Feature(abc.ABC):
 
         :return: numpy nd array with circular feature values
         """
-        nframes = self._poses.num_frames
+        nframes = len(frame_mask)
         values = np.zeros_like(feature_values)
 
         def func_wrapper(_values):
@@ -1,6 +1,8 @@
 import abc
 import typing
 
+import numpy as np
+
 from src.pose_estimation import PoseEstimation
 from .feature_base_class import Feature
 
@@ -56,6 +58,28 @@ class FeatureGroup(abc.ABC):
             feature_modules.items()
         }
 
+    def window_multi(self, identity: int, window_sizes: typing.List[int],
+                     per_frame_values: typing.Dict,
+                     frame_mask: typing.Optional[np.ndarray] = None) -> typing.Dict:
+        """
+        compute window feature values for several window sizes at once
+        :param identity: subject identity
+        :param window_sizes: list of window sizes
+        :param per_frame_values: per frame feature values
+        :param frame_mask: optional frame mask for the identity, needed when
+        the per frame values only cover a range of frames
+        :return: dictionary where keys are the window sizes. The value for
+        each window size is the dict that window() returns for that size
+        """
+        feature_modules = self._init_feature_mods(identity)
+        results = {window_size: {} for window_size in window_sizes}
+        for name, mod in feature_modules.items():
+            mod_values = mod.window_multi(identity, window_sizes,
+                                          per_frame_values[name], frame_mask)
+            for window_size in window_sizes:
+                results[window_size][name] = mod_values[window_size]
+        return results
+
     def feature_names(self, features: typing.Optional[str] = None):
         """
         return a dictionary mapping feature module names to the
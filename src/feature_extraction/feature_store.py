@@ -0,0 +1,403 @@
+import collections
+import typing
+import uuid
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from src.pose_estimation import PoseHashException
+from .features import (FEATURE_VERSION, DistanceScaleException,
+                       FeatureVersionException)
+
+
+class FeatureStore:
+    """
+    per frame and window features for every identity of a video in a single
+    h5 file
+
+    For each identity and window size the per frame and window features are
+    stored as one float32 matrix, with a row for each frame and the columns
+    in the order used by Classifier.combine_data(), chunked along the frame
+    axis. The name of each column and the range of columns of each feature
+    are stored with the matrix, so the features for a set of frames can be
+    read from the matrix in one read and split back into the per frame and
+    window feature dicts used by IdentityFeatures.
+
+    file layout:
+
+      <identity>/window_<window size>/
+        features: float32 matrix with shape (#frames, #columns)
+        column_names: name of each column of the matrix
+        blocks: name of each feature in the matrix, either
+          'per_frame/<feature>' or 'window/<feature>/<op>'
+        block_columns: (start, stop, ndim) for each block, where [start, stop)
+          is the range of columns and ndim is the number of dimensions of
+          the feature array
+    """
+
+    FILENAME = 'features.h5'
+
+    # approximate size in bytes of each chunk of the feature matrix
+    _CHUNK_BYTES = 2 ** 20
+
+    # number of chunks of rows assembled and written at once
+    _CHUNKS_PER_WRITE = 16
+
+    # default size limit in bytes of the rows kept by each store's row cache
+    _ROW_CACHE_BYTES = 2 ** 26
+
+    def __init__(self, path: Path, compression: typing.Optional[str] = None,
+                 row_cache_bytes: int = _ROW_CACHE_BYTES):
+        """
+        :param path: path of the h5 file
+        :param compression: optional h5py compression filter for the feature
+        matrices, for example 'lzf' for fast compression. Only used when
+        writing features
+        :param row_cache_bytes: size limit in bytes of the rows kept from
+        earlier reads of selected frames, 0 to not keep any rows
+        """
+        self._path = Path(path)
+        self._compression = compression
+
+        # rows already read for each (identity, window size), as a tuple of
+        # the write id of the matrix, the sorted frame indexes of the rows
+        # and the rows. Reading the labeled frames again after more frames
+        # are labeled only reads the newly labeled frames from the file. The
+        # least recently used matrices are evicted when the cached rows
+        # exceed row_cache_bytes
+        self._row_cache = collections.OrderedDict()
+        self._row_cache_bytes = row_cache_bytes
+
+    @classmethod
+    def for_video(cls, feature_dir: Path, video: str,
+                  compression: typing.Optional[str] = None):
+        """
+        get the feature store for a video, which lives in the same directory
+        as the per identity feature files of the video
+        :param feature_dir: project feature directory
+        :param video: video or pose file name
+        :param compression: optional compression filter, see __init__
+        """
+        return cls(Path(feature_dir) / Path(video).stem / cls.FILENAME,
+                   compression)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def write(self, identity: int, window_size: int,
+              per_frame: typing.Dict[str, np.ndarray],
+              window: typing.Dict[str, typing.Dict[str, np.ndarray]],
+              feature_columns: typing.Dict[str, typing.List[str]],
+              pose_hash: str, distance_scale_factor: float):
+        """
+        write the features of an identity for a window size, replacing any
+        features previously stored for the identity and window size
+        :param identity: identity the features were computed for
+        :param window_size: window size of the window features
+        :param per_frame: per frame features, feature name to array with
+        shape (#frames,) or (#frames, #columns)
+        :param window: window features, feature name to dict of operation
+        name to array. The arrays can also be h5py datasets, which are read
+        one chunk of rows at a time
+        :param feature_columns: column names of each feature
+        :param pose_hash: hash of the pose file the features were computed
+        from
+        :param distance_scale_factor: distance scale factor used to compute
+        the features
+        :return: None
+        """
+        blocks = []
+        for feature in sorted(per_frame):
+            blocks.append((f'per_frame/{feature}', per_frame[feature],
+                           feature_columns[feature]))
+        for feature in sorted(window):
+            for op in sorted(window[feature]):
+                blocks.append((f'window/{feature}/{op}', window[feature][op],
+                               [f"{op} {col}"
+                                for col in feature_columns[feature]]))
+
+        num_frames = len(blocks[0][1])
+        widths = [1 if values.ndim == 1 else values.shape[1]
+                  for _, values, _ in blocks]
+        bounds = np.cumsum([0] + widths)
+        num_columns = int(bounds[-1])
+
+        self._path.parent.mkdir(mode=0o775, exist_ok=True, parents=True)
+        args = (identity, window_size, blocks, num_frames, num_columns,
+                bounds, pose_hash, distance_scale_factor)
+        try:
+            self.__write_group(*args)
+        except OSError:
+            # the file can't be opened or modified, for example because a
+            # write was interrupted and left it corrupt. Every identity of
+            # the video shares the file, so instead of leaving the store
+            # unusable it is started again. The features of the other
+            # identities are written again the next time they are missing
+            self._path.unlink(missing_ok=True)
+            self._row_cache.clear()
+            self.__write_group(*args)
+
+    def __write_group(self, identity, window_size, blocks, num_frames,
+                      num_columns, bounds, pose_hash, distance_scale_factor):
+        """ write the feature matrix of an identity and window size """
+        chunk_rows = max(1, min(num_frames,
+                                self._CHUNK_BYTES // (4 * num_columns)))
+        group_path = f'{identity}/window_{window_size}'
+        with h5py.File(self._path, 'a') as features_h5:
+            if group_path in features_h5:
+                del features_h5[group_path]
+            grp = features_h5.create_group(group_path)
+
+            matrix = grp.create_dataset(
+                'features', shape=(num_frames, num_columns), dtype=np.float32,
+                chunks=(chunk_rows, num_columns),
+                compression=self._compression)
+            step = chunk_rows * self._CHUNKS_PER_WRITE
+            for start in range(0, num_frames, step):
+                stop = min(start + step, num_frames)
+                matrix[start:stop] = np.concatenate(
+                    [values[start:stop].reshape(stop - start, -1)
+                     for _, values, _ in blocks], axis=1)
+
+            string_type = h5py.special_dtype(vlen=str)
+            grp.create_dataset(
+                'column_names', dtype=string_type,
+                data=[name for _, _, names in blocks for name in names])
+            grp.create_dataset('blocks', dtype=string_type,
+                               data=[name for name, _, _ in blocks])
+            grp.create_dataset('block_columns', data=np.column_stack(
+                (bounds[:-1], bounds[1:],
+                 [values.ndim for _, values, _ in blocks])))
+
+            # the version is written last, so features that were only
+            # partially written are treated as missing. The write id
+            # identifies this version of the matrix for the row cache
+            grp.attrs['write_id'] = uuid.uuid4().hex
+            grp.attrs['num_frames'] = num_frames
+            grp.attrs['pose_hash'] = pose_hash
+            grp.attrs['distance_scale_factor'] = distance_scale_factor
+            grp.attrs['version'] = FEATURE_VERSION
+
+    def read(self, identity: int, window_size: int, pose_hash: str,
+             distance_scale_factor: float,
+             rows: typing.Optional[np.ndarray] = None,
+             label_blocks: typing.Optional[typing.List[typing.Dict]] = None
+             ) -> typing.Tuple[typing.Dict, typing.Dict]:
+        """
+        read the features of an identity for a window size. If rows or
+        label_blocks are given, only the selected frames are read from the
+        file: each run of consecutive frames is read as a single hyperslab,
+        and frames already read by an earlier call on this store are not read
+        again
+        :param identity: identity to read features for
+        :param window_size: window size of the window features
+        :param pose_hash: hash of the current pose file
+        :param distance_scale_factor: expected distance scale factor
+        :param rows: optional boolean array selecting the frames to read
+        :param label_blocks: optional list of label blocks, as returned by
+        TrackLabels.get_blocks(), selecting the frames to read. Blocks must
+        be in frame order and must not overlap
+        :return: per frame features and window features, in the same format
+        as IdentityFeatures.get_per_frame() and get_window_features(). The
+        arrays are views of the columns of the feature matrix
+        :raises OSError: if unable to open the h5 file
+        :raises KeyError: if the features are not in the store
+        :raises FeatureVersionException: if the features were stored by a
+        different feature version
+        :raises PoseHashException: if the pose file changed since the
+        features were computed
+        :raises DistanceScaleException: if the features were computed with a
+        different distance scale factor
+        """
+        if label_blocks is not None:
+            indexes = np.concatenate(
+                [np.arange(block['start'], block['end'] + 1)
+                 for block in label_blocks] + [np.empty(0, dtype=np.int64)])
+        elif rows is not None:
+            indexes = np.flatnonzero(rows)
+        else:
+            indexes = None
+
+        with h5py.File(self._path, 'r') as features_h5:
+            grp = features_h5[f'{identity}/window_{window_size}']
+            self.__check_attrs(grp, pose_hash, distance_scale_factor)
+
+            matrix = grp['features']
+            if indexes is None:
+                data = matrix[:]
+            else:
+                data = self.__read_rows(
+                    matrix, (identity, window_size),
+                    grp.attrs['write_id'], indexes)
+
+            blocks = grp['blocks'].asstr()[:]
+            block_columns = grp['block_columns'][:]
+
+        per_frame = {}
+        window = {}
+        for name, (start, stop, ndim) in zip(blocks, block_columns):
+            values = data[:, start:stop]
+            if ndim == 1:
+                values = values[:, 0]
+
+            kind, feature, *op = name.split('/')
+            if kind == 'per_frame':
+                per_frame[feature] = values
+            else:
+                window.setdefault(feature, {})[op[0]] = values
+        return per_frame, window
+
+    def check(self, identity: int, window_size: int, pose_hash: str,
+              distance_scale_factor: float):
+        """
+        check that the features of an identity for a window size are in the
+        store and current
+        :param identity: identity to check
+        :param window_size: window size of the window features
+        :param pose_hash: hash of the current pose file
+        :param distance_scale_factor: expected distance scale factor
+        :return: None
+        :raises: the same exceptions as read()
+        """
+        with h5py.File(self._path, 'r') as features_h5:
+            self.__check_attrs(features_h5[f'{identity}/window_{window_size}'],
+                               pose_hash, distance_scale_factor)
+
+    def iter_matrix(self, identity: int, window_size: int, pose_hash: str,
+                    distance_scale_factor: float,
+                    features: typing.Optional[typing.Iterable[str]] = None,
+                    rows: typing.Optional[np.ndarray] = None,
+                    chunk_size: int = 2 ** 16):
+        """
+        generator that reads the feature matrix of an identity for a window
+        size one chunk of frames at a time, so the matrix for a long video
+        never has to be held in memory
+        :param identity: identity to read features for
+        :param window_size: window size of the window features
+        :param pose_hash: hash of the current pose file
+        :param distance_scale_factor: expected distance scale factor
+        :param features: optional feature names, if given only the columns of
+        these features are included, see column_names()
+        :param rows: optional boolean array selecting the frames to include
+        :param chunk_size: number of frames read at a time
+        :return: generator of (frame indexes, float32 matrix) tuples, one for
+        each chunk of frames
+        :raises: the same exceptions as read(), when the first chunk is read
+        """
+        with h5py.File(self._path, 'r') as features_h5:
+            grp = features_h5[f'{identity}/window_{window_size}']
+            self.__check_attrs(grp, pose_hash, distance_scale_factor)
+
+            columns = None
+            if features is not None:
+                columns = self.__columns(grp, features)
+
+            matrix = grp['features']
+            for start in range(0, matrix.shape[0], chunk_size):
+                stop = min(start + chunk_size, matrix.shape[0])
+                data = matrix[start:stop]
+                frame_indexes = np.arange(start, stop)
+                if rows is not None:
+                    selected = rows[start:stop]
+                    data = data[selected]
+                    frame_indexes = frame_indexes[selected]
+                if columns is not None:
+                    data = data[:, columns]
+                yield frame_indexes, data
+
+    def column_names(self, identity: int, window_size: int,
+                     features: typing.Optional[typing.Iterable[str]] = None
+                     ) -> typing.List[str]:
+        """
+        get the column names of the feature matrix of an identity and window
+        size
+        :param identity: identity
+        :param window_size: window size
+        :param features: optional feature names, if given only the columns of
+        these features are included
+        :return: list of column names, in the order of the columns of the
+        data returned by Classifier.combine_data() for the features
+        """
+        with h5py.File(self._path, 'r') as features_h5:
+            grp = features_h5[f'{identity}/window_{window_size}']
+            names = grp['column_names'].asstr()[:]
+            if features is not None:
+                names = names[self.__columns(grp, features)]
+        return list(names)
+
+    @staticmethod
+    def __columns(grp, features: typing.Iterable[str]) -> np.ndarray:
+        """
+        indexes of the columns of the given features in the feature matrix
+        of a group, in the order of the columns
+        """
+        features = set(features)
+        blocks = grp['blocks'].asstr()[:]
+        block_columns = grp['block_columns'][:]
+        return np.concatenate([
+            np.arange(start, stop)
+            for block, (start, stop, _) in zip(blocks, block_columns)
+            if block.split('/')[1] in features
+        ] + [np.empty(0, dtype=np.int64)])
+
+    def __read_rows(self, matrix, key, write_id,
+                    indexes: np.ndarray) -> np.ndarray:
+        """
+        read rows of the feature matrix, reusing rows read by earlier calls
+        :param matrix: h5py dataset of the feature matrix
+        :param key: (identity, window size) of the matrix
+        :param write_id: write id of the matrix
+        :param indexes: sorted frame indexes of the rows to read
+        :return: the rows, in the order of indexes
+        """
+        cached = self._row_cache.pop(key, None)
+        if cached is None or cached[0] != write_id:
+            cached = (write_id, np.empty(0, dtype=np.int64),
+                      np.empty((0, matrix.shape[1]), dtype=matrix.dtype))
+        _, cached_indexes, cached_rows = cached
+
+        missing = indexes[~np.isin(indexes, cached_indexes)]
+        if len(missing):
+            # read each run of consecutive rows as one hyperslab. Runs that
+            # are separated by less than a chunk of rows are read together,
+            # since they need to read the same chunks
+            gaps = np.flatnonzero(np.diff(missing) > matrix.chunks[0]) + 1
+            starts = missing[np.concatenate(([0], gaps))]
+            stops = missing[np.concatenate((gaps - 1, [len(missing) - 1]))] + 1
+            new_rows = np.concatenate([
+                matrix[start:stop][missing[(missing >= start) &
+                                           (missing < stop)] - start]
+                for start, stop in zip(starts, stops)
+            ])
+
+            cached_indexes = np.concatenate((cached_indexes, missing))
+            cached_rows = np.concatenate((cached_rows, new_rows))
+            order = np.argsort(cached_indexes, kind='stable')
+            cached_indexes = cached_indexes[order]
+            cached_rows = cached_rows[order]
+
+        result = cached_rows[np.searchsorted(cached_indexes, indexes)]
+
+        # keep the rows as the most recently used, then evict the least
+        # recently used matrices while the cache is over its size limit
+        self._row_cache[key] = (write_id, cached_indexes, cached_rows)
+        cache_bytes = sum(rows.nbytes for _, _, rows in
+                          self._row_cache.values())
+        while cache_bytes > self._row_cache_bytes and len(self._row_cache):
+            _, (_, _, rows) = self._row_cache.popitem(last=False)
+            cache_bytes -= rows.nbytes
+
+        return result
+
+    @staticmethod
+    def __check_attrs(grp, pose_hash: str, distance_scale_factor: float):
+        if grp.attrs['version'] != FEATURE_VERSION:
+            raise FeatureVersionException
+
+        if grp.attrs['pose_hash'] != pose_hash:
+            raise PoseHashException
+
+        if grp.attrs['distance_scale_factor'] != distance_scale_factor:
+            raise DistanceScaleException
@@ -1,4 +1,5 @@
 from pathlib import Path
+import os
 import typing
 
 import h5py
@@ -40,6 +41,13 @@ class IdentityFeatures:
 
     _version = FEATURE_VERSION
 
+    # number of frames per chunk when window features are computed or
+    # returned in chunks of frames
+    _CHUNK_SIZE = 2 ** 16
+
+    _POINT_MASK_COLUMNS = [f'{point.name} point mask'
+                           for point in PoseEstimation.KeypointIndex]
+
     def __init__(self, source_file, identity, directory, pose_est, force=False,
                  fps=30, distance_scale_factor: float = 1.0,
                  extended_features: typing.Optional[typing.Dict[str, typing.List[str]]] = None):
@@ -231,12 +239,7 @@ class IdentityFeatures:
         path = self._identity_feature_dir / f"window_features_{window_size}.h5"
 
         with h5py.File(path, 'w') as features_h5:
-            features_h5.attrs['window_size'] = window_size
-            features_h5.attrs['num_frames'] = self._num_frames
-            features_h5.attrs['identity'] = self._identity
-            features_h5.attrs['version'] = self._version
-            features_h5.attrs['distance_scale_factor'] = self._distance_scale_factor
-            features_h5.attrs['pose_hash'] = self._pose_hash
+            self.__write_window_attrs(features_h5, window_size)
 
             grp = features_h5.create_group('features')
 
@@ -245,6 +248,106 @@ class IdentityFeatures:
                     grp.create_dataset(f'{feature}/{op}',
                                        data=features[feature][op])
 
+    def __save_window_features_chunked(self, window_sizes, chunk_size):
+        """
+        compute window features in chunks of frames and write each chunk to
+        the window feature h5 files as it is computed, so the window features
+        for the whole video are never held in memory. Each file is written
+        under a temporary name and renamed once it is complete.
+        :param window_sizes: window sizes to compute and save
+        :param chunk_size: number of frames per chunk
+        :return: None
+        """
+        self._identity_feature_dir.mkdir(mode=0o775, exist_ok=True,
+                                         parents=True)
+
+        paths = {
+            window_size: self._identity_feature_dir /
+            f"window_features_{window_size}.h5"
+            for window_size in window_sizes
+        }
+        # include the pid in the temporary names so processes computing the
+        # same features don't write to the same temporary files
+        tmp_paths = {
+            window_size: path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            for window_size, path in paths.items()
+        }
+        files = {}
+
+        try:
+            for window_size, tmp_path in tmp_paths.items():
+                files[window_size] = h5py.File(tmp_path, 'w')
+
+            for window_size, features_h5 in files.items():
+                self.__write_window_attrs(features_h5, window_size)
+                features_h5.create_group('features')
+
+            for start, stop, features in self.__iter_window_chunks(
+                    window_sizes, chunk_size):
+                for window_size, features_h5 in files.items():
+                    grp = features_h5['features']
+                    for feature, ops in features[window_size].items():
+                        for op, values in ops.items():
+                            name = f'{feature}/{op}'
+                            if name not in grp:
+                                grp.create_dataset(
+                                    name,
+                                    shape=(self._num_frames,) +
+                                    values.shape[1:],
+                                    dtype=values.dtype)
+                            grp[name][start:stop] = values
+
+            for features_h5 in files.values():
+                features_h5.close()
+
+            for window_size, tmp_path in tmp_paths.items():
+                tmp_path.replace(paths[window_size])
+        finally:
+            for features_h5 in files.values():
+                features_h5.close()
+            # only left over if computing or writing the features failed
+            for tmp_path in tmp_paths.values():
+                tmp_path.unlink(missing_ok=True)
+
+    def __write_window_attrs(self, features_h5, window_size):
+        """ write the attributes identifying a window feature h5 file """
+        features_h5.attrs['window_size'] = window_size
+        features_h5.attrs['num_frames'] = self._num_frames
+        features_h5.attrs['identity'] = self._identity
+        features_h5.attrs['version'] = self._version
+        features_h5.attrs['distance_scale_factor'] = self._distance_scale_factor
+        features_h5.attrs['pose_hash'] = self._pose_hash
+
+    def __check_window_file(self, features_h5, window_size):
+        """
+        make sure a window feature h5 file can be used for this identity
+        :raises FeatureVersionException: if file version differs from current
+        feature version
+        :raises PoseHashException: if the pose file changed since the features
+        were computed
+        :raises DistanceScaleException: if the features were computed with a
+        different distance scale factor
+        """
+        # if the version of the feature file is not what we expect for
+        # this version of JABS raise an exception and it will be
+        # regenerated
+        if features_h5.attrs['version'] != FEATURE_VERSION:
+            raise FeatureVersionException
+
+        # if the contents of the pose file changed since these features
+        # were computed, then we will raise an exception and recompute
+        if features_h5.attrs['pose_hash'] != self._pose_hash:
+            raise PoseHashException
+
+        # make sure distances are using the expected scale
+        # if they don't match, we will need to recompute
+        if self._distance_scale_factor != features_h5.attrs['distance_scale_factor']:
+            raise DistanceScaleException
+
+        assert features_h5.attrs['num_frames'] == self._num_frames
+        assert features_h5.attrs['identity'] == self._identity
+        assert features_h5.attrs['window_size'] == window_size
+
     def __load_window_features(self, window_size):
         """
         load window features from an h5 file
@@ -264,28 +367,7 @@ class IdentityFeatures:
 
         window_features = {}
         with h5py.File(path, 'r') as features_h5:
-
-            # if the version of the feature file is not what we expect for
-            # this version of JABS raise an exception and it will be
-            # regenerated
-            if features_h5.attrs['version'] != FEATURE_VERSION:
-                raise FeatureVersionException
-
-            # if the contents of the pose file changed since these features
-            # were computed, then we will raise an exception and recompute
-            if features_h5.attrs['pose_hash'] != self._pose_hash:
-                raise PoseHashException
-
-            # make sure distances are using the expected scale
-            # if they don't match, we will need to recompute
-            if self._distance_scale_factor != features_h5.attrs['distance_scale_factor']:
-                raise DistanceScaleException
-
-            size_attr = features_h5.attrs['window_size']
-
-            assert features_h5.attrs['num_frames'] == self._num_frames
-            assert features_h5.attrs['identity'] == self._identity
-            assert size_attr == window_size
+            self.__check_window_file(features_h5, window_size)
 
             feature_grp = features_h5['features']
 
@@ -325,26 +407,150 @@ class IdentityFeatures:
         :return: window features for given window size. the format is documented
         in the docstring for _compute_window_features
         """
+        return self.get_multi_window_features(
+            [window_size], use_social, labels, force)[window_size]
 
-        if force or self._identity_feature_dir is None:
-            features = self.__compute_window_features(window_size)
-            if self._identity_feature_dir is not None:
-                self.__save_window_features(features, window_size)
+    def get_multi_window_features(self, window_sizes: typing.Iterable[int],
+                                  use_social: bool, labels=None,
+                                  force: bool = False):
+        """
+        get window features for several window sizes. Window sizes that were
+        not previously computed and saved are computed together in a single
+        pass over the per frame features, and each window size is then saved
+        to its own h5 file.
+        :param window_sizes: window sizes to get features for
+        :param use_social:
+        :param labels: optional frame labels, if present then only features for
+        labeled frames will be returned
+        :param force: force regeneration of the window features even if the
+        h5 files already exist
+        :return: dict mapping each window size to the window features for that
+        size, see get_window_features
+        """
+        # remove duplicates, but keep the order
+        window_sizes = list(dict.fromkeys(window_sizes))
+        features = self.__get_all_window_features(window_sizes, force)
+
+        return {
+            window_size: self.__filter_window_features(
+                features[window_size], use_social, labels)
+            for window_size in window_sizes
+        }
+
+    def __get_all_window_features(self, window_sizes: typing.List[int],
+                                  force: bool = False):
+        """
+        load or compute the window features for several window sizes, without
+        removing any features that are not enabled
+        :return: dict mapping each window size to the window features for that
+        size
+        """
+        features = {}
+        missing = []
+        for window_size in window_sizes:
+            if force or self._identity_feature_dir is None:
+                missing.append(window_size)
+                continue
 
-        else:
             try:
                 # h5 file exists for this window size, load it
-                features = self.__load_window_features(window_size)
+                features[window_size] = self.__load_window_features(
+                    window_size)
             except (OSError, FeatureVersionException, DistanceScaleException,
                     PoseHashException):
                 # h5 file does not exist for this window size, the version
                 # is not compatible, or the pose file changes.
-                # compute the features and return after saving
-                features = self.__compute_window_features(window_size)
+                # compute the features and save
+                missing.append(window_size)
+
+        if missing:
+            computed = self.__compute_window_features(missing)
+            if self._identity_feature_dir is not None:
+                for window_size in missing:
+                    self.__save_window_features(computed[window_size],
+                                                window_size)
+            features.update(computed)
 
-                if self._identity_feature_dir is not None:
-                    self.__save_window_features(features, window_size)
+        return features
 
+    def save_to_store(self, store, window_size: int, force: bool = False):
+        """
+        write all of the per frame features and the window features for a
+        window size to a FeatureStore. If this object has a project
+        directory, the window features are computed in chunks if they are
+        missing and copied to the store from their h5 file, so they are never
+        all held in memory at once
+        :param store: FeatureStore for the video of this identity
+        :param window_size: window size of the window features
+        :param force: force regeneration of the window features even if the
+        h5 file already exists
+        :return: None
+        """
+        if self._identity_feature_dir is None:
+            store.write(self._identity, window_size, self._per_frame,
+                        self.__get_all_window_features([window_size],
+                                                       force)[window_size],
+                        self.__feature_columns(), self._pose_hash,
+                        self._distance_scale_factor)
+            return
+
+        self.cache_window_features([window_size], force)
+        path = self._identity_feature_dir / f"window_features_{window_size}.h5"
+        with h5py.File(path, 'r') as features_h5:
+            feature_grp = features_h5['features']
+            window = {
+                feature: dict(feature_grp[feature].items())
+                for feature in feature_grp.keys()
+            }
+            store.write(self._identity, window_size, self._per_frame, window,
+                        self.__feature_columns(), self._pose_hash,
+                        self._distance_scale_factor)
+
+    def cache_window_features(self, window_sizes: typing.Iterable[int],
+                              force: bool = False,
+                              chunk_size: typing.Optional[int] = None):
+        """
+        make sure the window features for each window size are saved in the
+        project directory without returning them. Window sizes that are
+        missing are computed in chunks of frames and written to their h5
+        files incrementally, so this works for videos where the window
+        features for the whole video do not fit in memory. Does nothing if
+        this object was constructed with a value of None for directory.
+        :param window_sizes: window sizes to compute and save
+        :param force: force regeneration of the window features even if the
+        h5 files already exist
+        :param chunk_size: number of frames per chunk, defaults to
+        IdentityFeatures._CHUNK_SIZE
+        :return: None
+        """
+        if self._identity_feature_dir is None:
+            return
+
+        missing = []
+        for window_size in dict.fromkeys(window_sizes):
+            if force:
+                missing.append(window_size)
+                continue
+
+            path = (self._identity_feature_dir /
+                    f"window_features_{window_size}.h5")
+            try:
+                with h5py.File(path, 'r') as features_h5:
+                    self.__check_window_file(features_h5, window_size)
+            except (OSError, FeatureVersionException, DistanceScaleException,
+                    PoseHashException):
+                missing.append(window_size)
+
+        if missing:
+            self.__save_window_features_chunked(
+                missing, chunk_size or self._CHUNK_SIZE)
+
+    def __filter_window_features(self, features, use_social: bool,
+                                 labels=None):
+        """
+        remove features that are not enabled and, if labels are given, frames
+        that are not labeled
+        """
         feature_intersection = self.get_feature_names(
             use_social, self._extended_features)
         feature_intersection &= set(features.keys())
@@ -440,14 +646,148 @@ class IdentityFeatures:
             'frame_indexes': indexes
         }
 
-    def __compute_window_features(self, window_size: int):
+    def iter_feature_matrix(self, window_size: int, use_social: bool,
+                            store=None,
+                            chunk_size: typing.Optional[int] = None):
+        """
+        generator that yields the features for classification combined into
+        a single matrix for consecutive chunks of frames, the same rows as
+        passing the output of get_features() to Classifier.combine_data().
+        If a FeatureStore is given, the features are written to the store if
+        they are missing or stale, then each chunk is read from the store's
+        float32 feature matrix. Otherwise each chunk is combined from
+        iter_features().
+        :param window_size: window size to use
+        :param use_social: if true, include social features in returned data
+        No effect for v2 pose files.
+        :param store: optional FeatureStore for the video of this identity
+        :param chunk_size: number of frames per chunk, defaults to
+        IdentityFeatures._CHUNK_SIZE
+        :return: generator of dictionaries with the following keys, one for
+        each chunk of frames that has at least one frame where the identity
+        is valid:
+
+          'data': float32 2D array with shape (#frames, #columns), with a row
+             for each frame of the chunk where the identity is valid. The
+             columns are in the order of get_feature_column_names()
+          'frame_indexes': 1D np array, maps rows of 'data' back to global
+             frame indexes
+        """
+        chunk_size = chunk_size or self._CHUNK_SIZE
+
+        if store is None:
+            for features in self.iter_features(window_size, use_social,
+                                               chunk_size):
+                if len(features['frame_indexes']) == 0:
+                    continue
+                yield {
+                    'data': self.combine_features(
+                        features['per_frame'],
+                        features['window']).astype(np.float32),
+                    'frame_indexes': features['frame_indexes']
+                }
+            return
+
+        args = (self._identity, window_size, self._pose_hash,
+                self._distance_scale_factor)
+        try:
+            store.check(*args)
+        except (OSError, KeyError, FeatureVersionException,
+                DistanceScaleException, PoseHashException):
+            self.save_to_store(store, window_size)
+
+        for frame_indexes, data in store.iter_matrix(
+                *args,
+                features=self.get_feature_names(use_social,
+                                                self._extended_features),
+                rows=self._frame_valid == 1, chunk_size=chunk_size):
+            if len(frame_indexes) == 0:
+                continue
+            yield {'data': data, 'frame_indexes': frame_indexes}
+
+    def iter_features(self, window_size: int, use_social: bool,
+                      chunk_size: typing.Optional[int] = None):
+        """
+        generator version of get_features that yields the features for
+        consecutive chunks of frames, so the window features for a long video
+        never have to be held in memory all at once. If this object has a
+        project directory, missing window features are first computed and
+        saved in chunks, then read back one chunk at a time. Otherwise the
+        window features are computed as each chunk is needed.
+        :param window_size: window size to use
+        :param use_social: if true, include social features in returned data
+        No effect for v2 pose files.
+        :param chunk_size: number of frames per chunk, defaults to
+        IdentityFeatures._CHUNK_SIZE
+        :return: generator of dictionaries in the format returned by
+        get_features, one for each chunk of frames. 'frame_indexes' maps the
+        rows of each chunk back to global frame indexes
+        """
+        chunk_size = chunk_size or self._CHUNK_SIZE
+        feature_names = self.get_feature_names(
+            use_social, self._extended_features)
+
+        if self._identity_feature_dir is None:
+            for start, stop, window_features in self.__iter_window_chunks(
+                    [window_size], chunk_size):
+                yield self.__chunk_features(
+                    start, stop, window_features[window_size], feature_names)
+            return
+
+        self.cache_window_features([window_size], chunk_size=chunk_size)
+        path = self._identity_feature_dir / f"window_features_{window_size}.h5"
+        with h5py.File(path, 'r') as features_h5:
+            feature_grp = features_h5['features']
+            for start in range(0, self._num_frames, chunk_size):
+                stop = min(start + chunk_size, self._num_frames)
+                window_features = {
+                    feature: {
+                        op: feature_grp[f'{feature}/{op}'][start:stop]
+                        for op in feature_grp[feature].keys()
+                    }
+                    for feature in feature_grp.keys()
+                    if feature in feature_names
+                }
+                yield self.__chunk_features(start, stop, window_features,
+                                            feature_names)
+
+    def __chunk_features(self, start, stop, window_features, feature_names):
+        """
+        features for the frames in [start, stop) where the identity is valid,
+        in the format returned by get_features
+        :param start: first frame of the chunk
+        :param stop: end of the chunk (exclusive)
+        :param window_features: window features for the frames of the chunk
+        :param feature_names: names of the enabled features
+        """
+        valid = self._frame_valid[start:stop] == 1
+
+        per_frame = {
+            feature: self._per_frame[feature][start:stop][valid]
+            for feature in feature_names
+        }
+        window = {
+            feature: {op: values[valid] for op, values in ops.items()}
+            for feature, ops in window_features.items()
+            if feature in feature_names
+        }
+
+        return {
+            'per_frame': per_frame,
+            'window': window,
+            'frame_indexes': start + np.flatnonzero(valid)
+        }
+
+    def __compute_window_features(self, window_sizes: typing.List[int]):
         """
-        compute all window features using a given window size
-        :param window_size: number of frames on each side of the current frame
+        compute all window features for a list of window sizes. The window
+        statistics for every size are computed in a single pass over each
+        feature module's per frame values
+        :param window_sizes: number of frames on each side of the current frame
         to include in the window
         (so, for example, if window_size = 5, then the total number of frames
         in the window is 11)
-        :return: dictionary of the form:
+        :return: dictionary mapping each window size to a dict of the form:
         {
             'angles' {
                 'mean': numpy float32 array with shape (#frames, #angles),
@@ -465,15 +805,61 @@ class IdentityFeatures:
         }
         """
 
-        window_features = {}
+        window_features = {window_size: {} for window_size in window_sizes}
 
         for key in self._feature_modules:
-            window_features.update(
-                self._feature_modules[key].window(self._identity, window_size,
-                                                  self._per_frame))
+            group_features = self._feature_modules[key].window_multi(
+                self._identity, window_sizes, self._per_frame)
+            for window_size in window_sizes:
+                window_features[window_size].update(
+                    group_features[window_size])
 
         return window_features
 
+    def __iter_window_chunks(self, window_sizes: typing.List[int],
+                             chunk_size: int):
+        """
+        compute the window features in chunks of frames. Each chunk is
+        computed from the per frame features of the chunk plus a halo of
+        frames on either side as wide as the largest window, so every window
+        sees the same frames it would if the whole video was computed at
+        once.
+        :param window_sizes: window sizes to compute
+        :param chunk_size: number of frames per chunk
+        :return: generator of (start, stop, window features) tuples, where the
+        window features are in the format returned by
+        __compute_window_features for the frames in [start, stop)
+        """
+        halo = max(window_sizes)
+        for start in range(0, self._num_frames, chunk_size):
+            stop = min(start + chunk_size, self._num_frames)
+            halo_start = max(0, start - halo)
+            halo_stop = min(self._num_frames, stop + halo)
+
+            per_frame = {
+                feature: values[halo_start:halo_stop]
+                for feature, values in self._per_frame.items()
+            }
+            frame_mask = self._frame_valid[halo_start:halo_stop]
+
+            window_features = {window_size: {} for window_size in window_sizes}
+            for key in self._feature_modules:
+                group_features = self._feature_modules[key].window_multi(
+                    self._identity, window_sizes, per_frame, frame_mask)
+                for window_size in window_sizes:
+                    window_features[window_size].update(
+                        group_features[window_size])
+
+            # remove the halo
+            rows = slice(start - halo_start, stop - halo_start)
+            yield start, stop, {
+                window_size: {
+                    feature: {op: values[rows] for op, values in ops.items()}
+                    for feature, ops in features.items()
+                }
+                for window_size, features in window_features.items()
+            }
+
     def get_feature_column_names(self, use_social: bool, ):
         """
         build up a list of column names for the 2D feature array that will be
@@ -483,7 +869,7 @@ class IdentityFeatures:
         column_names = []
         # start with point_mask as a special case, as it is not computed in
         # a feature module -- it's just added directly from self._pose_est
-        per_frame_features = {'point_mask': [f'{point.name } point mask' for point in PoseEstimation.KeypointIndex]}
+        per_frame_features = {'point_mask': self._POINT_MASK_COLUMNS}
         window_features = {}
         base_groups = [m.name() for m in _FEATURE_MODULES]
         for key in self._feature_modules:
@@ -515,12 +901,56 @@ class IdentityFeatures:
         for f in sorted(per_frame_features):
             column_names += per_frame_features[f]
 
+        # then the window features, by feature and then operation, both
+        # alphabetically. The columns of each operation are in the same order
+        # as the per frame feature columns
         for f in sorted(window_features):
-            for col in sorted(window_features[f]):
-                for op in sorted(window_features[f][col]):
+            ops = {op for col in window_features[f]
+                   for op in window_features[f][col]}
+            for op in sorted(ops):
+                for col in window_features[f]:
                     column_names.append(f"{op} {col}")
         return column_names
 
+    def __feature_columns(self) -> typing.Dict[str, typing.List[str]]:
+        """
+        column names of every per frame feature, including the features that
+        are not enabled
+        """
+        columns = {'point_mask': self._POINT_MASK_COLUMNS}
+        for group in self._feature_modules.values():
+            columns.update(group.feature_names(group.module_names()))
+        return columns
+
+    @staticmethod
+    def combine_features(per_frame, window) -> np.ndarray:
+        """
+        combine per frame and window features into a single 2D array with
+        the shape #frames, #features. Features are sorted by name so the
+        order of the columns is consistent, see get_feature_column_names
+        :param per_frame: per frame features dictionary
+        :param window: window feature dictionary
+        :return: numpy array with shape #frames, #features
+        """
+        datasets = []
+        # add per frame features to our data set
+        # sort the feature names in the dict so the order is consistent
+        for feature in sorted(per_frame):
+            datasets.append(per_frame[feature])
+
+        # add window features to our data set
+        # sort the feature names in the dict so the order is consistent
+        for feature in sorted(window):
+            # [source_feature_name][operator_applied] : numpy array
+            # iterate over operator names
+            for op in sorted(window[feature]):
+                # append the numpy array to the dataset
+                datasets.append(window[feature][op])
+
+        # expand any 1D features to 2D so that we can concatenate in one call
+        datasets = [(d[:, np.newaxis] if d.ndim == 1 else d) for d in datasets]
+        return np.concatenate(datasets, axis=1)
+
     @classmethod
     def merge_per_frame_features(cls, features: list, include_social: bool,
                                  extended_features=None) -> dict:
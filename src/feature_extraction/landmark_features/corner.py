@@ -3,11 +3,10 @@ import typing
 
 import numpy as np
 import scipy.stats
-from shapely.geometry import Point
-
 
 from src.pose_estimation import PoseEstimation
 from src.feature_extraction.feature_base_class import Feature
+from src.utils.geometry import compute_angles, hull_point_distances
 
 
 class CornerDistanceInfo:
@@ -39,7 +38,6 @@ class CornerDistanceInfo:
         else:
             distances = np.zeros(self._poses.num_frames, dtype=np.float32)
             bearings = np.zeros(self._poses.num_frames, dtype=np.float32)
-            self_convex_hulls = self._poses.get_identity_convex_hulls(identity)
             idx = PoseEstimation.KeypointIndex
 
             try:
@@ -47,40 +45,35 @@ class CornerDistanceInfo:
             except KeyError:
                 return distances, bearings
 
-            for frame in range(self._poses.num_frames):
-
-                # don't scale the point coordinates by the pixel_scale value,
-                # since the corners are in pixel space. we'll adjust the
-                # distance units later
-                points, mask = self._poses.get_points(frame, identity)
+            vertices, num_vertices = \
+                self._poses.get_identity_convex_hull_arrays(identity)
 
-                if points is None:
-                    continue
+            # find distance to each corner. don't scale the point coordinates
+            # by the pixel_scale value, since the corners are in pixel space.
+            # we'll adjust the distance units later
+            corner_distances = hull_point_distances(vertices, num_vertices,
+                                                    corners)
 
-                # find distance to closest corner
-                self_shape = self_convex_hulls[frame]
-                distance = float('inf')
-                corner_coordinates = (0, 0)
-                for i in range(4):
-                    d = self_shape.distance(Point(corners[i, 0], corners[i, 1]))
-                    if d < distance:
-                        distance = d
-                        corner_coordinates = (corners[i, 0], corners[i, 1])
+            # frames where the identity has a convex hull
+            valid = ((self._poses.identity_mask(identity) == 1) &
+                     ~np.isnan(corner_distances).any(axis=1))
+            frames = np.flatnonzero(valid)
 
-                self_base_neck_point = points[idx.BASE_NECK, :]
-                self_nose_point = points[idx.NOSE, :]
+            # find closest corner, the first one in the case of a tie
+            closest = np.argmin(corner_distances[frames], axis=1)
+            distance = corner_distances[frames, closest]
+            corner_coordinates = corners[closest]
 
-                bearing = self.compute_angle(
-                    self_nose_point,
-                    self_base_neck_point,
-                    corner_coordinates)
+            points, _ = self._poses.get_identity_poses(identity)
+            bearing = compute_angles(points[frames, idx.NOSE],
+                                     points[frames, idx.BASE_NECK],
+                                     corner_coordinates)
 
-                # make angle in range [180, -180)
-                if bearing > 180:
-                    bearing -= 360
+            # make angle in range [180, -180)
+            bearing = np.where(bearing > 180, bearing - 360, bearing)
 
-                distances[frame] = distance * self._pixel_scale
-                bearings[frame] = bearing
+            distances[frames] = distance * self._pixel_scale
+            bearings[frames] = bearing
             self._cached_distances[identity] = distances, bearings
             return distances, bearings
 
@@ -137,6 +130,7 @@ class BearingToCorner(Feature):
         "mean": lambda x: scipy.stats.circmean(x, low=-180, high=180),
         "std_dev": lambda x: scipy.stats.circstd(x, low=-180, high=180),
     }
+    _circular_range = (-180, 180)
 
     def __init__(self, poses: PoseEstimation, pixel_scale: float,
                  distances: CornerDistanceInfo):
@@ -159,3 +153,9 @@ class BearingToCorner(Feature):
         # need to override to use special method for computing window features
         # with circular values
         return self._window_circular(identity, window_size, per_frame_values)
+
+    def window_multi(self, identity: int, window_sizes: typing.Iterable[int],
+                     per_frame_values: np.ndarray,
+                     frame_mask: typing.Optional[np.ndarray] = None) -> typing.Dict:
+        return self._window_circular_multi(identity, window_sizes,
+                                           per_frame_values, frame_mask)
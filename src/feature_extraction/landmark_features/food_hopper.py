@@ -1,9 +1,8 @@
 import numpy as np
 
-import cv2
-
 from src.pose_estimation import PoseEstimation
 from src.feature_extraction.feature_base_class import Feature
+from src.utils.geometry import polygon_signed_distances
 
 _EXCLUDED_POINTS = [PoseEstimation.KeypointIndex.MID_TAIL,
                     PoseEstimation.KeypointIndex.TIP_TAIL]
@@ -32,27 +31,19 @@ class FoodHopper(Feature):
         if self._pixel_scale is not None:
             hopper = hopper * self._pixel_scale
 
-        # swap the point x,y values and change dtype to float32 for open cv
-        hopper_pts = hopper[:, [1, 0]].astype(np.float32)
+        # swap the point x,y values to match the opencv coordinate space used
+        # by the static objects
+        hopper_pts = hopper[:, [1, 0]]
 
         points, _ = self._poses.get_identity_poses(identity, self._pixel_scale)
 
+        # for each keypoint we will find the signed distance to the food
+        # hopper at each frame, positive if the keypoint is within the
+        # food hopper
+        key_points = [p.value for p in PoseEstimation.KeypointIndex
+                      if p not in _EXCLUDED_POINTS]
         values = np.zeros((self._poses.num_frames, len(self._feature_names)))
-
-        # for each keypoint we will find if that keypoint is within the
-        # food hopper at each frame, then we will set values to 1.0 everywhere
-        # this is true
-        for key_point in PoseEstimation.KeypointIndex:
-            # skip over the key points we don't care about
-            if key_point in _EXCLUDED_POINTS:
-                continue
-
-            # swap our x,y to match the opencv coordinate space
-            pts = points[:, key_point.value, [1, 0]]
-
-            values[:, key_point.value] = np.asarray(
-                [cv2.pointPolygonTest(hopper_pts, (p[0], p[1]), True) for p in pts]
-            )
+        values[:, key_points] = polygon_signed_distances(
+            points[:, key_points][..., [1, 0]], hopper_pts)
 
         return values
-
@@ -21,6 +21,7 @@ class ClosestFovAngles(Feature):
         "mean": lambda x: scipy.stats.circmean(x, low=-180, high=180),
         "std_dev": lambda x: scipy.stats.circstd(x, low=-180, high=180),
     }
+    _circular_range = (-180, 180)
 
     def __init__(self, poses: 'PoseEstimation', pixel_scale: float,
                  social_distance_info: 'ClosestIdentityInfo'):
@@ -41,3 +42,9 @@ class ClosestFovAngles(Feature):
         # need to override to use special method for computing window features
         # with circular values
         return self._window_circular(identity, window_size, per_frame_values)
+
+    def window_multi(self, identity: int, window_sizes: typing.Iterable[int],
+                     per_frame_values: np.ndarray,
+                     frame_mask: typing.Optional[np.ndarray] = None) -> typing.Dict:
+        return self._window_circular_multi(identity, window_sizes,
+                                           per_frame_values, frame_mask)
@@ -1,8 +1,92 @@
 import math
+import typing
+import weakref
 
 import numpy as np
 
 from src.pose_estimation import PoseEstimation
+from src.utils.geometry import (compute_angles, hull_distances,
+                                point_pair_distances)
+
+
+class IdentityDistanceMatrix:
+    """
+    distances between the convex hulls of every pair of identities in a
+    video, for every frame, along with the centroid of each hull
+
+    The distance between two hulls is symmetric, so each pair is only
+    computed and stored once. This is computed once per video and shared by
+    the ClosestIdentityInfo of every identity, use for_poses() to get the
+    shared instance for a PoseEstimation object.
+    """
+
+    # shared instance for each PoseEstimation object, released when the
+    # PoseEstimation object is no longer referenced
+    _shared = weakref.WeakKeyDictionary()
+
+    def __init__(self, poses: PoseEstimation):
+        self._index = {identity: i for i, identity in
+                       enumerate(poses.identities)}
+        num_identities = len(self._index)
+        self._num_frames = poses.num_frames
+
+        hulls = [poses.get_identity_convex_hull_arrays(identity)
+                 for identity in poses.identities]
+
+        # one row for each pair of identities (i, j) with i < j, in the same
+        # order as the upper triangle of a (#identities, #identities) matrix.
+        # inf if either convex hull is missing for the frame
+        self._pair_rows = np.full((num_identities, num_identities), -1,
+                                  dtype=np.int64)
+        rows, cols = np.triu_indices(num_identities, k=1)
+        self._pair_rows[rows, cols] = np.arange(len(rows))
+        self._pair_rows[cols, rows] = np.arange(len(rows))
+
+        self._distances = np.empty((len(rows), poses.num_frames))
+        for row, (i, j) in enumerate(zip(rows, cols)):
+            distances = hull_distances(*hulls[i], *hulls[j])
+            distances[np.isnan(distances)] = np.inf
+            self._distances[row] = distances
+
+        self._centroids = [poses.get_identity_hull_centroids(identity)
+                           for identity in poses.identities]
+
+    @classmethod
+    def for_poses(cls, poses: PoseEstimation) -> 'IdentityDistanceMatrix':
+        """
+        get the distance matrix for a PoseEstimation object, computing it
+        the first time it is requested
+        """
+        matrix = cls._shared.get(poses)
+        if matrix is None:
+            matrix = cls(poses)
+            cls._shared[poses] = matrix
+        return matrix
+
+    def distances(self, identity: int,
+                  others: typing.Iterable[int]) -> np.ndarray:
+        """
+        get the distances from one identity to a list of other identities
+        :return: numpy array with shape (#others, #frames), inf for frames
+        where either convex hull is missing
+        """
+        i = self._index[identity]
+        rows = np.array([self._pair_rows[i, self._index[other]]
+                         for other in others], dtype=np.int64)
+
+        # an identity has no distance to itself, use inf like a missing hull
+        distances = np.full((len(rows), self._num_frames), np.inf)
+        valid = rows != -1
+        distances[valid] = self._distances[rows[valid]]
+        return distances
+
+    def centroids(self, identity: int) -> np.ndarray:
+        """
+        get the convex hull centroids of an identity
+        :return: numpy array with shape (#frames, 2), NaN for frames without
+        a convex hull
+        """
+        return self._centroids[self._index[identity]]
 
 
 class ClosestIdentityInfo:
@@ -17,9 +101,22 @@ class ClosestIdentityInfo:
     _half_fov_deg = 120
 
     def __init__(self, poses: PoseEstimation, identity: int,
-                 pixel_scale: float):
+                 pixel_scale: float,
+                 distance_matrix: typing.Optional[
+                     IdentityDistanceMatrix] = None):
+        """
+        :param poses: PoseEstimation object
+        :param identity: identity to compute info for
+        :param pixel_scale: scale factor used for the pairwise social
+        distances
+        :param distance_matrix: optional distance matrix for poses, the
+        shared matrix for poses is used if not given
+        """
         idx = PoseEstimation.KeypointIndex
 
+        if distance_matrix is None:
+            distance_matrix = IdentityDistanceMatrix.for_poses(poses)
+
         self._poses = poses
         self._identity = identity
         self._pixel_scale = pixel_scale
@@ -30,52 +127,63 @@ class ClosestIdentityInfo:
                                                dtype=np.int16)
         self._fov_angles = np.zeros(poses.num_frames, dtype=np.float32)
 
-        for frame in range(poses.num_frames):
-            points, mask = poses.get_points(frame, identity, pixel_scale)
+        # other identities, in the order they are compared to this identity.
+        # ties are broken in favor of the first identity in this list
+        self._other_identities = np.array(
+            [i for i in poses.identities if i != identity], dtype=np.int64)
+
+        points, mask = poses.get_identity_poses(identity, pixel_scale)
+        _, self_num_vertices = poses.get_identity_convex_hull_arrays(identity)
+
+        # Find the distance and identity of the closest animal at each
+        # frame, as well as the distance, identity and angle of the closes
+        # animal in field of view. In order to calculate this we require
+        # that both animals have a valid convex hull and the the self
+        # identity has a valid nose point and base neck point (which is
+        # used to calculate FoV).
+        frame_valid = ((poses.identity_mask(identity) == 1) &
+                       (self_num_vertices > 0) &
+                       (mask[:, idx.NOSE] == 1) & (mask[:, idx.BASE_NECK] == 1))
+
+        # distance between the convex hull of this identity and the convex
+        # hull of each of the other identities, shape (#others, #frames).
+        # inf if either convex hull is missing or the frame is not valid
+        self._distances = np.where(
+            frame_valid,
+            distance_matrix.distances(identity, self._other_identities),
+            np.inf)
+        view_angles = np.zeros_like(self._distances)
+
+        for i, other_id in enumerate(self._other_identities):
+            view_angles[i] = compute_angles(
+                points[:, idx.NOSE], points[:, idx.BASE_NECK],
+                distance_matrix.centroids(other_id))
+
+        # for FoV we want the range of view angle to be [180, -180)
+        view_angles = np.where(view_angles > 180, view_angles - 360,
+                               view_angles)
+
+        if len(self._other_identities):
+            frames = np.arange(poses.num_frames)
+
+            closest = np.argmin(self._distances, axis=0)
+            has_closest = np.isfinite(self._distances[closest, frames])
+            self._closest_identities[has_closest] = \
+                self._other_identities[closest[has_closest]]
+
+            fov_distances = np.where(
+                np.abs(view_angles) <= self._half_fov_deg, self._distances,
+                np.inf)
+            closest_fov = np.argmin(fov_distances, axis=0)
+            has_closest_fov = np.isfinite(fov_distances[closest_fov, frames])
+            self._closest_fov_identities[has_closest_fov] = \
+                self._other_identities[closest_fov[has_closest_fov]]
+            self._fov_angles[has_closest_fov] = view_angles[
+                closest_fov, frames][has_closest_fov]
 
-            # skip this frame if the identity is not present
-            if points is None:
-                continue
-
-            # Find the distance and identity of the closest animal at each
-            # frame, as well as the distance, identity and angle of the closes
-            # animal in field of view. In order to calculate this we require
-            # that both animals have a valid convex hull and the the self
-            # identity has a valid nose point and base neck point (which is
-            # used to calculate FoV).
-            self_shape = poses.get_identity_convex_hulls(identity)[frame]
-            if self_shape is not None and mask[idx.NOSE] == 1 and mask[idx.BASE_NECK] == 1:
-                closest_dist = None
-                closest_fov_dist = None
-                for curr_id in poses.identities:
-                    if curr_id != identity:
-                        other_shape = poses.get_identity_convex_hulls(curr_id)[frame]
-
-                        if other_shape is not None:
-                            curr_dist = self_shape.distance(other_shape)
-                            if closest_dist is None or curr_dist < closest_dist:
-                                self._closest_identities[frame] = curr_id
-                                closest_dist = curr_dist
-
-                            self_base_neck_point = points[idx.BASE_NECK, :]
-                            self_nose_point = points[idx.NOSE, :]
-                            other_centroid = np.array(other_shape.centroid)
-
-                            view_angle = self.compute_angle(
-                                self_nose_point,
-                                self_base_neck_point,
-                                other_centroid)
-
-                            # for FoV we want the range of view angle to be [180, -180)
-                            if view_angle > 180:
-                                view_angle -= 360
-
-                            if abs(view_angle) <= self._half_fov_deg:
-                                # other animal is in FoV
-                                if closest_fov_dist is None or curr_dist < closest_fov_dist:
-                                    self._closest_fov_identities[frame] = curr_id
-                                    self._fov_angles[frame] = view_angle
-                                    closest_fov_dist = curr_dist
+    @property
+    def identity(self):
+        return self._identity
 
     @property
     def closest_identities(self):
@@ -108,23 +216,20 @@ class ClosestIdentityInfo:
         return angle + 360 if angle < 0 else angle
 
     def compute_distances(self, closest_identities: np.ndarray) -> np.ndarray:
+        """
+        get the distance between the convex hull of this identity and the
+        convex hull of the given identity for each frame
+        :param closest_identities: identity to use for each frame, -1 if
+        there is no identity for the frame
+        :return: numpy array of distances, 0 for frames without an identity
+        """
         values = np.zeros(self._poses.num_frames, dtype=np.float32)
-        self_convex_hulls = self._poses.get_identity_convex_hulls(self._identity)
-
-        for frame in range(self._poses.num_frames):
-
-            points, mask = self._poses.get_points(frame, self._identity, self._pixel_scale)
-
-            if points is None:
-                continue
-
-            closest_id = closest_identities[frame]
-            if closest_id != -1:
-                self_shape = self_convex_hulls[frame]
-                other_shape = self._poses.get_identity_convex_hulls(closest_id)[
-                    frame]
-                values[frame] = self_shape.distance(other_shape)
+        frames = np.flatnonzero(
+            (self._poses.identity_mask(self._identity) == 1) &
+            (closest_identities != -1))
 
+        rows = self._other_identity_rows(closest_identities[frames])
+        values[frames] = self._distances[rows, frames]
         return values
 
     def compute_pairwise_social_distances(
@@ -138,34 +243,40 @@ class ClosestIdentityInfo:
         # distances
         social_pt_indexes = [idx.value for idx in social_points]
 
-        for frame in range(self._poses.num_frames):
-            points, mask = self._poses.get_points(frame, self._identity,
-                                                  self._pixel_scale)
-
-            if points is None or closest_identities[frame] == -1:
-                continue
+        frames = np.flatnonzero(
+            (self._poses.identity_mask(self._identity) == 1) &
+            (closest_identities != -1))
 
-            closest_points, _ = self._poses.get_points(
-                frame, closest_identities[frame], self._pixel_scale)
+        points, _ = self._poses.get_identity_poses(self._identity,
+                                                   self._pixel_scale)
+        points = points[frames][:, social_pt_indexes].astype(np.float64)
 
-            values[frame] = self._compute_social_pairwise_distance(
-                points[social_pt_indexes, ...],
-                closest_points[social_pt_indexes, ...])
+        # gather the points of the closest identity for each frame
+        closest_points = np.zeros_like(points)
+        frame_closest = closest_identities[frames]
+        for other_id in self._other_identities:
+            other_frames = frame_closest == other_id
+            if not other_frames.any():
+                continue
+            other_points, _ = self._poses.get_identity_poses(
+                other_id, self._pixel_scale)
+            closest_points[other_frames] = other_points[
+                frames[other_frames]][:, social_pt_indexes]
+
+        # distances between all pairwise combinations of points, with the
+        # points of this identity in the outer loop
+        npoints = len(social_pt_indexes)
+        values[frames] = point_pair_distances(
+            points, closest_points,
+            np.repeat(np.arange(npoints), npoints),
+            np.tile(np.arange(npoints), npoints))
         return values
 
-    @staticmethod
-    def _compute_social_pairwise_distance(points1, points2):
+    def _other_identity_rows(self, identities: np.ndarray) -> np.ndarray:
         """
-        compute distances between all pairs of points
-        :param points1: 1st collection of points
-        :param points2: 2st collection of points
-        :return: list of distances between all pairwise combinations of points
-            from points1 and points2
+        map identities to the corresponding row in self._distances
         """
-        distances = []
-
-        for p1 in points1:
-            for p2 in points2:
-                dist = math.dist(p1, p2)
-                distances.append(dist)
-        return distances
+        lookup = np.zeros(max(self._poses.identities) + 1, dtype=np.int64)
+        lookup[self._other_identities] = np.arange(
+            len(self._other_identities))
+        return lookup[identities]
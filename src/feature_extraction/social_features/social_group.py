@@ -32,9 +32,13 @@ class SocialFeatureGroup(FeatureGroup):
 
         # cache the most recent ClosestIdentityInfo, it's needed by
         # the IdentityFeatures class when saving the social features to the
-        # h5 file
-        self._closest_identities_cache = ClosestIdentityInfo(
-            self._poses, identity, self._pixel_scale)
+        # h5 file. It is also reused when computing the window features for
+        # the same identity. The distances between identities are shared by
+        # all the identities in the video, see IdentityDistanceMatrix
+        if (self._closest_identities_cache is None or
+                self._closest_identities_cache.identity != identity):
+            self._closest_identities_cache = ClosestIdentityInfo(
+                self._poses, identity, self._pixel_scale)
 
         # initialize all the feature modules specified in the current config
         return {
@@ -0,0 +1,360 @@
+import typing
+
+import numpy as np
+
+
+def _window_bounds(num_frames: int, window_size: int) -> typing.Tuple[
+        np.ndarray, np.ndarray]:
+    """
+    [start, stop) frame indexes of the window centered on each frame,
+    truncated at the start and end of the video
+    """
+    frames = np.arange(num_frames)
+    return (np.maximum(frames - window_size, 0),
+            np.minimum(frames + window_size + 1, num_frames))
+
+
+def _cumsum(values: np.ndarray) -> np.ndarray:
+    """
+    cumulative sum along the frame axis with a leading row of zeros, so the
+    sum over frames [start, stop) is result[stop] - result[start]
+    """
+    result = np.zeros((values.shape[0] + 1,) + values.shape[1:],
+                      dtype=values.dtype)
+    np.cumsum(values, axis=0, out=result[1:])
+    return result
+
+
+def _finite_cumsum(values: np.ndarray) -> typing.Tuple[np.ndarray,
+                                                       np.ndarray]:
+    """
+    cumulative sum of the finite values, and cumulative count of the
+    non-finite values, along the frame axis. Non-finite values are summed as
+    zero, so a NaN only affects the windows that contain it instead of every
+    window after it
+    """
+    non_finite = ~np.isfinite(values)
+    return (_cumsum(np.where(non_finite, 0, values)),
+            _cumsum(non_finite.astype(np.int64)))
+
+
+def _where_finite(non_finite_count: np.ndarray,
+                  values: np.ndarray) -> np.ndarray:
+    """ set values to NaN for windows that contain a non-finite value """
+    return np.where(non_finite_count > 0, np.nan, values)
+
+
+class WindowStatistics:
+    """
+    sliding window statistics for a per frame feature
+
+    computes the linear window feature values (mean, median, std_dev, max,
+    min) for every column of a 1D or 2D per frame feature array at once,
+    without building numpy masked arrays. Frames where the identity is not
+    valid are excluded from every window.
+
+    mean and std_dev are computed from cumulative sums, max and min with the
+    van Herk/Gil-Werman algorithm (a vectorized form of the monotonic deque
+    sliding window extreme), and median by sorting each window of values in
+    bounded size chunks of frames.
+
+    windows that do not contain any valid frames get a value of 0
+    """
+
+    # window operations supported by this class
+    OPERATIONS = ('mean', 'median', 'std_dev', 'max', 'min')
+
+    # upper bound on the number of elements sorted at once when computing
+    # the median
+    _MEDIAN_CHUNK_ELEMENTS = 2 ** 22
+
+    def __init__(self, values: np.ndarray, frame_mask: np.ndarray):
+        """
+        :param values: per frame feature values, either a 1D array with shape
+        (#frames,) or a 2D array with shape (#frames, #columns)
+        :param frame_mask: array indicating which frames are valid for the
+        current identity
+        """
+        self._dtype = values.dtype
+        self._is_1d = values.ndim == 1
+        self._values = np.asarray(values, dtype=np.float64).reshape(
+            values.shape[0], -1)
+        self._valid = np.asarray(frame_mask) == 1
+        self._num_frames = self._values.shape[0]
+
+        # cumulative number of valid frames
+        self._valid_cumsum = _cumsum(self._valid.astype(np.int64))
+
+        # the cumulative sums used for mean and std_dev are computed on
+        # demand and shared by all window sizes
+        self._sum_cumsum = None
+        self._sq_sum_cumsum = None
+        self._non_finite_cumsum = None
+        self._shift = None
+
+    def compute(self, op: str, window_size: int) -> np.ndarray:
+        """
+        compute one of the window operations
+        :param op: name of operation, one of WindowStatistics.OPERATIONS
+        :param window_size: number of frames (in each direction) to include
+        in the window. The actual number of frames is 2 * window_size + 1
+        :return: numpy array with same shape and dtype as the per frame values
+        """
+        if op not in self.OPERATIONS:
+            raise ValueError(f"unsupported window operation: {op}")
+        result = getattr(self, op)(window_size)
+        if self._is_1d:
+            result = result[:, 0]
+        return result.astype(self._dtype, copy=False)
+
+    def compute_all(self, window_size: int,
+                    ops: typing.Iterable[str]) -> typing.Dict:
+        """
+        compute several window operations for a single window size
+        :return: dict mapping operation name to window feature values
+        """
+        return {op: self.compute(op, window_size) for op in ops}
+
+    def count(self, window_size: int) -> np.ndarray:
+        """
+        number of valid frames in each window
+        :return: integer array with shape (#frames,)
+        """
+        start, stop = _window_bounds(self._num_frames, window_size)
+        return self._valid_cumsum[stop] - self._valid_cumsum[start]
+
+    def mean(self, window_size: int) -> np.ndarray:
+        window_sum, _, count, non_finite = self._window_sums(window_size)
+        return self._where_counted(count, _where_finite(
+            non_finite,
+            window_sum / np.maximum(count, 1)[:, np.newaxis] + self._shift))
+
+    def std_dev(self, window_size: int) -> np.ndarray:
+        window_sum, window_sq_sum, count, non_finite = self._window_sums(
+            window_size)
+        n = np.maximum(count, 1)[:, np.newaxis]
+        mean = window_sum / n
+        variance = np.maximum(window_sq_sum / n - np.square(mean), 0)
+        return self._where_counted(count, _where_finite(non_finite,
+                                                        np.sqrt(variance)))
+
+    def max(self, window_size: int) -> np.ndarray:
+        return self._where_counted(
+            self.count(window_size),
+            self._sliding_extreme(window_size, np.maximum, -np.inf))
+
+    def min(self, window_size: int) -> np.ndarray:
+        return self._where_counted(
+            self.count(window_size),
+            self._sliding_extreme(window_size, np.minimum, np.inf))
+
+    def median(self, window_size: int) -> np.ndarray:
+        width = 2 * window_size + 1
+        num_columns = self._values.shape[1]
+        count = self.count(window_size)
+
+        # invalid frames and the padding at either end are NaN, which np.sort
+        # places after all valid values in each window. Sort using the dtype
+        # of the per frame values, sorting float32 is much faster than float64
+        sort_dtype = (self._dtype if np.issubdtype(self._dtype, np.floating)
+                      else np.float64)
+        padded = self._padded(window_size, np.nan).astype(sort_dtype)
+        windows = np.lib.stride_tricks.sliding_window_view(
+            padded, width, axis=0)
+
+        result = np.zeros((self._num_frames, num_columns))
+        chunk = max(1, self._MEDIAN_CHUNK_ELEMENTS // (num_columns * width))
+        for start in range(0, self._num_frames, chunk):
+            stop = min(start + chunk, self._num_frames)
+            sorted_windows = np.sort(windows[start:stop], axis=-1)
+            n = count[start:stop]
+            lower = np.take_along_axis(
+                sorted_windows,
+                np.broadcast_to(np.maximum(n - 1, 0)[:, None, None] // 2,
+                                (stop - start, num_columns, 1)),
+                axis=-1)[..., 0]
+            upper = np.take_along_axis(
+                sorted_windows,
+                np.broadcast_to((n // 2)[:, None, None],
+                                (stop - start, num_columns, 1)),
+                axis=-1)[..., 0]
+            result[start:stop] = (lower.astype(np.float64) + upper) / 2
+        return self._where_counted(count, result)
+
+    def _window_sums(self, window_size: int):
+        """
+        sum and sum of squares of the valid values in each window, the number
+        of valid frames and the number of non-finite valid values
+
+        the values are shifted by the mean of each column before summing to
+        limit the loss of precision when subtracting cumulative sums
+        """
+        if self._sum_cumsum is None:
+            valid = self._valid[:, np.newaxis]
+            finite = valid & np.isfinite(self._values)
+            count = finite.sum(axis=0)
+            self._shift = np.where(finite, self._values, 0).sum(
+                axis=0) / np.maximum(count, 1)
+            centered = np.where(valid, self._values - self._shift, 0)
+            self._sum_cumsum, self._non_finite_cumsum = _finite_cumsum(
+                centered)
+            self._sq_sum_cumsum = _cumsum(
+                np.where(finite, np.square(centered), 0))
+
+        start, stop = _window_bounds(self._num_frames, window_size)
+        return (self._sum_cumsum[stop] - self._sum_cumsum[start],
+                self._sq_sum_cumsum[stop] - self._sq_sum_cumsum[start],
+                self.count(window_size),
+                self._non_finite_cumsum[stop] -
+                self._non_finite_cumsum[start])
+
+    def _sliding_extreme(self, window_size: int, ufunc: np.ufunc,
+                         fill: float) -> np.ndarray:
+        """
+        van Herk/Gil-Werman sliding window max or min
+
+        The padded values are split into blocks the size of the window. Within
+        each block we take the running extreme from the left and from the
+        right, then each window (which spans at most two blocks) is the
+        extreme of the right running value at its first frame and the left
+        running value at its last frame.
+        :param ufunc: np.maximum or np.minimum
+        :param fill: value used for invalid frames and padding
+        """
+        width = 2 * window_size + 1
+        padded = self._padded(window_size, fill)
+        num_blocks = -(-padded.shape[0] // width)
+        extra = num_blocks * width - padded.shape[0]
+        if extra:
+            padded = np.concatenate(
+                (padded, np.full((extra, padded.shape[1]), fill)))
+
+        blocks = padded.reshape(num_blocks, width, -1)
+        from_left = ufunc.accumulate(blocks, axis=1).reshape(padded.shape)
+        from_right = ufunc.accumulate(
+            blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+
+        return ufunc(from_right[:self._num_frames],
+                     from_left[width - 1:width - 1 + self._num_frames])
+
+    def _padded(self, window_size: int, fill: float) -> np.ndarray:
+        """
+        values with invalid frames replaced by fill, and window_size frames of
+        fill added to both ends
+        """
+        values = np.where(self._valid[:, np.newaxis], self._values, fill)
+        return np.pad(values, ((window_size, window_size), (0, 0)),
+                      constant_values=fill)
+
+    @staticmethod
+    def _where_counted(count: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """ set values to zero for windows without any valid frames """
+        return np.where((count > 0)[:, np.newaxis], values, 0)
+
+
+class CircularWindowStatistics:
+    """
+    sliding window circular mean and circular standard deviation
+
+    Equivalent to applying scipy.stats.circmean and scipy.stats.circstd to the
+    valid values in the window around each frame, but computed for all frames
+    and columns at once. Values are converted to unit vectors once, and the
+    sums of the sines and cosines within each window are taken from
+    cumulative sums.
+
+    Like Feature._compute_window_features_circular, frames where the identity
+    is not valid get a value of 0, and the window is truncated (not padded) at
+    the start and end of the video.
+    """
+
+    # window operations supported by this class
+    OPERATIONS = ('mean', 'std_dev')
+
+    def __init__(self, values: np.ndarray, frame_mask: np.ndarray,
+                 low: float, high: float):
+        """
+        :param values: per frame feature values, either a 1D array with shape
+        (#frames,) or a 2D array with shape (#frames, #columns)
+        :param frame_mask: array indicating which frames are valid for the
+        current identity
+        :param low: low boundary of the range of the circular values
+        :param high: high boundary of the range of the circular values
+        """
+        self._dtype = values.dtype
+        self._is_1d = values.ndim == 1
+        self._low = low
+        self._high = high
+        self._valid = np.asarray(frame_mask) == 1
+        self._num_frames = values.shape[0]
+
+        radians = (np.asarray(values, dtype=np.float64).reshape(
+            values.shape[0], -1) - low) * 2 * np.pi / (high - low)
+        valid = self._valid[:, np.newaxis]
+
+        # the sine and cosine of infinite values are nan, which are counted
+        # as non-finite values below
+        with np.errstate(invalid='ignore'):
+            sin = np.sin(radians)
+            cos = np.cos(radians)
+        self._sin_cumsum, self._non_finite_cumsum = _finite_cumsum(
+            np.where(valid, sin, 0))
+        self._cos_cumsum, _ = _finite_cumsum(np.where(valid, cos, 0))
+        self._valid_cumsum = _cumsum(self._valid.astype(np.int64))
+
+    def compute(self, op: str, window_size: int) -> np.ndarray:
+        """
+        compute one of the circular window operations
+        :param op: name of operation, one of CircularWindowStatistics.OPERATIONS
+        :param window_size: number of frames (in each direction) to include
+        in the window. The actual number of frames is 2 * window_size + 1
+        :return: numpy array with same shape and dtype as the per frame values
+        """
+        if op not in self.OPERATIONS:
+            raise ValueError(f"unsupported circular window operation: {op}")
+        result = getattr(self, op)(window_size)
+        result = np.where(self._valid[:, np.newaxis], result, 0)
+        if self._is_1d:
+            result = result[:, 0]
+        return result.astype(self._dtype, copy=False)
+
+    def compute_all(self, window_size: int,
+                    ops: typing.Iterable[str]) -> typing.Dict:
+        """
+        compute several window operations for a single window size
+        :return: dict mapping operation name to window feature values
+        """
+        return {op: self.compute(op, window_size) for op in ops}
+
+    def mean(self, window_size: int) -> np.ndarray:
+        sin_sum, cos_sum, _, non_finite = self._window_sums(window_size)
+        res = np.arctan2(sin_sum, cos_sum)
+        res[res < 0] += 2 * np.pi
+        return _where_finite(
+            non_finite,
+            res * (self._high - self._low) / 2.0 / np.pi + self._low)
+
+    def std_dev(self, window_size: int) -> np.ndarray:
+        sin_sum, cos_sum, count, non_finite = self._window_sums(window_size)
+        n = np.maximum(count, 1)[:, np.newaxis]
+
+        # hypot can go slightly above 1 due to rounding errors, this
+        # is what produced the nan values in older versions of scipy, which
+        # we replaced with 0. Windows with a non-finite value also got nan
+        # from scipy, which the same work around replaced with 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.minimum(1, np.hypot(sin_sum / n, cos_sum / n))
+            res = np.sqrt(-2 * np.log(r)) * (self._high - self._low) / (
+                    2.0 * np.pi)
+        return np.where(np.isnan(res) | (non_finite > 0), 0.0, res)
+
+    def _window_sums(self, window_size: int):
+        """
+        sum of sines, sum of cosines, count of valid frames and count of
+        non-finite valid values
+        """
+        start, stop = _window_bounds(self._num_frames, window_size)
+        return (self._sin_cumsum[stop] - self._sin_cumsum[start],
+                self._cos_cumsum[stop] - self._cos_cumsum[start],
+                self._valid_cumsum[stop] - self._valid_cumsum[start],
+                self._non_finite_cumsum[stop] -
+                self._non_finite_cumsum[start])
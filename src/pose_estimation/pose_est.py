@@ -1,25 +1,84 @@
+import collections
+import contextlib
 import enum
-import pickle
+import os
 import typing
 from abc import ABC, abstractmethod
 from pathlib import Path
 
 import h5py
 import numpy as np
-from shapely.geometry import MultiPoint
 
-from src.utils import hash_file
+from src.utils import hash_file_cached
+from src.utils.geometry import (HullSequence, convex_hulls, hull_areas,
+                                hull_centroids)
+
+
+# Windows can't replace a file while it is memory mapped, which would keep
+# _write_h5_atomic() from replacing a cache file that is open in another
+# PoseEstimation or process, so datasets are only memory mapped on other
+# platforms
+_MEMORY_MAP_DATASETS = os.name != 'nt'
 
 
 class PoseHashException(Exception):
     pass
 
 
+class _HullCacheVersion(Exception):
+    pass
+
+
+def _read_dataset(dataset: h5py.Dataset, path: Path) -> np.ndarray:
+    """
+    read an h5py dataset. Contiguous, uncompressed datasets are memory mapped
+    read only so their pages are only loaded when they are accessed and are
+    shared between processes that open the same file. Other datasets, and all
+    datasets on Windows, are read into memory.
+    :param dataset: dataset to read
+    :param path: path of the h5 file containing the dataset
+    :return: numpy array with the contents of the dataset
+    """
+    offset = dataset.id.get_offset()
+    if (not _MEMORY_MAP_DATASETS or offset is None or
+            dataset.chunks is not None):
+        return dataset[:]
+    return np.asarray(np.memmap(path, mode='r', dtype=dataset.dtype,
+                                offset=offset, shape=dataset.shape))
+
+
+@contextlib.contextmanager
+def _write_h5_atomic(path: Path):
+    """
+    open a new h5 file for writing that replaces path once it has been
+    written completely, so that readers (including memory maps of the
+    previous file) never see a partially written file. If the file can't
+    be replaced because it is in use (Windows doesn't allow replacing a file
+    that another process has open), the existing file is kept. The files
+    written here are caches, so they are written again the next time they
+    are found to be out of date
+    :param path: path of the h5 file to write
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with h5py.File(tmp_path, 'w') as h5:
+            yield h5
+        try:
+            os.replace(tmp_path, path)
+        except PermissionError:
+            pass
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
 class PoseEstimation(ABC):
     """
     abstract base class for PoseEstimation objects. Used as the base class for
     PoseEstimationV2 and PoseEstimationV3
     """
+    # version of the convex hull cache files
+    _HULL_CACHE_VERSION = 1
+
     class KeypointIndex(enum.IntEnum):
         """ enum defining the 12 keypoint indexes """
         NOSE = 0
@@ -48,11 +107,12 @@ class PoseEstimation(ABC):
         super().__init__()
         self._num_frames = 0
         self._identities = []
-        self._convex_hull_cache = dict()
+        self._derived_cache = dict()
+        self._compute_counts = collections.Counter()
         self._path = file_path
         self._cache_dir = cache_dir
         self._cm_per_pixel = None
-        self._hash = hash_file(file_path)
+        self._hash = None
         self._fps = fps
 
         self._static_objects = {}
@@ -81,6 +141,13 @@ class PoseEstimation(ABC):
 
     @property
     def hash(self):
+        """
+        hash of the pose file contents, computed the first time it is needed.
+        The hash is remembered in the cache directory, so the file is only
+        read again if it has changed.
+        """
+        if self._hash is None:
+            self._hash = hash_file_cached(self._path, self._cache_dir)
         return self._hash
 
     @abstractmethod
@@ -145,56 +212,201 @@ class PoseEstimation(ABC):
     def static_objects(self):
         return self._static_objects
 
+    @property
+    def compute_counts(self) -> typing.Dict[str, int]:
+        """
+        number of times each cached per identity quantity (scaled points,
+        bearings, valid frames, convex hulls) has been computed. Each should
+        be computed at most once per identity (and scale), no matter how
+        many feature modules use it.
+        """
+        return dict(self._compute_counts)
+
+    def _get_derived(self, key: typing.Tuple, compute: typing.Callable):
+        """
+        get a quantity derived from the pose data, computing it the first
+        time it is requested. Cached numpy arrays are made read only since
+        they are shared by all the feature modules.
+        :param key: tuple identifying the quantity, the first element is the
+        name of the quantity used for compute_counts
+        :param compute: function called with no arguments to compute the
+        quantity
+        :return: the cached quantity
+        """
+        try:
+            return self._derived_cache[key]
+        except KeyError:
+            pass
+
+        value = compute()
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        self._compute_counts[key[0]] += 1
+        self._derived_cache[key] = value
+        return value
+
+    def _get_scaled_points(self, identity: int, points: np.ndarray,
+                           scale: float) -> np.ndarray:
+        """
+        scale the points of an identity. The scaled array is cached, so the
+        feature modules that request the same identity and scale share a
+        single copy.
+        :param identity: identity the points belong to
+        :param points: unscaled points of the identity
+        :param scale: scale factor
+        :return: read only numpy array of scaled points
+        """
+        # include the type of the scale in the key, the dtype of the result
+        # depends on it (python float -> float64, np.float32 -> float32)
+        return self._get_derived(
+            ('scaled_points', identity, type(scale), scale),
+            lambda: points * scale)
+
+    def get_identity_valid_frames(self, identity: int) -> np.ndarray:
+        """
+        get the indexes of the frames where an identity is present
+        :param identity: identity to return frame indexes for
+        :return: read only numpy array of frame indexes
+        """
+        return self._get_derived(
+            ('valid_frames', identity),
+            lambda: np.flatnonzero(self.identity_mask(identity) == 1))
+
     def get_identity_convex_hulls(self, identity):
         """
-        A list of length #frames containing convex hulls for the given identity.
-        The convex hulls are calculated using all valid points except for the
-        middle of tail and tip of tail points.
+        A sequence of length #frames containing convex hulls for the given
+        identity. The convex hulls are calculated using all valid points
+        except for the middle of tail and tip of tail points. The shapely
+        geometry for a frame is only created when it is accessed, use
+        get_identity_hull_centroids() or get_identity_convex_hull_arrays()
+        when the hull polygons are not needed.
         :param identity: identity to return points for
         :return: the convex hulls (array elements will be None if there is no
         valid convex hull for that frame)
         """
+        vertices, num_vertices = self.get_identity_convex_hull_arrays(
+            identity)
+        return HullSequence(vertices, num_vertices)
+
+    def get_identity_convex_hull_arrays(self, identity):
+        """
+        convex hulls for the given identity as arrays, see src.utils.geometry.
+        These are the same hulls returned by get_identity_convex_hulls, but
+        in a form that can be used to compute distances and centroids for
+        all frames at once.
+        :param identity: identity to return hulls for
+        :return: vertices (#frames, 10, 2), num_vertices (#frames,)
+        """
+        hulls = self._get_convex_hull_info(identity)
+        return hulls['vertices'], hulls['num_vertices']
+
+    def get_identity_hull_centroids(self, identity):
+        """
+        get the centroids of the convex hulls of an identity
+        :param identity: identity to return centroids for
+        :return: numpy array (#frames, 2), NaN for frames without a convex
+        hull
+        """
+        return self._get_convex_hull_info(identity)['centroids']
 
-        if identity in self._convex_hull_cache:
-            return self._convex_hull_cache[identity]
-        else:
-            convex_hulls = None
-            path = None
-            if self._cache_dir is not None:
-                path = (self._cache_dir /
-                        "convex_hulls" /
-                        self._path.with_suffix('').name /
-                        f"convex_hulls_{identity}.pickle")
-                path.parents[0].mkdir(mode=0o775, parents=True, exist_ok=True)
-
-                try:
-                    with path.open('rb') as f:
-                        convex_hulls = pickle.load(f)
-                except:
-                    # we weren't able to read in the cached convex hulls,
-                    # just ignore the exception and we'll generate them
-                    pass
-
-            if convex_hulls is None:
-                points, point_masks = self.get_identity_poses(identity)
-                # Omit tail from convex hull
-                body_points = points[:, :-2, :]
-                body_point_masks = point_masks[:, :-2]
-                convex_hulls = []
-
-                for frame_index in range(self.num_frames):
-                    if sum(body_point_masks[frame_index, :]) >= 3:
-                        filtered_points = body_points[frame_index, body_point_masks[frame_index, :] == 1, :]
-                        convex_hulls.append(MultiPoint(filtered_points).convex_hull)
-                    else:
-                        convex_hulls.append(None)
-
-                if path:
-                    with path.open('wb') as f:
-                        pickle.dump(convex_hulls, f)
-
-            self._convex_hull_cache[identity] = convex_hulls
-            return convex_hulls
+    def get_identity_hull_areas(self, identity):
+        """
+        get the areas of the convex hulls of an identity
+        :param identity: identity to return areas for
+        :return: numpy array (#frames,), NaN for frames without a convex
+        hull
+        """
+        return self._get_convex_hull_info(identity)['areas']
+
+    def _get_convex_hull_info(self, identity) -> typing.Dict:
+        """
+        get the convex hull arrays for an identity, loading them from the
+        cache directory if they have been cached or computing them otherwise
+        :return: dict with vertices, num_vertices, centroids and areas
+        """
+        return self._get_derived(
+            ('convex_hulls', identity),
+            lambda: self._load_or_compute_convex_hull_info(identity))
+
+    def _load_or_compute_convex_hull_info(self, identity) -> typing.Dict:
+        hulls = None
+        path = None
+        if self._cache_dir is not None:
+            path = (self._cache_dir /
+                    "convex_hulls" /
+                    self._path.with_suffix('').name /
+                    f"convex_hulls_{identity}.h5")
+            path.parents[0].mkdir(mode=0o775, parents=True, exist_ok=True)
+
+            try:
+                hulls = self._load_convex_hulls(path)
+            except (OSError, KeyError, _HullCacheVersion, PoseHashException):
+                # we weren't able to read in the cached convex hulls,
+                # just ignore the exception and we'll generate them
+                pass
+
+        if hulls is None:
+            points, point_masks = self.get_identity_poses(identity)
+            # Omit tail from convex hull
+            vertices, num_vertices = convex_hulls(points[:, :-2, :],
+                                                  point_masks[:, :-2])
+            hulls = {
+                'vertices': vertices,
+                'num_vertices': num_vertices,
+                'centroids': hull_centroids(vertices, num_vertices),
+                'areas': hull_areas(vertices, num_vertices),
+            }
+
+            if path:
+                self._save_convex_hulls(path, hulls)
+
+        return hulls
+
+    def _load_convex_hulls(self, path: Path) -> typing.Dict:
+        """
+        :raises: OSError, KeyError, _HullCacheVersion, PoseHashException
+        """
+        with h5py.File(path, 'r') as hull_h5:
+            if hull_h5.attrs['version'] != self._HULL_CACHE_VERSION:
+                raise _HullCacheVersion
+
+            if hull_h5.attrs['source_pose_hash'] != self.hash:
+                raise PoseHashException
+
+            num_vertices = hull_h5['num_vertices'][:].astype(np.int64)
+
+            # vertices are stored compactly, without the padding used for
+            # hulls with fewer vertices than the maximum
+            vertices = np.full((self.num_frames, hull_h5.attrs['max_vertices'],
+                                2), np.nan)
+            packed = hull_h5['vertices'][:].astype(np.float64)
+            mask = (np.arange(vertices.shape[1]) <
+                    num_vertices[:, np.newaxis])
+            vertices[mask] = packed
+
+            return {
+                'vertices': vertices,
+                'num_vertices': num_vertices,
+                'centroids': hull_h5['centroids'][:],
+                'areas': hull_h5['areas'][:],
+            }
+
+    def _save_convex_hulls(self, path: Path, hulls: typing.Dict):
+        vertices = hulls['vertices']
+        num_vertices = hulls['num_vertices']
+        mask = np.arange(vertices.shape[1]) < num_vertices[:, np.newaxis]
+
+        with _write_h5_atomic(path) as hull_h5:
+            hull_h5.attrs['version'] = self._HULL_CACHE_VERSION
+            hull_h5.attrs['source_pose_hash'] = self.hash
+            hull_h5.attrs['max_vertices'] = vertices.shape[1]
+            # pixel coordinates are integers so float32 is exact
+            hull_h5.create_dataset('vertices',
+                                   data=vertices[mask].astype(np.float32))
+            hull_h5.create_dataset('num_vertices',
+                                   data=num_vertices.astype(np.uint8))
+            hull_h5.create_dataset('centroids', data=hulls['centroids'])
+            hull_h5.create_dataset('areas', data=hulls['areas'])
 
     def compute_bearing(self, points):
         base_tail_xy = points[self.KeypointIndex.BASE_TAIL.value].astype(np.float32)
@@ -207,24 +419,30 @@ class PoseEstimation(ABC):
         return angle_rad * (180 / np.pi)
 
     def compute_all_bearings(self, identity):
-        bearings = np.zeros(self.num_frames, dtype=np.float32)
-        for i in range(self.num_frames):
-            points, mask = self.get_points(i, identity)
-            if points is not None:
-                bearings[i] = self.compute_bearing(points)
-        return bearings
+        """
+        compute the bearing of an identity for all frames, see
+        compute_bearing(). The bearings are cached, so they are only computed
+        once per identity.
+        :param identity: identity to compute bearings for
+        :return: read only numpy array of bearings (#frames,), zero for
+        frames where the identity is not present
+        """
+        return self._get_derived(('bearings', identity),
+                                 lambda: self._compute_all_bearings(identity))
 
-    def compute_all_bearings2(self, identity):
+    def _compute_all_bearings(self, identity):
         bearings = np.zeros(self.num_frames, dtype=np.float32)
         # get an array of the indexes of valid frames only
-        indexes = np.arange(self._num_frames)[self.identity_mask(identity) == 1]
+        indexes = self.get_identity_valid_frames(identity)
         poses, _ = self.get_identity_poses(identity)
         base_tail = poses[indexes, self.KeypointIndex.BASE_TAIL.value].astype(np.float32)
         base_neck = poses[indexes, self.KeypointIndex.BASE_NECK.value].astype(np.float32)
         offsets = base_neck - base_tail
 
         angle_rad = np.arctan2(offsets[:, 1], offsets[:, 0])
-        bearings[indexes] = angle_rad * (180 / np.pi)
+        # convert to degrees in float64 before storing the float32 result,
+        # matching compute_bearing() where the numpy scalar angle is promoted
+        bearings[indexes] = angle_rad.astype(np.float64) * (180 / np.pi)
         return bearings
 
     @staticmethod
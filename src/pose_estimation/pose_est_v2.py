@@ -50,11 +50,9 @@ class PoseEstimationV2(PoseEstimation):
 
         # build an array that indicates if the identity exists for a each frame
         # require at least 3 body points, not just tail
-        init_func = np.vectorize(
-            lambda x: 0 if np.sum(self._point_mask[x][:-2]) < 3 else 1,
-            otypes=[np.uint8])
-        self._identity_mask = np.fromfunction(init_func, (self._num_frames,),
-                                              dtype=np.int_)
+        self._identity_mask = (
+            np.count_nonzero(self._point_mask[:, :-2], axis=-1) >= 3
+        ).astype(np.uint8)
 
     @property
     def identity_to_track(self):
@@ -101,7 +99,8 @@ class PoseEstimationV2(PoseEstimation):
             raise ValueError("Invalid identity")
 
         if scale is not None:
-            return self._points * scale, self._point_mask
+            return (self._get_scaled_points(identity, self._points, scale),
+                    self._point_mask)
         else:
             return self._points, self._point_mask
 
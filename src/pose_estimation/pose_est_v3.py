@@ -5,7 +5,8 @@ from pathlib import Path
 import h5py
 import numpy as np
 
-from .pose_est import PoseEstimation, PoseHashException
+from .pose_est import (PoseEstimation, PoseHashException, _read_dataset,
+                       _write_h5_atomic)
 
 
 class _CacheFileVersion(Exception):
@@ -51,14 +52,20 @@ class PoseEstimationV3(PoseEstimation):
                         # file
                         raise _CacheFileVersion
 
-                    if cache_h5.attrs['source_pose_hash'] != self._hash:
+                    if cache_h5.attrs['source_pose_hash'] != self.hash:
                         raise PoseHashException
 
+                    # the cached arrays are memory mapped, so the pages for
+                    # an identity are only read when that identity is used
                     pose_grp = cache_h5['poseest']
-                    self._points = pose_grp['points'][:]
-                    self._point_mask = pose_grp['point_mask'][:]
-                    self._identity_mask = pose_grp['identity_mask'][:]
-                    self._identity_to_track = pose_grp['identity_to_track'][:]
+                    self._points = _read_dataset(pose_grp['points'],
+                                                 cache_file_path)
+                    self._point_mask = _read_dataset(pose_grp['point_mask'],
+                                                     cache_file_path)
+                    self._identity_mask = _read_dataset(
+                        pose_grp['identity_mask'], cache_file_path)
+                    self._identity_to_track = _read_dataset(
+                        pose_grp['identity_to_track'], cache_file_path)
                     self._max_instances = self._points.shape[0]
                     self._num_frames = self._points.shape[1]
                     self._identities = [*range(self._max_instances)]
@@ -100,10 +107,12 @@ class PoseEstimationV3(PoseEstimation):
             # in the pose file
             self._identities = [*range(self._max_instances)]
 
+            # frame, instance index and track id of every instance
+            instances = self._get_instances(all_instance_count, all_track_id)
+
             # maps track instances to identities
             # populate identity_map and identity_to_instance
-            self._identity_map = self._build_identity_map(
-                all_instance_count, all_track_id)
+            self._identity_map = self._build_identity_map(*instances)
 
             self._points = np.zeros(
                 (self._max_instances, self.num_frames, len(self.KeypointIndex), 2),
@@ -112,28 +121,15 @@ class PoseEstimationV3(PoseEstimation):
 
             # build numpy arrays of points and point masks organized by identity
             self._track_dict = self._build_track_dict(
-                    all_points, all_confidence, all_instance_count, all_track_id)
-
-            for track_id, track in self._track_dict.items():
-                self._points[
-                    self._identity_map[track_id],
-                    track['start_frame']:track['stop_frame_exclu'],
-                    :] = track['points']
-                self._point_mask[
-                    self._identity_map[track_id],
-                    track['start_frame']:track['stop_frame_exclu'],
-                    :] = track['point_masks']
+                    all_points, all_confidence, *instances)
 
             # build a mask for each identity that indicates if it exists or not
             # in the frame
-            init_func = np.vectorize(
-                    lambda x, y: 0 if np.sum(self._point_mask[x][y][:-2]) == 0 else 1,
-                    otypes=[np.uint8])
-            self._identity_mask = np.fromfunction(
-                init_func, (self._max_instances, self._num_frames), dtype=np.int_)
+            self._identity_mask = self._point_mask[..., :-2].any(
+                axis=-1).astype(np.uint8)
 
             if self._cache_dir is not None:
-                with h5py.File(cache_file_path, 'w') as cache_h5:
+                with _write_h5_atomic(cache_file_path) as cache_h5:
                     cache_h5.attrs['version'] = self.__CACHE_FILE_VERSION
                     cache_h5.attrs['source_pose_hash'] = self.hash
                     group = cache_h5.create_group('poseest')
@@ -198,7 +194,8 @@ class PoseEstimationV3(PoseEstimation):
 
         if scale is not None:
             return (
-                self._points[identity, ...] * scale,
+                self._get_scaled_points(identity, self._points[identity],
+                                        scale),
                 self._point_mask[identity, ...]
             )
         else:
@@ -215,46 +212,91 @@ class PoseEstimationV3(PoseEstimation):
         """
         return self._point_mask[identity, :]
 
-    def _build_track_dict(self, all_points, all_confidence, all_instance_count,
-                          all_track_id):
-        """ iterate through frames and build track dict """
-        all_points_mask = all_confidence > 0
-        track_dict = {}
+    @staticmethod
+    def _get_instances(all_instance_count, all_track_id):
+        """
+        get the frame index, instance index and track id of every instance in
+        the pose file
+        :return: tuple of 1D arrays (frames, instances, track_ids), ordered
+        by frame and then instance index
+        """
+        frames, instances = np.nonzero(
+            np.arange(all_track_id.shape[1]) <
+            np.asarray(all_instance_count)[:, np.newaxis])
+        return frames, instances, all_track_id[frames, instances]
 
-        for frame_index in range(self.num_frames):
-            curr_instance_count = all_instance_count[frame_index]
-            curr_track_ids = all_track_id[frame_index, :curr_instance_count]
-            for i, curr_track_id in enumerate(curr_track_ids):
-                curr_track_points = all_points[frame_index, i, ...]
-                curr_track_points_mask = all_points_mask[frame_index, i, :]
-
-                if curr_track_id in track_dict:
-                    # we've seen this track before, append points
-                    track_dict[curr_track_id]['points'].append(
-                        curr_track_points)
-                    track_dict[curr_track_id]['point_masks'].append(
-                        curr_track_points_mask)
-                else:
-                    # this is the first frame the track appears, create a
-                    # new dict
-                    track_dict[curr_track_id] = {
-                        'track_id': curr_track_id,
-                        'start_frame': frame_index,
-                        'points': [curr_track_points],
-                        'point_masks': [curr_track_points_mask],
-                    }
-
-        for track in track_dict.values():
-            track['points'] = np.stack(track['points'])
-            track['point_masks'] = np.stack(track['point_masks'])
-            track_length = len(track['points'])
-            track['length'] = track_length
-            track['stop_frame_exclu'] = track_length + track['start_frame']
+    def _build_track_dict(self, all_points, all_confidence, frames,
+                          instances, track_ids):
+        """
+        build track dict and copy the points and point masks of each track
+        into self._points and self._point_mask
+
+        The points of a track are stored in consecutive frames beginning
+        with the first frame the track appears in. Tracks are copied in the
+        order they first appear, so if two tracks assigned to the same
+        identity overlap the track that appeared later is kept.
+        """
+        track_dict = {}
+        if len(track_ids) == 0:
+            return track_dict
+
+        # tracks in order of first appearance
+        unique_ids, first_index, track_index, lengths = np.unique(
+            track_ids, return_index=True, return_inverse=True,
+            return_counts=True)
+        appearance_order = np.argsort(first_index, kind='stable')
+        appearance_rank = np.empty_like(appearance_order)
+        appearance_rank[appearance_order] = np.arange(len(appearance_order))
+        start_frames = frames[first_index]
+
+        for i in appearance_order:
+            track_id = unique_ids[i]
+            track_dict[track_id] = {
+                'track_id': track_id,
+                'start_frame': start_frames[i],
+                'length': lengths[i],
+                'stop_frame_exclu': start_frames[i] + lengths[i],
+            }
+
+        # position of each instance within its track
+        by_track = np.argsort(track_index, kind='stable')
+        group_start = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        rank = np.empty_like(by_track)
+        rank[by_track] = (np.arange(len(by_track)) -
+                          group_start[track_index[by_track]])
+
+        identities = np.array(
+            [self._identity_map[track_id] for track_id in unique_ids],
+            dtype=np.int64)[track_index]
+        dest_frames = start_frames[track_index] + rank
+
+        # when instances from more than one track map to the same identity
+        # and frame, keep the instance from the track that appeared last
+        order = np.argsort(appearance_rank[track_index], kind='stable')[::-1]
+        _, keep = np.unique(
+            identities[order] * self._num_frames + dest_frames[order],
+            return_index=True)
+        keep = order[keep]
+
+        self._points[identities[keep], dest_frames[keep]] = \
+            all_points[frames[keep], instances[keep]]
+        self._point_mask[identities[keep], dest_frames[keep]] = \
+            all_confidence[frames[keep], instances[keep]] > 0
 
         return track_dict
 
-    def _build_identity_map(self, all_instance_count, all_track_id):
-        """ map individual tracks to identities """
+    def _build_identity_map(self, frames, instances, track_ids):
+        """
+        map individual tracks to identities
+
+        Identities are assigned greedily: the first time a track appears it
+        is given the lowest free identity, and when a track is absent after
+        being present in the previous frame its identity is returned to the
+        pool of free identities. A track that reappears keeps the identity
+        it was originally assigned. Only the frames where a track appears or
+        ends need to be visited, so these events are found with array
+        operations and then processed in frame order.
+        """
         free_identities = []
         identity_track_count = {}
         identity_map = {}
@@ -263,24 +305,49 @@ class PoseEstimationV3(PoseEstimation):
             heapq.heappush(free_identities, i)
             identity_track_count[i] = 0
 
-        last_tracks = []
-        for frame_index in range(self._num_frames):
-            current_tracks = all_track_id[frame_index][
-                                 :all_instance_count[frame_index]]
-
-            # add identities back to the pool for any tracks that terminated
-            for track in last_tracks:
-                if track not in current_tracks:
-                    heapq.heappush(free_identities, identity_map[track])
-
-            # if this is the first time we see the track grab a new identity
-            for i in range(len(current_tracks)):
-                if current_tracks[i] not in identity_map:
-                    identity = heapq.heappop(free_identities)
-                    identity_map[current_tracks[i]] = identity
-                    identity_track_count[identity] += 1
-
-            last_tracks = current_tracks[:]
+        # split each track into runs of consecutive frames
+        order = np.lexsort((instances, frames, track_ids))
+        frames = frames[order]
+        instances = instances[order]
+        track_ids = track_ids[order]
+
+        new_track = np.ones(len(track_ids), dtype=bool)
+        new_track[1:] = track_ids[1:] != track_ids[:-1]
+        new_run = new_track.copy()
+        new_run[1:] |= (frames[1:] - frames[:-1]) > 1
+        run_end = np.append(np.flatnonzero(new_run)[1:] - 1,
+                            len(track_ids) - 1)
+
+        # identity is returned to the pool in the frame after a run ends
+        release_frames = frames[run_end] + 1
+        releasing = release_frames < self._num_frames
+        release_frames = release_frames[releasing]
+        release_tracks = track_ids[run_end][releasing]
+
+        # a new identity is taken the first time each track appears
+        assign_frames = frames[new_track]
+        assign_instances = instances[new_track]
+        assign_tracks = track_ids[new_track]
+
+        # within a frame, releases happen before assignments, and
+        # assignments are made in instance order
+        event_frames = np.concatenate((release_frames, assign_frames))
+        event_assign = np.concatenate((np.zeros(len(release_frames), dtype=bool),
+                                       np.ones(len(assign_frames), dtype=bool)))
+        event_instances = np.concatenate(
+            (np.zeros(len(release_frames), dtype=instances.dtype),
+             assign_instances))
+        event_tracks = np.concatenate((release_tracks, assign_tracks))
+        event_order = np.lexsort((event_instances, event_assign, event_frames))
+
+        for assign, track in zip(event_assign[event_order].tolist(),
+                                 event_tracks[event_order].tolist()):
+            if assign:
+                identity = heapq.heappop(free_identities)
+                identity_map[track] = identity
+                identity_track_count[identity] += 1
+            else:
+                heapq.heappush(free_identities, identity_map[track])
 
         # prune the identities if some end up not being used
         identities = []
@@ -4,7 +4,8 @@ from pathlib import Path
 import h5py
 import numpy as np
 
-from .pose_est import PoseEstimation, PoseHashException
+from .pose_est import (PoseEstimation, PoseHashException, _read_dataset,
+                       _write_h5_atomic)
 
 
 class _CacheFileVersion(Exception):
@@ -66,50 +67,41 @@ class PoseEstimationV4(PoseEstimation):
                 instance_embed_id = pose_grp['instance_embed_id'][:]
 
             self._num_frames = len(all_points)
-            self._num_identities = np.max(np.ma.array(instance_embed_id[...], mask=id_mask[...]))
+            self._num_identities = instance_embed_id[id_mask == 0].max(
+                initial=0)
 
             # generate list of identities based on the max number of instances
             # in the pose file
             if self._num_identities > 0:
                 self._identities = [*range(self._num_identities)]
 
-                # tmp array used to reorder points
-                # sometimes not all identities are used so need to shrink the array
-                tmp_shape = np.array(np.shape(all_points))
-                tmp_shape[1] = self._num_identities
-                points_tmp = np.zeros(tmp_shape, dtype=all_points.dtype)
-
-                # first use instance_embed_id to group points by identity
-                points_tmp[np.where(id_mask == 0)[0],
-                instance_embed_id[id_mask == 0] - 1, :, :] = all_points[
-                                                             id_mask == 0, :, :]
-
-                # then transpose to make the first index the "identity" rather
-                # than frame
-                # indexes before transpose: [frame][ident][point idx][pt axis]
-                # indexes after transpose: [ident][frame][point idx][pt axis]
-                self._points = np.transpose(points_tmp, [1, 0, 2, 3])
-
-                confidence_by_id_tmp = np.zeros(tmp_shape[:3], dtype=all_confidence.dtype)
-                confidence_by_id_tmp[np.where(id_mask == 0)[0],
-                instance_embed_id[id_mask == 0] - 1, :] = all_confidence[
-                                                          id_mask == 0, :]
-                confidence_by_id = np.transpose(confidence_by_id_tmp, [1, 0, 2])
-
-                self._point_mask = confidence_by_id > 0
+                # use instance_embed_id to scatter the points of each valid
+                # instance directly into an array organized by identity
+                # indexes: [ident][frame][point idx][pt axis]
+                # sometimes not all identities are used so the array can be
+                # smaller than the number of instances in the file
+                frames, instances = np.nonzero(id_mask == 0)
+                identities = instance_embed_id[frames, instances] - 1
+
+                self._points = np.zeros(
+                    (self._num_identities, self._num_frames) +
+                    all_points.shape[2:], dtype=all_points.dtype)
+                self._points[identities, frames] = all_points[frames,
+                                                              instances]
+
+                self._point_mask = np.zeros(
+                    (self._num_identities, self._num_frames,
+                     all_confidence.shape[2]), dtype=bool)
+                self._point_mask[identities, frames] = \
+                    all_confidence[frames, instances] > 0
 
                 # build a mask for each identity that indicates if it exists or not
                 # in the frame
                 # require a minimum number of points to be > 3
                 # this is because the convex hull requires 3 points
-                init_func = np.vectorize(
-                    lambda x, y: np.sum(
-                        self._point_mask[x][y][:-2]) >= 3,
-                    otypes=[np.uint8])
-
-                self._identity_mask = np.fromfunction(
-                    init_func, (self._num_identities, self._num_frames),
-                    dtype=np.int_)
+                self._identity_mask = (
+                    np.count_nonzero(self._point_mask[..., :-2], axis=-1) >= 3
+                ).astype(np.uint8)
             else:
                 self._identities = []
                 self._point_mask = None
@@ -166,7 +158,8 @@ class PoseEstimationV4(PoseEstimation):
         """
         if scale is not None:
             return (
-                self._points[identity, ...] * scale,
+                self._get_scaled_points(identity, self._points[identity],
+                                        scale),
                 self._point_mask[identity, ...]
             )
         else:
@@ -198,7 +191,7 @@ class PoseEstimationV4(PoseEstimation):
                 # file
                 raise _CacheFileVersion
 
-            if cache_h5.attrs['source_pose_hash'] != self._hash:
+            if cache_h5.attrs['source_pose_hash'] != self.hash:
                 raise PoseHashException
 
             pose_grp = cache_h5['poseest']
@@ -209,10 +202,15 @@ class PoseEstimationV4(PoseEstimation):
             # get pixel size
             self._cm_per_pixel = pose_grp.attrs.get('cm_per_pixel')
 
+            # the cached arrays are memory mapped, so the pages for an
+            # identity are only read when that identity is used
             if self._num_identities > 0:
-                self._points = pose_grp['points'][:]
-                self._point_mask = pose_grp['point_mask'][:]
-                self._identity_mask = pose_grp['identity_mask'][:]
+                self._points = _read_dataset(pose_grp['points'],
+                                             cache_file_path)
+                self._point_mask = _read_dataset(pose_grp['point_mask'],
+                                                 cache_file_path)
+                self._identity_mask = _read_dataset(pose_grp['identity_mask'],
+                                                    cache_file_path)
 
     def _cache_poses(self):
         """
@@ -222,7 +220,7 @@ class PoseEstimationV4(PoseEstimation):
         filename = self._path.name.replace('.h5', '_cache.h5')
         cache_file_path = self._cache_dir / filename
 
-        with h5py.File(cache_file_path, 'w') as cache_h5:
+        with _write_h5_atomic(cache_file_path) as cache_h5:
             cache_h5.attrs['version'] = self.__CACHE_FILE_VERSION
             cache_h5.attrs['source_pose_hash'] = self.hash
             cache_h5.attrs['num_identities'] = self._num_identities
@@ -0,0 +1,173 @@
+import typing
+from pathlib import Path
+
+import h5py
+
+
+class LabeledFeatureCache:
+    """
+    labeled features of each video, as assembled by
+    Project.get_labeled_features() for one combination of feature settings
+    (behavior, window size, social features, extended features and distance
+    unit). The project keeps one file for each behavior, which only holds the
+    features for the most recently used settings of the behavior
+
+    Each video is stored with a signature of the files its labeled features
+    were assembled from, so only the videos whose labels or pose file
+    changed need to be assembled again. The cache is kept in memory and
+    saved to an h5 file so it is also reused after reopening the project.
+
+    file layout:
+
+      attrs: key, column_names
+      <video>/
+        attrs: signature
+        <identity>/
+          labels: labels of the labeled frames
+          per_frame/<feature>: per frame features of the labeled frames
+          window/<feature>/<op>: window features of the labeled frames
+    """
+
+    def __init__(self, path: Path, key: str):
+        """
+        :param path: path of the h5 file, loaded if it exists
+        :param key: key identifying the feature settings. A file saved with a
+        different key is ignored, and replaced when the cache is saved
+        """
+        self._path = Path(path)
+        self._key = key
+        self._videos = {}
+        self._changed = set()
+        self._column_names = None
+
+        try:
+            self.__load()
+        except (OSError, KeyError):
+            # missing or unreadable file, start with an empty cache
+            self._videos = {}
+            self._column_names = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def key(self) -> str:
+        return self._key
+
+    @property
+    def column_names(self) -> typing.Optional[typing.List[str]]:
+        return self._column_names
+
+    @column_names.setter
+    def column_names(self, column_names: typing.List[str]):
+        self._column_names = list(column_names)
+
+    def get(self, video: str, signature: str) -> typing.Optional[list]:
+        """
+        get the cached labeled features of a video
+        :param video: video file name
+        :param signature: signature of the files the labeled features are
+        assembled from
+        :return: list of (identity, per frame features, window features,
+        labels) tuples, or None if the video is not cached or was cached with
+        a different signature
+        """
+        cached = self._videos.get(video)
+        if cached is None or cached[0] != signature:
+            return None
+        return cached[1]
+
+    def put(self, video: str, signature: str, identities: list):
+        """
+        cache the labeled features of a video
+        :param video: video file name
+        :param signature: signature of the files the features were assembled
+        from
+        :param identities: list of (identity, per frame features, window
+        features, labels) tuples
+        :return: None
+        """
+        self._videos[video] = (signature, identities)
+        self._changed.add(video)
+
+    def save(self, videos: typing.Iterable[str]):
+        """
+        save the videos changed since the cache was loaded or last saved,
+        and drop videos that are not in the project anymore
+        :param videos: videos currently in the project
+        :return: None
+        """
+        videos = set(videos)
+        removed = set(self._videos) - videos
+        for video in removed:
+            del self._videos[video]
+
+        if not self._changed and not removed:
+            return
+
+        with h5py.File(self._path, 'a') as cache_h5:
+            if cache_h5.attrs.get('key') != self._key:
+                # the file was saved with other settings, replace it
+                for video in list(cache_h5.keys()):
+                    del cache_h5[video]
+                cache_h5.attrs.pop('column_names', None)
+                self._changed.update(self._videos)
+            cache_h5.attrs['key'] = self._key
+            if self._column_names is not None:
+                cache_h5.attrs['column_names'] = self._column_names
+
+            for video in set(cache_h5.keys()) - videos:
+                del cache_h5[video]
+
+            for video in self._changed & videos:
+                signature, identities = self._videos[video]
+                if video in cache_h5:
+                    del cache_h5[video]
+                video_grp = cache_h5.create_group(video)
+                for identity, per_frame, window, labels in identities:
+                    grp = video_grp.create_group(str(identity))
+                    grp.create_dataset('labels', data=labels)
+                    for feature, values in per_frame.items():
+                        grp.create_dataset(f'per_frame/{feature}', data=values)
+                    for feature, ops in window.items():
+                        for op, values in ops.items():
+                            grp.create_dataset(f'window/{feature}/{op}',
+                                               data=values)
+
+                # the signature is written last, so a video that was only
+                # partially written is not used
+                video_grp.attrs['signature'] = signature
+
+        self._changed.clear()
+
+    def __load(self):
+        with h5py.File(self._path, 'r') as cache_h5:
+            if cache_h5.attrs['key'] != self._key:
+                return
+            if 'column_names' in cache_h5.attrs:
+                self._column_names = list(cache_h5.attrs['column_names'])
+
+            for video, video_grp in cache_h5.items():
+                if 'signature' not in video_grp.attrs:
+                    continue
+
+                identities = []
+                for identity in sorted(video_grp, key=int):
+                    grp = video_grp[identity]
+                    identities.append((
+                        int(identity),
+                        {
+                            feature: values[:]
+                            for feature, values in grp.get(
+                                'per_frame', {}).items()
+                        },
+                        {
+                            feature: {op: values[:]
+                                      for op, values in ops.items()}
+                            for feature, ops in grp.get('window', {}).items()
+                        },
+                        grp['labels'][:]
+                    ))
+                self._videos[video] = (video_grp.attrs['signature'],
+                                       identities)
@@ -1,5 +1,7 @@
+import collections
 import enum
 import gzip
+import hashlib
 import json
 import re
 import shutil
@@ -14,11 +16,12 @@ import numpy as np
 import src.feature_extraction as fe
 from src.pose_estimation import get_pose_path, open_pose_file, \
     get_frames_from_file, get_pose_file_major_version, \
-    get_static_objects_in_file, PoseEstimation
+    get_static_objects_in_file, PoseEstimation, PoseHashException
 from src.project import TrackLabels
 from src.version import version_str
 from src.video_stream import VideoStream
 from src.video_stream.utilities import get_frame_count, get_fps
+from .labeled_feature_cache import LabeledFeatureCache
 from .video_labels import VideoLabels
 
 _PREDICTION_FILE_VERSION = 1
@@ -41,6 +44,10 @@ class Project:
 
     PREDICTION_FILE_VERSION = _PREDICTION_FILE_VERSION
 
+    # number of video feature stores kept, along with the rows each store
+    # has already read, see __feature_store()
+    _FEATURE_STORES = 4
+
     def __init__(self, project_path, use_cache=True, enable_video_check=True):
         """
         Open a project at a given path. A project is a directory that contains
@@ -69,6 +76,15 @@ class Project:
         self._supported_static_objects = set()
         self._enabled_extended_features = {}
 
+        # labeled features assembled by the most recent call to
+        # get_labeled_features()
+        self._labeled_feature_cache = None
+
+        # feature stores of the videos whose labeled features were most
+        # recently assembled, so their rows that were already read are
+        # reused when more frames are labeled
+        self._feature_stores = collections.OrderedDict()
+
         if use_cache:
             self._cache_dir = (self._project_dir_path / self._PROJ_DIR /
                                'cache')
@@ -257,6 +273,17 @@ class Project:
     def distance_unit(self):
         return self._distance_unit
 
+    @property
+    def warm_start_training(self) -> bool:
+        """
+        if true, the classifier saved after training is updated from the
+        previously trained classifier when only a few labels changed, instead
+        of trained again from scratch. Off unless enabled in the project
+        metadata, since an updated classifier can't be reproduced by training
+        again
+        """
+        return bool(self._metadata.get('warm_start_training', False))
+
     def load_video_labels(self, video_name):
         """
         load labels for a video from the project directory or from a cached of
@@ -547,6 +574,13 @@ class Project:
         except FileNotFoundError:
             pass
 
+        # remove cached labeled features
+        if (self._labeled_feature_cache is not None and
+                self._labeled_feature_cache.path ==
+                self.__labeled_feature_cache_path(behavior)):
+            self._labeled_feature_cache = None
+        self.__labeled_feature_cache_path(behavior).unlink(missing_ok=True)
+
         # archive labels
         archived_labels = {}
         for video in self._videos:
@@ -616,8 +650,18 @@ class Project:
             'per_frame': ,
             'labels': ,
             'groups': ,
+            'column_names': ,
+            'sources': ,
         }
 
+        'sources' maps each video to a tuple of (signature, number of labeled
+        frames), where the signature changes when the labels or pose file of
+        the video change. It lets Classifier.train() find how much of the
+        training data changed since a classifier was trained.
+
+        The labeled features of each video are cached, and only assembled
+        again when the labels or pose file of the video change.
+
         The values contained in the first dict are suitable to pass as
         arguments to the Classifier.leave_one_group_out() method.
 
@@ -635,45 +679,33 @@ class Project:
         all_window = []
         all_labels = []
         all_groups = []
-        column_names = None
         group_mapping = {}
+        sources = {}
+
+        # videos whose labels and pose file have not changed since the last
+        # time the labeled features were assembled with these settings are
+        # reused from the labeled feature cache
+        cache = self.__labeled_feature_cache(behavior, window_size,
+                                             use_social_features)
+        feature_names = fe.IdentityFeatures.get_feature_names(
+            use_social_features, self._enabled_extended_features)
 
         group_id = 0
         for video in self.videos:
-            video_path = self.video_path(video)
-            pose_est = self.load_pose_est(video_path)
-            # fps used to scale some features from per pixel time unit to
-            # per second
-            fps = get_fps(str(video_path))
-
-            for identity in pose_est.identities:
+            signature = self.__labeled_features_signature(video)
+            identities = cache.get(video, signature)
+            if identities is None:
+                identities = self.__assemble_labeled_features(
+                    video, behavior, window_size, feature_names, cache)
+                cache.put(video, signature, identities)
+
+            for identity, per_frame_features, window_features, labels in \
+                    identities:
                 group_mapping[group_id] = {'video': video, 'identity': identity}
 
-                if self._distance_unit == ProjectDistanceUnit.CM:
-                    distance_scale_factor = pose_est.cm_per_pixel
-                else:
-                    distance_scale_factor = 1
-
-                features = fe.IdentityFeatures(
-                    video, identity, self.feature_dir, pose_est, fps=fps,
-                    distance_scale_factor=distance_scale_factor,
-                    extended_features=self._enabled_extended_features
-                )
-                if column_names is None:
-                    column_names = features.get_feature_column_names(
-                        use_social_features)
-
-                labels = self.load_video_labels(video).get_track_labels(
-                    str(identity), behavior).get_labels()
-
-                per_frame_features = features.get_per_frame(
-                    use_social_features, labels)
-                window_features = features.get_window_features(
-                    window_size, use_social_features, labels)
-
                 all_per_frame.append(per_frame_features)
                 all_window.append(window_features)
-                all_labels.append(labels[labels != TrackLabels.Label.NONE])
+                all_labels.append(labels)
 
                 # should be a better way to do this, but I'm getting the number
                 # of frames in this group by looking at the shape of one of
@@ -686,6 +718,11 @@ class Project:
                 if progress_callable is not None:
                     progress_callable()
 
+            sources[video] = (signature,
+                              sum(len(labels) for *_, labels in identities))
+
+        cache.save(self.videos)
+
         return {
             'window': fe.IdentityFeatures.merge_window_features(
                 all_window, use_social_features,
@@ -695,9 +732,133 @@ class Project:
                 extended_features=self._enabled_extended_features),
             'labels': np.concatenate(all_labels),
             'groups': np.concatenate(all_groups),
-            'column_names': column_names
+            'column_names': cache.column_names,
+            'sources': sources
         }, group_mapping
 
+    def __labeled_feature_cache(self, behavior, window_size,
+                                use_social_features) -> LabeledFeatureCache:
+        """
+        get the labeled feature cache for the feature settings. Only the cache
+        for the most recently used settings is kept in memory
+        """
+        settings = json.dumps([
+            behavior, window_size, bool(use_social_features),
+            self._enabled_extended_features, int(self._distance_unit),
+            fe.FEATURE_VERSION
+        ], sort_keys=True)
+        key = hashlib.sha1(settings.encode()).hexdigest()
+
+        if (self._labeled_feature_cache is None or
+                self._labeled_feature_cache.key != key):
+            # one file per behavior, a file saved with other settings is
+            # replaced the next time the cache is saved
+            self._labeled_feature_cache = LabeledFeatureCache(
+                self.__labeled_feature_cache_path(behavior), key)
+        return self._labeled_feature_cache
+
+    def __labeled_feature_cache_path(self, behavior: str) -> Path:
+        return (self._feature_dir /
+                f"labeled_features_{self.to_safe_name(behavior)}.h5")
+
+    def __feature_store(self, video):
+        """
+        get the feature store of a video, keeping the stores of the
+        _FEATURE_STORES most recently used videos
+        """
+        store = self._feature_stores.pop(video, None)
+        if store is None:
+            store = fe.FeatureStore.for_video(self.feature_dir, video)
+        self._feature_stores[video] = store
+        while len(self._feature_stores) > self._FEATURE_STORES:
+            self._feature_stores.popitem(last=False)
+        return store
+
+    def __labeled_features_signature(self, video) -> str:
+        """
+        signature of the files the labeled features of a video are assembled
+        from, the annotations and the pose file. Annotations are saved every
+        time the labels change
+        """
+        annotations = self._annotations_dir / Path(video).with_suffix('.json')
+        pose_path = get_pose_path(self.video_path(video))
+
+        signature = []
+        for path in [annotations, pose_path]:
+            try:
+                stat = path.stat()
+                signature.append([stat.st_mtime_ns, stat.st_size])
+            except FileNotFoundError:
+                signature.append(None)
+        return json.dumps(signature)
+
+    def __assemble_labeled_features(self, video, behavior, window_size,
+                                    feature_names,
+                                    cache: LabeledFeatureCache) -> list:
+        """
+        read the features of the labeled frames of each identity of a video
+        :return: list of (identity, per frame features, window features,
+        labels) tuples
+        """
+        video_path = self.video_path(video)
+        pose_est = self.load_pose_est(video_path)
+        # fps used to scale some features from per pixel time unit to
+        # per second
+        fps = get_fps(str(video_path))
+
+        # the features of all identities of the video are read from a
+        # single consolidated feature store, which is filled in from the
+        # per identity feature files the first time they are needed
+        store = self.__feature_store(video)
+        video_labels = self.load_video_labels(video)
+
+        if self._distance_unit == ProjectDistanceUnit.CM:
+            distance_scale_factor = pose_est.cm_per_pixel
+        else:
+            distance_scale_factor = 1
+
+        identities = []
+        for identity in pose_est.identities:
+            track_labels = video_labels.get_track_labels(str(identity),
+                                                         behavior)
+            labels = track_labels.get_labels()
+            labeled = labels != TrackLabels.Label.NONE
+
+            # only the labeled blocks of frames are read from the store
+            read_args = (identity, window_size, pose_est.hash,
+                         float(distance_scale_factor))
+            label_blocks = track_labels.get_blocks()
+            try:
+                per_frame_features, window_features = store.read(
+                    *read_args, label_blocks=label_blocks)
+            except (OSError, KeyError, fe.FeatureVersionException,
+                    fe.DistanceScaleException, PoseHashException):
+                fe.IdentityFeatures(
+                    video, identity, self.feature_dir, pose_est, fps=fps,
+                    distance_scale_factor=distance_scale_factor,
+                    extended_features=self._enabled_extended_features
+                ).save_to_store(store, window_size)
+                per_frame_features, window_features = store.read(
+                    *read_args, label_blocks=label_blocks)
+
+            # only keep the enabled features
+            per_frame_features = {
+                feature: per_frame_features[feature]
+                for feature in feature_names
+            }
+            window_features = {
+                feature: values
+                for feature, values in window_features.items()
+                if feature in feature_names
+            }
+            if cache.column_names is None:
+                cache.column_names = store.column_names(
+                    identity, window_size, feature_names)
+
+            identities.append((identity, per_frame_features, window_features,
+                               labels[labeled]))
+        return identities
+
     def __update_version(self):
         """ update the version number saved in project metadata """
         # only update if the version in the metadata is different from current
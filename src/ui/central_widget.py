@@ -444,7 +444,8 @@ class CentralWidget(QtWidgets.QWidget):
             self._controls.current_behavior,
             self._window_size,
             self._controls.use_social_features,
-            self._controls.kfold_value)
+            self._controls.kfold_value,
+            warm_start=self._project.warm_start_training)
         self._training_thread.training_complete.connect(
             self._training_thread_complete)
         self._training_thread.update_progress.connect(
@@ -2,7 +2,7 @@ import numpy as np
 from PySide2 import QtCore
 
 from src.project import ProjectDistanceUnit
-from src.feature_extraction import IdentityFeatures
+from src.feature_extraction import FeatureStore, IdentityFeatures
 from src.video_stream.utilities import get_fps
 
 
@@ -51,6 +51,10 @@ class ClassifyThread(QtCore.QThread):
             probabilities[video] = {}
             frame_indexes[video] = {}
 
+            # features of every identity are read from the video's feature
+            # store
+            store = FeatureStore.for_video(self._project.feature_dir, video)
+
             if self._project.distance_unit == ProjectDistanceUnit.CM:
                 distance_scale_factor = pose_est.cm_per_pixel
             else:
@@ -67,35 +71,31 @@ class ClassifyThread(QtCore.QThread):
                     extended_features=self._project.extended_features
                 )
                 identity = str(ident)
-                feature_values = features.get_features(
-                    self._window_size, self._classifier.uses_social)
-
-                # reformat the data in a single 2D numpy array to pass
-                # to the classifier
-                data = self._classifier.combine_data(
-                    feature_values['per_frame'],
-                    feature_values['window']
-                )
 
-                if data.shape[0] > 0:
-                    # make predictions
-                    predictions[video][identity] = self._classifier.predict(
-                        data)
-
-                    # also get the probabilities
-                    prob = self._classifier.predict_proba(data)
-                    # Save the probability for the predicted class only.
-                    # The following code uses some
-                    # numpy magic to use the _predictions array as column indexes
-                    # for each row of the 'prob' array we just computed.
-                    probabilities[video][identity] = prob[
-                        np.arange(len(prob)),
-                        predictions[video][identity]
-                    ]
+                # classify the features one chunk of frames at a time, read
+                # from the video's feature store in the project feature
+                # directory so classifying the video again is just a read.
+                # The predicted class and its probability come from the same
+                # evaluation of the classifier
+                pred = []
+                prob = []
+                indexes = []
+                for chunk in features.iter_feature_matrix(
+                        self._window_size, self._classifier.uses_social,
+                        store):
+                    chunk_pred, chunk_prob = \
+                        self._classifier.predict_with_probability(
+                            chunk['data'])
+                    pred.append(chunk_pred)
+                    prob.append(chunk_prob)
+                    indexes.append(chunk['frame_indexes'])
+
+                if indexes:
+                    predictions[video][identity] = np.concatenate(pred)
+                    probabilities[video][identity] = np.concatenate(prob)
 
                     # save the indexes for the predicted frames
-                    frame_indexes[video][identity] = feature_values[
-                        'frame_indexes']
+                    frame_indexes[video][identity] = np.concatenate(indexes)
                 else:
                     predictions[video][identity] = np.array(0)
                     probabilities[video][identity] = np.array(0)
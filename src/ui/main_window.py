@@ -82,6 +82,18 @@ class MainWindow(QtWidgets.QMainWindow):
         self._archive_behavior.triggered.connect(self._open_archive_behavior_dialog)
         file_menu.addAction(self._archive_behavior)
 
+        # warm start training action, saved in the project metadata
+        self._warm_start_training = QtWidgets.QAction(
+            'Update Classifier Incrementally', self)
+        self._warm_start_training.setStatusTip(
+            'Update the trained classifier instead of training it again '
+            'when only a few labels changed')
+        self._warm_start_training.setCheckable(True)
+        self._warm_start_training.setEnabled(False)
+        self._warm_start_training.triggered.connect(
+            self._toggle_warm_start_training)
+        file_menu.addAction(self._warm_start_training)
+
         # video playlist menu item
         self.view_playlist = QtWidgets.QAction('View Playlist', self)
         self.view_playlist.setCheckable(True)
@@ -159,6 +171,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self._project = Project(project_path)
         self.centralWidget().set_project(self._project)
         self.video_list.set_project(self._project)
+        self._warm_start_training.setChecked(
+            self._project.warm_start_training)
+        self._warm_start_training.setEnabled(True)
 
     def display_status_message(self, message: str, duration: int=3000):
         """
@@ -243,6 +258,10 @@ class MainWindow(QtWidgets.QMainWindow):
     def _toggle_landmark_overlay(self, checked):
         self._central_widget.overlay_landmarks(checked)
 
+    def _toggle_warm_start_training(self, checked):
+        """ enable/disable updating the trained classifier incrementally """
+        self._project.save_metadata({'warm_start_training': checked})
+
     def _video_list_selection(self, filename):
         """
         handle a click on a new video in the list loaded into the main
@@ -1,9 +1,8 @@
-import itertools
-
 import numpy as np
 from PySide2 import QtCore
 from tabulate import tabulate
 
+from src.classifier.cross_validation import cross_validate
 from src.project import ProjectDistanceUnit
 from src.utils import FINAL_TRAIN_SEED
 
@@ -26,7 +25,7 @@ class TrainingThread(QtCore.QThread):
     update_progress = QtCore.Signal(int)
 
     def __init__(self, project, classifier, behavior, window_size, uses_social,
-                 k=1):
+                 k=1, warm_start=False):
         super().__init__()
         self._project = project
         self._classifier = classifier
@@ -35,6 +34,7 @@ class TrainingThread(QtCore.QThread):
         self._window_size = window_size
         self._uses_social = uses_social
         self._k = k
+        self._warm_start = warm_start
 
     def run(self):
         """
@@ -58,14 +58,6 @@ class TrainingThread(QtCore.QThread):
             id_processed
         )
 
-        self.current_status.emit("Generating train/test splits")
-        data_generator = self._classifier.leave_one_group_out(
-            features['per_frame'],
-            features['window'],
-            features['labels'],
-            features['groups']
-        )
-
         table_rows = []
         accuracies = []
         fbeta_behavior = []
@@ -73,30 +65,26 @@ class TrainingThread(QtCore.QThread):
 
         if self._k > 0:
 
-            for i, data in enumerate(itertools.islice(data_generator, self._k)):
-                self.current_status.emit(f"cross validation iteration {i}")
-
-                test_info = group_mapping[data['test_group']]
-
-                # train classifier, and then use it to classify our test data
-                self._classifier.train(data, self._behavior, self._window_size,
-                                       self._uses_social,
-                                       self._project.extended_features,
-                                       self._project.distance_unit)
-                predictions = self._classifier.predict(data['test_data'])
-
-                # calculate some performance metrics using the classifications
-                accuracy = self._classifier.accuracy_score(
-                    data['test_labels'], predictions)
-                pr = self._classifier.precision_recall_score(
-                    data['test_labels'], predictions)
-                confusion = self._classifier.confusion_matrix(
-                    data['test_labels'], predictions)
-
-                table_rows.append([
+            # folds are trained concurrently in worker processes, the results
+            # of each fold are printed as soon as it finishes
+            self.current_status.emit("Running cross validation")
+            for result in cross_validate(
+                    self._classifier.classifier_type,
+                    features['per_frame'], features['window'],
+                    features['labels'], features['groups'], self._k):
+                i = result['fold']
+                self.current_status.emit(
+                    f"cross validation iteration {i} complete")
+
+                test_info = group_mapping[result['test_group']]
+                accuracy = result['accuracy']
+                pr = result['precision_recall']
+                confusion = result['confusion']
+
+                table_rows.append((i, [
                     accuracy, pr[0][0], pr[0][1], pr[1][0], pr[1][1], pr[2][0],
                     pr[2][1], f"{test_info['video']} [{test_info['identity']}]"
-                ])
+                ]))
                 accuracies.append(accuracy)
                 fbeta_behavior.append(pr[2][1])
                 fbeta_notbehavior.append(pr[2][0])
@@ -120,12 +108,16 @@ class TrainingThread(QtCore.QThread):
                 print("Top 10 features by importance:")
                 self._classifier.print_feature_importance(
                     features['column_names'],
-                    10)
+                    10, importances=result['feature_importances'])
 
                 # let the parent thread know that we've finished this iteration
                 self._tasks_complete += 1
                 self.update_progress.emit(self._tasks_complete)
 
+            # folds finish in any order, list them in fold order
+            table_rows = [row for _, row in sorted(table_rows,
+                                                   key=lambda r: r[0])]
+
             print('\n' + '=' * 70)
             print("SUMMARY\n")
             print(tabulate(table_rows, showindex="always", headers=[
@@ -145,20 +137,25 @@ class TrainingThread(QtCore.QThread):
             print(f"Feature Distance Unit: {unit}")
             print('-' * 70)
 
-        # retrain with all training data and fixed random seed before saving:
+        # retrain with all training data and fixed random seed before saving.
+        # if the project enables warm start and only a few labels changed
+        # since the classifier was last trained, the trained classifier is
+        # updated instead of trained from scratch
         self.current_status.emit("Training and saving final classifier")
         self._classifier.train(
             {
                 'training_data': self._classifier.combine_data(
                     features['per_frame'], features['window']),
-                'training_labels': features['labels']
+                'training_labels': features['labels'],
+                'sources': features['sources']
             },
             self._behavior,
             self._window_size,
             self._uses_social,
             self._project.extended_features,
             self._project.distance_unit,
-            random_seed=FINAL_TRAIN_SEED
+            random_seed=FINAL_TRAIN_SEED,
+            warm_start=self._warm_start
         )
 
         self._project.save_classifier(self._classifier, self._behavior)
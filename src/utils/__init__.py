@@ -1,4 +1,4 @@
-from .utilities import hide_stderr, hash_file
+from .utilities import hide_stderr, hash_file, hash_file_cached
 
 # a hard coded random seed used for the final training done with all
 # training data before saving the classifier
@@ -0,0 +1,559 @@
+"""
+vectorized geometry helpers for the convex hulls of poses
+
+These functions operate on the hulls for all frames at once instead of
+building shapely geometries for each frame. Results are computed using the
+same formulas, in the same order, as GEOS (the library behind shapely), so
+for the integer pixel coordinates stored in pose files they match the values
+shapely returns.
+
+A set of hulls is represented by two arrays:
+  vertices: float64 array with shape (#frames, #points, 2). The hull
+    vertices for each frame, starting with the vertex with the lowest y
+    coordinate (lowest x breaks ties) and going clockwise, like the exterior
+    ring of the polygon returned by shapely convex_hull without the repeated
+    closing vertex. The two vertices of a LineString may be in the opposite
+    order from shapely, which does not change its distance or centroid.
+    Unused elements are NaN.
+  num_vertices: int array with shape (#frames,). 0 if there is no hull for
+    the frame, 1 if the hull is a Point, 2 if it is a LineString and the
+    number of vertices of the Polygon otherwise.
+
+polygon_signed_distances() measures the distance from points to a static
+polygon, such as the food hopper, the same way as OpenCV's
+pointPolygonTest, and point_pair_distances() measures the distances between
+pairs of keypoints.
+"""
+
+import collections.abc
+import typing
+
+import numpy as np
+from shapely.geometry import LineString, Point, Polygon
+
+# limits the size of the temporary arrays, which have
+# #frames * #points * #points * #points elements for convex_hulls
+_CHUNK_SIZE = 4096
+
+
+def convex_hulls(points: np.ndarray, point_mask: np.ndarray,
+                 min_points: int = 3) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    compute the convex hulls of a set of points for every frame
+    :param points: array of points with shape (#frames, #points, 2)
+    :param point_mask: array with shape (#frames, #points) indicating which
+    points are valid
+    :param min_points: minimum number of valid points needed for a frame to
+    have a hull
+    :return: vertices, num_vertices (see module docstring)
+    """
+    num_frames, num_points = points.shape[:2]
+    vertices = np.full((num_frames, num_points, 2), np.nan)
+    num_vertices = np.zeros(num_frames, dtype=np.int64)
+
+    for start in range(0, num_frames, _CHUNK_SIZE):
+        stop = min(start + _CHUNK_SIZE, num_frames)
+        vertices[start:stop], num_vertices[start:stop] = _convex_hulls(
+            np.asarray(points[start:stop], dtype=np.float64),
+            np.asarray(point_mask[start:stop]) == 1, min_points)
+
+    return vertices, num_vertices
+
+
+def _convex_hulls(points: np.ndarray, valid: np.ndarray, min_points: int):
+    """
+    convex_hulls for a chunk of frames
+
+    Edge i -> j is an edge of the clockwise hull if every other point is to
+    the right of it, or on the segment between i and j. Each hull vertex has
+    exactly one such outgoing edge, so the hull can be traced by following
+    the edges starting at the lowest point.
+    """
+    num_frames, num_points = points.shape[:2]
+    has_hull = valid.sum(axis=1) >= min_points
+
+    # ignore duplicate points, only keep the first copy of each
+    same = (points[:, :, np.newaxis, :] == points[:, np.newaxis, :, :]).all(
+        axis=-1) & valid[:, :, np.newaxis] & valid[:, np.newaxis, :]
+    earlier = np.tril(np.ones((num_points, num_points), dtype=bool), -1)
+    valid = valid & ~(same & earlier).any(axis=2)
+
+    # offsets[f, i, j] is the vector from point i to point j
+    offsets = points[:, np.newaxis, :, :] - points[:, :, np.newaxis, :]
+    ij = offsets[:, :, :, np.newaxis, :]
+    ik = offsets[:, :, np.newaxis, :, :]
+    cross = ij[..., 0] * ik[..., 1] - ij[..., 1] * ik[..., 0]
+    dot = ij[..., 0] * ik[..., 0] + ij[..., 1] * ik[..., 1]
+    length2 = (ij[..., 0] * ij[..., 0] + ij[..., 1] * ij[..., 1])
+
+    k_ok = ((cross < 0) | ((cross == 0) & (dot >= 0) & (dot <= length2)) |
+            ~valid[:, np.newaxis, np.newaxis, :])
+    is_edge = (k_ok.all(axis=3) &
+               valid[:, :, np.newaxis] & valid[:, np.newaxis, :] &
+               ~np.eye(num_points, dtype=bool))
+    successor = is_edge.argmax(axis=2)
+    has_successor = is_edge.any(axis=2)
+
+    # start at the point with the lowest y, then lowest x
+    x = np.where(valid, points[..., 0], np.inf)
+    y = np.where(valid, points[..., 1], np.inf)
+    lowest_y = y.min(axis=1, keepdims=True)
+    first = np.where(y == lowest_y, x, np.inf).argmin(axis=1)
+
+    frames = np.arange(num_frames)
+    vertices = np.full((num_frames, num_points, 2), np.nan)
+    num_vertices = np.zeros(num_frames, dtype=np.int64)
+    current = first
+    tracing = has_hull.copy()
+    for i in range(num_points):
+        vertices[tracing, i] = points[frames[tracing], current[tracing]]
+        num_vertices[tracing] += 1
+
+        # a single distinct point has no edges, so it is a one vertex hull
+        tracing &= has_successor[frames, current]
+        current = successor[frames, current]
+        tracing &= current != first
+
+    return vertices, num_vertices
+
+
+def hull_centroids(vertices: np.ndarray,
+                   num_vertices: np.ndarray) -> np.ndarray:
+    """
+    compute the centroid of each hull the same way GEOS does: area weighted
+    triangle centroids for polygons, length weighted segment midpoints for
+    line strings
+    :return: array with shape (#frames, 2), NaN for frames without a hull
+    """
+    num_frames, num_points = vertices.shape[:2]
+    ring = _closed_ring(vertices, num_vertices)
+    base = ring[:, 0, :]
+
+    # triangles formed by the first vertex and each edge of the ring
+    p1 = ring[:, :-1, :]
+    p2 = ring[:, 1:, :]
+    area2 = ((p1[..., 0] - base[:, np.newaxis, 0]) *
+             (p2[..., 1] - base[:, np.newaxis, 1]) -
+             (p2[..., 0] - base[:, np.newaxis, 0]) *
+             (p1[..., 1] - base[:, np.newaxis, 1]))
+    area2 = np.where(np.isnan(area2), 0, area2)
+    triangle_cent3 = base[:, np.newaxis, :] + p1 + p2
+    triangle_cent3 = np.where(np.isnan(triangle_cent3), 0, triangle_cent3)
+
+    # GEOS accumulates these sums edge by edge, so do the same to keep the
+    # same rounding
+    cg3 = np.zeros((num_frames, 2))
+    area_sum2 = np.zeros(num_frames)
+    for i in range(num_points):
+        cg3 += area2[:, i, np.newaxis] * triangle_cent3[:, i]
+        area_sum2 += area2[:, i]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        polygon_centroid = cg3 / 3 / area_sum2[:, np.newaxis]
+
+        # line string centroid
+        a = vertices[:, 0, :]
+        b = vertices[:, 1, :]
+        length = np.sqrt((a[:, 0] - b[:, 0]) * (a[:, 0] - b[:, 0]) +
+                         (a[:, 1] - b[:, 1]) * (a[:, 1] - b[:, 1]))
+        line_centroid = (length[:, np.newaxis] * ((a + b) / 2) /
+                         length[:, np.newaxis])
+
+    centroids = np.full((num_frames, 2), np.nan)
+    centroids[num_vertices == 1] = vertices[num_vertices == 1, 0]
+    centroids[num_vertices == 2] = line_centroid[num_vertices == 2]
+    centroids[num_vertices >= 3] = polygon_centroid[num_vertices >= 3]
+    return centroids
+
+
+def hull_areas(vertices: np.ndarray, num_vertices: np.ndarray) -> np.ndarray:
+    """
+    compute the area of each hull using the same shoelace formula as GEOS.
+    Points and line strings have an area of 0
+    :return: array with shape (#frames,), NaN for frames without a hull
+    """
+    num_frames, num_points = vertices.shape[:2]
+    ring = _closed_ring(vertices, num_vertices)
+    x0 = ring[:, 0, 0]
+
+    area_sum = np.zeros(num_frames)
+    for i in range(1, num_points):
+        term = ((ring[:, i, 0] - x0) *
+                (ring[:, i - 1, 1] - ring[:, i + 1, 1]))
+        area_sum += np.where(i < num_vertices, term, 0)
+
+    areas = np.abs(area_sum / 2.0)
+    areas[num_vertices < 3] = 0
+    areas[num_vertices == 0] = np.nan
+    return areas
+
+
+class HullSequence(collections.abc.Sequence):
+    """
+    read only sequence of the shapely geometries of a set of hulls, used
+    where code needs a real polygon for a frame. Geometries are only built
+    when they are accessed. Elements are None for frames without a hull.
+    """
+
+    def __init__(self, vertices: np.ndarray, num_vertices: np.ndarray):
+        self._vertices = vertices
+        self._num_vertices = num_vertices
+
+    def __len__(self):
+        return len(self._num_vertices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._geometry(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("hull index out of range")
+        return self._geometry(index)
+
+    def _geometry(self, index: int):
+        count = self._num_vertices[index]
+        coords = self._vertices[index, :count]
+        if count == 0:
+            return None
+        elif count == 1:
+            return Point(coords[0])
+        elif count == 2:
+            return LineString(coords)
+        return Polygon(coords)
+
+
+def hull_distances(vertices_a: np.ndarray, num_vertices_a: np.ndarray,
+                   vertices_b: np.ndarray,
+                   num_vertices_b: np.ndarray) -> np.ndarray:
+    """
+    distance between two hulls in each frame, computed like the GEOS
+    DistanceOp used by shapely's distance(): 0 if a hull contains the first
+    vertex of the other or any of their edges intersect, otherwise the
+    minimum distance between their edges
+    :return: array with shape (#frames,), NaN where either hull is missing
+    """
+    num_frames = vertices_a.shape[0]
+    distances = np.full(num_frames, np.nan)
+    for start in range(0, num_frames, _CHUNK_SIZE):
+        stop = min(start + _CHUNK_SIZE, num_frames)
+        distances[start:stop] = _hull_distances(
+            vertices_a[start:stop], num_vertices_a[start:stop],
+            vertices_b[start:stop], num_vertices_b[start:stop])
+    return distances
+
+
+def hull_point_distances(vertices: np.ndarray, num_vertices: np.ndarray,
+                         points: np.ndarray) -> np.ndarray:
+    """
+    distance between the hull in each frame and each of a set of fixed
+    points, such as the corners of the arena. This gives the same values as
+    hull_distances with each point as a single vertex hull (and shapely's
+    distance() to a Point) without comparing every pair of edges.
+    :param points: coordinates of the points, shape (#points, 2)
+    :return: array with shape (#frames, #points), NaN where the hull is
+    missing
+    """
+    points = np.asarray(points, dtype=np.float64)
+    num_frames = vertices.shape[0]
+    distances = np.full((num_frames, len(points)), np.nan)
+    for start in range(0, num_frames, _CHUNK_SIZE):
+        stop = min(start + _CHUNK_SIZE, num_frames)
+        distances[start:stop] = _hull_point_distances(
+            vertices[start:stop], num_vertices[start:stop], points)
+    return distances
+
+
+def _hull_point_distances(vertices, num_vertices, points):
+    """ hull_point_distances for a chunk of frames """
+    start, end, valid = _segments(vertices, num_vertices)
+
+    # the parts of _point_to_segment and _in_convex_polygon that only
+    # depend on the edges, as contiguous arrays
+    ax = np.ascontiguousarray(start[..., 0])
+    ay = np.ascontiguousarray(start[..., 1])
+    bx = np.ascontiguousarray(end[..., 0])
+    by = np.ascontiguousarray(end[..., 1])
+    ex = bx - ax
+    ey = by - ay
+    length2 = ex * ex + ey * ey
+    length = np.sqrt(length2)
+    degenerate = (ax == bx) & (ay == by)
+    is_polygon = num_vertices >= 3
+
+    distances = np.empty((vertices.shape[0], len(points)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, (px, py) in enumerate(points):
+            dx = px - ax
+            dy = py - ay
+            r = (dx * ex + dy * ey) / length2
+            cross = ex * dy - ey * dx
+
+            # GEOS Distance::pointToSegment for each edge
+            distance = np.where(
+                degenerate | (r <= 0), np.sqrt(dx * dx + dy * dy),
+                np.where(r >= 1,
+                         np.sqrt(np.square(px - bx) + np.square(py - by)),
+                         np.abs(cross / length2) * length))
+            distance = np.where(valid, distance, np.inf).min(axis=1)
+
+            # points inside the hull (see _in_convex_polygon)
+            contained = is_polygon & ((cross <= 0) | ~valid).all(axis=1)
+            distance[contained] = 0
+            distances[:, i] = distance
+
+    distances[num_vertices == 0] = np.nan
+    return distances
+
+
+def _hull_distances(vertices_a, num_vertices_a, vertices_b, num_vertices_b):
+    """ hull_distances for a chunk of frames """
+    a1, a2, a_valid = _segments(vertices_a, num_vertices_a)
+    b1, b2, b_valid = _segments(vertices_b, num_vertices_b)
+
+    # broadcast to compare each segment of a with each segment of b
+    a1 = a1[:, :, np.newaxis, :]
+    a2 = a2[:, :, np.newaxis, :]
+    b1 = b1[:, np.newaxis, :, :]
+    b2 = b2[:, np.newaxis, :, :]
+    pair_valid = a_valid[:, :, np.newaxis] & b_valid[:, np.newaxis, :]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance = _segment_to_segment(a1, a2, b1, b2)
+    distance = np.where(pair_valid, distance, np.inf).min(axis=(1, 2))
+
+    contained = (
+        _in_convex_polygon(vertices_a[:, 0], vertices_b, num_vertices_b) |
+        _in_convex_polygon(vertices_b[:, 0], vertices_a, num_vertices_a)
+    )
+    distance[contained] = 0
+    distance[(num_vertices_a == 0) | (num_vertices_b == 0)] = np.nan
+    return distance
+
+
+def _closed_ring(vertices: np.ndarray,
+                 num_vertices: np.ndarray) -> np.ndarray:
+    """
+    hull vertices with the first vertex repeated after the last, padded
+    with NaN to shape (#frames, #points + 1, 2)
+    """
+    num_frames, num_points = vertices.shape[:2]
+    ring = np.full((num_frames, num_points + 1, 2), np.nan)
+    ring[:, :num_points] = vertices
+    has_hull = num_vertices > 0
+    ring[np.flatnonzero(has_hull), num_vertices[has_hull]] = \
+        vertices[has_hull, 0]
+    return ring
+
+
+def _segments(vertices: np.ndarray, num_vertices: np.ndarray):
+    """
+    edges of each hull, returned as start points, end points and a mask
+    of the valid edges. A polygon has one edge for each vertex, a line
+    string has a single edge and a point is a single zero length edge
+    """
+    num_points = vertices.shape[1]
+    ring = _closed_ring(vertices, num_vertices)
+    start = ring[:, :-1]
+    end = ring[:, 1:].copy()
+
+    # a point is represented as a zero length segment
+    is_point = num_vertices == 1
+    end[is_point, 0] = start[is_point, 0]
+
+    num_segments = np.where(num_vertices >= 3, num_vertices,
+                            np.minimum(num_vertices, 1))
+    valid = np.arange(num_points) < num_segments[:, np.newaxis]
+    return start, end, valid
+
+
+def _distance(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    dx = p[..., 0] - q[..., 0]
+    dy = p[..., 1] - q[..., 1]
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def _point_to_segment(p, a, b):
+    """ GEOS Distance::pointToSegment """
+    length2 = ((b[..., 0] - a[..., 0]) * (b[..., 0] - a[..., 0]) +
+               (b[..., 1] - a[..., 1]) * (b[..., 1] - a[..., 1]))
+    r = ((p[..., 0] - a[..., 0]) * (b[..., 0] - a[..., 0]) +
+         (p[..., 1] - a[..., 1]) * (b[..., 1] - a[..., 1])) / length2
+    s = ((a[..., 1] - p[..., 1]) * (b[..., 0] - a[..., 0]) -
+         (a[..., 0] - p[..., 0]) * (b[..., 1] - a[..., 1])) / length2
+    degenerate = (a == b).all(axis=-1)
+    return np.where(
+        degenerate | (r <= 0), _distance(p, a),
+        np.where(r >= 1, _distance(p, b), np.abs(s) * np.sqrt(length2)))
+
+
+def _segment_to_segment(a, b, c, d):
+    """ GEOS Distance::segmentToSegment """
+    a_point = (a == b).all(axis=-1)
+    c_point = (c == d).all(axis=-1)
+
+    envelopes_intersect = (
+        (np.maximum(a[..., 0], b[..., 0]) >= np.minimum(c[..., 0], d[..., 0])) &
+        (np.minimum(a[..., 0], b[..., 0]) <= np.maximum(c[..., 0], d[..., 0])) &
+        (np.maximum(a[..., 1], b[..., 1]) >= np.minimum(c[..., 1], d[..., 1])) &
+        (np.minimum(a[..., 1], b[..., 1]) <= np.maximum(c[..., 1], d[..., 1]))
+    )
+    denom = ((b[..., 0] - a[..., 0]) * (d[..., 1] - c[..., 1]) -
+             (b[..., 1] - a[..., 1]) * (d[..., 0] - c[..., 0]))
+    r = ((a[..., 1] - c[..., 1]) * (d[..., 0] - c[..., 0]) -
+         (a[..., 0] - c[..., 0]) * (d[..., 1] - c[..., 1])) / denom
+    s = ((a[..., 1] - c[..., 1]) * (b[..., 0] - a[..., 0]) -
+         (a[..., 0] - c[..., 0]) * (b[..., 1] - a[..., 1])) / denom
+    intersect = (envelopes_intersect & (denom != 0) &
+                 (r >= 0) & (r <= 1) & (s >= 0) & (s <= 1))
+
+    no_intersection = np.minimum(
+        np.minimum(_point_to_segment(a, c, d), _point_to_segment(b, c, d)),
+        np.minimum(_point_to_segment(c, a, b), _point_to_segment(d, a, b)))
+
+    return np.where(
+        a_point, _point_to_segment(a, c, d),
+        np.where(c_point, _point_to_segment(d, a, b),
+                 np.where(intersect, 0.0, no_intersection)))
+
+
+def _in_convex_polygon(p: np.ndarray, vertices: np.ndarray,
+                       num_vertices: np.ndarray) -> np.ndarray:
+    """
+    test if a point is inside or on the boundary of a clockwise convex polygon
+    :param p: point for each frame, shape (#frames, 2)
+    :return: boolean array with shape (#frames,), always False for hulls that
+    are not polygons
+    """
+    start, end, valid = _segments(vertices, num_vertices)
+    cross = ((end[..., 0] - start[..., 0]) *
+             (p[:, np.newaxis, 1] - start[..., 1]) -
+             (end[..., 1] - start[..., 1]) *
+             (p[:, np.newaxis, 0] - start[..., 0]))
+    return (num_vertices >= 3) & ((cross <= 0) | ~valid).all(axis=1)
+
+
+def polygon_signed_distances(points: np.ndarray,
+                             polygon: np.ndarray) -> np.ndarray:
+    """
+    signed distance from each point to the boundary of a polygon, positive
+    inside the polygon and negative outside. This is a vectorized
+    cv2.pointPolygonTest(polygon, point, measureDist=True) that gives the
+    same values: coordinates are converted to float32 and differences are
+    taken in float32 before the rest of the computation is done in float64,
+    visiting the edges in the same order as OpenCV.
+    :param points: array of points with shape (..., 2)
+    :param polygon: polygon vertices with shape (#vertices, 2)
+    :return: float64 array with shape points.shape[:-1]
+    """
+    polygon = np.asarray(polygon, dtype=np.float32)
+    points = np.asarray(points, dtype=np.float32)
+    px = points[..., 0]
+    py = points[..., 1]
+    shape = points.shape[:-1]
+
+    if len(polygon) == 0:
+        return np.full(shape, -np.finfo(np.float64).max)
+
+    min_dist_num = np.full(shape, np.finfo(np.float32).max, dtype=np.float64)
+    min_dist_denom = np.ones(shape)
+    crossings = np.zeros(shape, dtype=np.int64)
+    # OpenCV stops visiting edges once it finds one the point is on
+    searching = np.ones(shape, dtype=bool)
+
+    for v0, v in zip(np.roll(polygon, 1, axis=0), polygon):
+        dx = np.float64(v[0] - v0[0])
+        dy = np.float64(v[1] - v0[1])
+        dx1 = (px - v0[0]).astype(np.float64)
+        dy1 = (py - v0[1]).astype(np.float64)
+        dx2 = (px - v[0]).astype(np.float64)
+        dy2 = (py - v[1]).astype(np.float64)
+        cross = dy1 * dx - dx1 * dy
+
+        # squared distance to the edge as a fraction, the distance to the
+        # closest end point or the distance to the line through the edge
+        before = dx1 * dx + dy1 * dy <= 0
+        after = ~before & (dx2 * dx + dy2 * dy >= 0)
+        dist_num = np.where(before, dx1 * dx1 + dy1 * dy1,
+                            np.where(after, dx2 * dx2 + dy2 * dy2,
+                                     cross * cross))
+        dist_denom = np.where(before | after, 1.0, dx * dx + dy * dy)
+
+        closer = searching & (dist_num * min_dist_denom <
+                              min_dist_num * dist_denom)
+        min_dist_num = np.where(closer, dist_num, min_dist_num)
+        min_dist_denom = np.where(closer, dist_denom, min_dist_denom)
+        searching &= ~(closer & (min_dist_num == 0))
+
+        # count edges crossed by a ray from the point in the +x direction
+        straddles = ~(((v0[1] <= py) & (v[1] <= py)) |
+                      ((v0[1] > py) & (v[1] > py)) |
+                      ((v0[0] < px) & (v[0] < px)))
+        if dy < 0:
+            cross = -cross
+        crossings += searching & straddles & (cross > 0)
+
+    result = np.sqrt(min_dist_num / min_dist_denom)
+    return np.where(crossings % 2 == 0, -result, result)
+
+
+def point_pair_distances(points_a: np.ndarray, points_b: np.ndarray,
+                         index_a: np.ndarray,
+                         index_b: np.ndarray) -> np.ndarray:
+    """
+    euclidean distance between pairs of keypoints in each frame, where
+    distances[f, k] is the distance between points_a[f, index_a[k]] and
+    points_b[f, index_b[k]]. The distances are computed in the precision of
+    the points (integer coordinates are converted to float64) and stored as
+    float32, processing the frames in chunks to limit the size of the
+    temporary arrays.
+    :param points_a: array of points with shape (#frames, #points, 2)
+    :param points_b: array of points with shape (#frames, #points, 2)
+    :param index_a: index into the points of points_a for each pair
+    :param index_b: index into the points of points_b for each pair
+    :return: float32 array with shape (#frames, #pairs)
+    """
+    index_a = np.asarray(index_a, dtype=np.intp)
+    index_b = np.asarray(index_b, dtype=np.intp)
+    num_frames = points_a.shape[0]
+
+    distances = np.empty((num_frames, len(index_a)), dtype=np.float32)
+    for start in range(0, num_frames, _CHUNK_SIZE):
+        stop = min(start + _CHUNK_SIZE, num_frames)
+
+        # work with one contiguous row of frames per point, which is much
+        # faster to gather and subtract than the (frame, point) layout
+        a = np.ascontiguousarray(np.moveaxis(points_a[start:stop], 0, -1))
+        b = np.ascontiguousarray(np.moveaxis(points_b[start:stop], 0, -1))
+        if not np.issubdtype(a.dtype, np.inexact):
+            a = a.astype(np.float64)
+            b = b.astype(np.float64)
+        dx = a[index_a, 0] - b[index_b, 0]
+        dy = a[index_a, 1] - b[index_b, 1]
+        np.square(dx, out=dx)
+        np.square(dy, out=dy)
+        dx += dy
+        distances[start:stop] = np.sqrt(dx, out=dx).T
+    return distances
+
+
+def compute_angles(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """
+    compute the angle ABC for every frame, vectorized version of the
+    compute_angle() methods of the feature modules. Like compute_angle(), the
+    points are truncated to integers
+    :param a: points, shape (#frames, 2)
+    :param b: vertex points, shape (#frames, 2)
+    :param c: points, shape (#frames, 2)
+    :return: angle between AB and BC in degrees, in the range [0, 360), for
+    each frame. NaN where any of the points are NaN
+    """
+    a = np.trunc(a.astype(np.float64))
+    b = np.trunc(b.astype(np.float64))
+    c = np.trunc(c.astype(np.float64))
+
+    angles = np.degrees(
+        np.arctan2(c[:, 1] - b[:, 1], c[:, 0] - b[:, 0]) -
+        np.arctan2(a[:, 1] - b[:, 1], a[:, 0] - b[:, 0])
+    )
+    return np.where(angles < 0, angles + 360, angles)
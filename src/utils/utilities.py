@@ -1,7 +1,9 @@
 import hashlib
+import json
 import math
 import os
 import sys
+import typing
 from contextlib import contextmanager
 from pathlib import Path
 
@@ -62,13 +64,77 @@ def n_choose_r(n, r):
     return math.factorial(n) // (math.factorial(r) * math.factorial(n - r))
 
 
+# hashes of files that have already been hashed by this process, keyed by
+# path. Each value is a tuple of (stat key, hash)
+_hash_memo = {}
+
+
 def hash_file(file: Path):
     """ return hash """
-    chunk_size = 8192
-    with file.open('rb') as f:
+    buffer = bytearray(1 << 20)
+    view = memoryview(buffer)
+    with file.open('rb', buffering=0) as f:
         h = hashlib.blake2b(digest_size=20)
-        c = f.read(chunk_size)
-        while c:
-            h.update(c)
-            c = f.read(chunk_size)
+        n = f.readinto(buffer)
+        while n:
+            h.update(view[:n])
+            n = f.readinto(buffer)
     return h.hexdigest()
+
+
+def _stat_key(file: Path) -> typing.List[int]:
+    """
+    key that changes whenever the contents of a file are replaced or
+    modified
+    """
+    stat = file.stat()
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def hash_file_cached(file: Path, memo_dir: typing.Optional[Path] = None):
+    """
+    return the same hash as hash_file, but only read the file if it has
+    changed since it was last hashed. The hash is remembered for the life
+    of the process, and also in a small json file in memo_dir if given, so
+    reopening an unchanged file doesn't need to read it again.
+    :param file: path of file to hash
+    :param memo_dir: optional directory used to persist hashes, typically
+    the project cache directory
+    :return: hash of the file contents
+    """
+    key = _stat_key(file)
+    memo_key = str(file.resolve())
+    memo = _hash_memo.get(memo_key)
+    if memo is not None and memo[0] == key:
+        return memo[1]
+
+    memo_path = None
+    if memo_dir is not None:
+        memo_path = memo_dir / "file_hashes" / f"{file.name}.json"
+        try:
+            with memo_path.open('r') as f:
+                saved = json.load(f)
+            if saved['stat'] == key:
+                _hash_memo[memo_key] = (key, saved['hash'])
+                return saved['hash']
+        except (OSError, ValueError, KeyError, TypeError):
+            # missing or unreadable memo, hash the file below
+            pass
+
+    file_hash = hash_file(file)
+    _hash_memo[memo_key] = (key, file_hash)
+
+    if memo_path is not None:
+        try:
+            memo_path.parent.mkdir(mode=0o775, parents=True, exist_ok=True)
+            tmp_path = memo_path.with_name(
+                f"{memo_path.name}.{os.getpid()}.tmp")
+            with tmp_path.open('w') as f:
+                json.dump({'stat': key, 'hash': file_hash}, f)
+            os.replace(tmp_path, memo_path)
+        except OSError:
+            # not being able to save the memo only means the file will be
+            # hashed again next time
+            pass
+
+    return file_hash
@@ -71,13 +71,11 @@ def label_identity(img, pose_est, identity, frame_index,
     :return: None
     """
 
-    shape = pose_est.get_identity_convex_hulls(identity)[frame_index]
-
-    if shape is not None:
-        center = shape.centroid
+    center = pose_est.get_identity_hull_centroids(identity)[frame_index]
 
+    if not np.isnan(center).any():
         # draw a marker at this location.
-        cv2.circle(img, (int(center.y), int(center.x)), 2, color,
+        cv2.circle(img, (int(center[1]), int(center[0])), 2, color,
                    -1, lineType=cv2.LINE_AA)
 
 
@@ -93,16 +91,14 @@ def label_all_identities(img, pose_est, identities, frame_index, subject=None):
     """
 
     for identity in identities:
-        shape = pose_est.get_identity_convex_hulls(identity)[frame_index]
-        if shape is not None:
-            center = shape.centroid
-
+        center = pose_est.get_identity_hull_centroids(identity)[frame_index]
+        if not np.isnan(center).any():
             if identity == subject:
                 color = _ACTIVE_COLOR
             else:
                 color = _ID_COLOR
             # write the identity at that location
-            cv2.putText(img, str(identity), (int(center.y), int(center.x)),
+            cv2.putText(img, str(identity), (int(center[1]), int(center[0])),
                         cv2.FONT_HERSHEY_PLAIN, 1.25, color, 2,
                         lineType=cv2.LINE_AA)
 
@@ -128,19 +124,19 @@ def draw_track(img: np.ndarray, pose_est: PoseEstimation, identity: int,
     slice_start = max(frame_index-past_points, 0)
 
     if point_index is None:
-        convex_hulls = pose_est.get_identity_convex_hulls(identity)
+        all_centroids = pose_est.get_identity_hull_centroids(identity)
 
         # get points for the 'future' track
-        hulls = convex_hulls[frame_index:frame_index + future_points]
-        centroids = [h.centroid for h in hulls if h is not None]
+        centroids = all_centroids[frame_index:frame_index + future_points]
+        centroids = centroids[~np.isnan(centroids).any(axis=1)]
         # openCV needs points to be ordered y,x
-        future_track_points = [(int(c.y), int(c.x)) for c in centroids]
+        future_track_points = [(int(c[1]), int(c[0])) for c in centroids]
 
         # get points for 'past' track points
-        hulls = convex_hulls[slice_start:frame_index+1]
-        centroids = [x.centroid for x in hulls if x is not None]
+        centroids = all_centroids[slice_start:frame_index+1]
+        centroids = centroids[~np.isnan(centroids).any(axis=1)]
         # openCV needs points to be ordered y,x
-        past_track_points = [(int(x.y), int(x.x)) for x in centroids]
+        past_track_points = [(int(x[1]), int(x[0])) for x in centroids]
 
     else:
         # get points for 'future' track
@@ -1,11 +1,10 @@
 import argparse
-import itertools
 
 import numpy as np
 from tabulate import tabulate
 
 from classify import train
-from src.classifier import Classifier
+from src.classifier.cross_validation import cross_validate
 from src.project import ProjectDistanceUnit
 from src.project.export_training import load_training_data
 
@@ -24,6 +23,14 @@ def main():
         type=int,
     )
 
+    parser.add_argument(
+        '-p', '--processes',
+        help='number of cores to use for cross validation, divided between '
+             'training folds concurrently and training each fold. Default '
+             'is to use all available cores.',
+        type=int,
+    )
+
     parser.add_argument(
         'training',
         help='training data HDF5 file',
@@ -34,12 +41,6 @@ def main():
     classifier = train(args.training)
 
     features, group_mapping = load_training_data(args.training)
-    data_generator = Classifier.leave_one_group_out(
-        features['per_frame'],
-        features['window'],
-        features['labels'],
-        features['groups'],
-    )
 
     table_rows = []
     accuracies = []
@@ -47,42 +48,33 @@ def main():
     fbeta_notbehavior = []
 
     iter_count = 0
-    for i, data in enumerate(itertools.islice(data_generator, args.k)):
+    # folds are trained concurrently in worker processes, the results of each
+    # fold are printed as soon as it finishes
+    for result in cross_validate(
+            classifier.classifier_type,
+            features['per_frame'],
+            features['window'],
+            features['labels'],
+            features['groups'],
+            args.k,
+            args.processes):
         iter_count += 1
+        i = result['fold']
+
+        test_info = group_mapping[result['test_group']]
+        accuracy = result['accuracy']
+        pr = result['precision_recall']
+        confusion = result['confusion']
 
-        test_info = group_mapping[data['test_group']]
-
-        # train classifier, and then use it to classify our test data
-        classifier.train(
-            data,
-            features['behavior'],
-            features['window_size'],
-            features['has_social_features'],
-            features['extended_features'],
-            features['distance_unit'])
-        predictions = classifier.predict(data['test_data'])
-
-        # calculate some performance metrics using the classifications of
-        # the test data
-        accuracy = classifier.accuracy_score(
-            data['test_labels'],
-            predictions)
-        pr = classifier.precision_recall_score(
-            data['test_labels'],
-            predictions)
-        confusion = classifier.confusion_matrix(
-            data['test_labels'],
-            predictions)
-
-        table_rows.append([
+        table_rows.append((i, [
             accuracy, pr[0][0], pr[0][1], pr[1][0], pr[1][1], pr[2][0],
             pr[2][1], f"{test_info['video']} [{test_info['identity']}]"
-        ])
+        ]))
         accuracies.append(accuracy)
         fbeta_behavior.append(pr[2][1])
         fbeta_notbehavior.append(pr[2][0])
 
-        # print performance metrics and feature importance to console
+        # print performance metrics to console
         print('-' * 70)
         print(f"training iteration {i}")
         print("TEST DATA:")
@@ -111,6 +103,9 @@ def main():
         #        features['has_social_features']),
         #    10)
 
+    # folds finish in any order, list them in fold order
+    table_rows = [row for _, row in sorted(table_rows, key=lambda r: r[0])]
+
     if iter_count >= 1:
         print('\n' + '=' * 70)
         print("SUMMARY\n")
@@ -0,0 +1,65 @@
+import numpy as np
+
+from src.feature_extraction.base_features import AngularVelocity
+from src.utils.utilities import smooth
+from tests.feature_modules.base import TestFeatureBase
+
+
+def angular_velocity_reference(bearings: np.ndarray, fps: int) -> np.ndarray:
+    """ frame by frame computation of the unsmoothed angular velocity """
+    velocities = np.zeros_like(bearings)
+
+    for i in range(len(bearings) - 1):
+        angle1 = bearings[i] % 360
+        if angle1 < 0:
+            angle1 += 360
+
+        angle2 = bearings[i + 1] % 360
+        if angle2 < 0:
+            angle2 += 360
+
+        diff1 = angle2 - angle1
+        diff2 = (360 + angle2) - angle1
+        diff3 = angle2 - (360 + angle1)
+
+        if abs(diff1) <= abs(diff2) and abs(diff1) <= abs(diff3):
+            velocities[i] = diff1
+        elif abs(diff2) <= abs(diff3):
+            velocities[i] = diff2
+        else:
+            velocities[i] = diff3
+    return velocities * fps
+
+
+class TestAngularVelocity(TestFeatureBase):
+
+    def test_matches_reference(self) -> None:
+        feature = AngularVelocity(self._pose_est_v5,
+                                  self._pose_est_v5.cm_per_pixel)
+        fps = self._pose_est_v5.fps
+
+        for identity in self._pose_est_v5.identities:
+            bearings = self._pose_est_v5.compute_all_bearings(identity)
+            expected = smooth(angular_velocity_reference(bearings, fps),
+                              smoothing_window=feature._SMOOTHING_WINDOW)
+            np.testing.assert_array_equal(feature.per_frame(identity),
+                                          expected)
+
+    def test_wrap_around(self) -> None:
+        """ bearings that cross +/-180 or 0 take the shortest direction """
+        bearings = np.array([170, -170, -10, 10, 90, -90, 0, 180],
+                            dtype=np.float32)
+        expected = angular_velocity_reference(bearings, 1)
+        np.testing.assert_array_equal(expected[:4], [20, 160, 20, 80])
+
+        # swap in the synthetic bearings for a single identity
+        class Poses:
+            fps = 1
+
+            @staticmethod
+            def compute_all_bearings(identity):
+                return bearings
+
+        feature = AngularVelocity(Poses(), 1.0)
+        feature._SMOOTHING_WINDOW = 1
+        np.testing.assert_array_equal(feature.per_frame(0), expected)
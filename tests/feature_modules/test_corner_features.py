@@ -1,8 +1,42 @@
 
+import numpy as np
+from shapely.geometry import Point
+
 import src.feature_extraction.landmark_features.corner as corner_module
+from src.pose_estimation import PoseEstimation
 from tests.feature_modules.base import TestFeatureBase
 
 
+def corner_distances_reference(poses, identity, pixel_scale, corners):
+    """ compute the corner distances and bearings one frame at a time """
+    distances = np.zeros(poses.num_frames, dtype=np.float32)
+    bearings = np.zeros(poses.num_frames, dtype=np.float32)
+    convex_hulls = poses.get_identity_convex_hulls(identity)
+    idx = PoseEstimation.KeypointIndex
+
+    for frame in range(poses.num_frames):
+        points, _ = poses.get_points(frame, identity)
+        if points is None or convex_hulls[frame] is None:
+            continue
+
+        distance = float('inf')
+        corner_coordinates = (0, 0)
+        for corner in corners:
+            d = convex_hulls[frame].distance(Point(corner[0], corner[1]))
+            if d < distance:
+                distance = d
+                corner_coordinates = (corner[0], corner[1])
+
+        bearing = corner_module.CornerDistanceInfo.compute_angle(
+            points[idx.NOSE, :], points[idx.BASE_NECK, :], corner_coordinates)
+        if bearing > 180:
+            bearing -= 360
+
+        distances[frame] = distance * pixel_scale
+        bearings[frame] = bearing
+    return distances, bearings
+
+
 class TestCornerFeatures(TestFeatureBase):
 
     def test_compute_corner_distances(self):
@@ -44,3 +78,29 @@ class TestCornerFeatures(TestFeatureBase):
         for i in range(self._pose_est_v5.num_identities):
             values = dist_to_corner.per_frame(i)
             self.assertTrue((values >= 0).all())
+
+    def test_matches_reference(self):
+        """
+        the vectorized corner distances and bearings match the values
+        computed one frame at a time with shapely, including arenas with
+        a different number of corners
+        """
+        pixel_scale = self._pose_est_v5.cm_per_pixel
+        corners = self._pose_est_v5.static_objects['corners']
+
+        try:
+            for arena_corners in [corners, corners[:3],
+                                  np.vstack([corners, [[400, 60]]])]:
+                self._pose_est_v5.static_objects['corners'] = arena_corners
+                info = corner_module.CornerDistanceInfo(self._pose_est_v5,
+                                                        pixel_scale)
+                for i in self._pose_est_v5.identities:
+                    distances, bearings = info.get_distances(i)
+                    expected_distances, expected_bearings = \
+                        corner_distances_reference(self._pose_est_v5, i,
+                                                   pixel_scale, arena_corners)
+                    np.testing.assert_array_equal(distances,
+                                                  expected_distances)
+                    np.testing.assert_array_equal(bearings, expected_bearings)
+        finally:
+            self._pose_est_v5.static_objects['corners'] = corners
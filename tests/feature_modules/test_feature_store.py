@@ -0,0 +1,185 @@
+import numpy as np
+
+from src.classifier import Classifier
+from src.feature_extraction import FeatureStore, IdentityFeatures
+from src.pose_estimation import PoseHashException
+from tests.feature_modules.base import TestFeatureBase
+
+
+class TestFeatureStore(TestFeatureBase):
+
+    _window_size = 5
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls._scale = float(cls._pose_est_v5.cm_per_pixel)
+        cls._feature_dir = cls._tmpdir_path / 'features'
+        cls._features = IdentityFeatures(
+            'sample_pose_est_v5.h5', 0, cls._feature_dir, cls._pose_est_v5,
+            distance_scale_factor=cls._scale)
+        cls._store = FeatureStore.for_video(cls._feature_dir,
+                                            'sample_pose_est_v5.h5')
+        cls._features.save_to_store(cls._store, cls._window_size)
+
+    def read(self, rows=None):
+        return self._store.read(0, self._window_size, self._pose_est_v5.hash,
+                                self._scale, rows)
+
+    def test_matches_identity_features(self) -> None:
+        per_frame, window = self.read()
+
+        expected = Classifier.combine_data(
+            self._features.get_per_frame(True),
+            self._features.get_window_features(self._window_size, True))
+        data = Classifier.combine_data(per_frame, window)
+        self.assertEqual(data.dtype, np.float32)
+        np.testing.assert_array_equal(data, expected.astype(np.float32))
+
+    def test_column_names(self) -> None:
+        """
+        the column names match get_feature_column_names() and the columns
+        of the combined data
+        """
+        column_names = self._features.get_feature_column_names(True)
+        self.assertEqual(self._store.column_names(0, self._window_size),
+                         column_names)
+
+        per_frame, window = self.read()
+        self.assertEqual(Classifier.combine_data(per_frame, window).shape[1],
+                         len(column_names))
+
+        # the columns of a subset of the features are still in order
+        features = {'point_mask', 'angles', 'pairwise_distances'}
+        subset = Classifier.combine_data(
+            {f: v for f, v in per_frame.items() if f in features},
+            {f: v for f, v in window.items() if f in features})
+        names = self._store.column_names(0, self._window_size, features)
+        self.assertEqual(len(names), subset.shape[1])
+        self.assertEqual(names, [n for n in column_names if n in set(names)])
+
+    def test_read_rows(self) -> None:
+        rows = np.zeros(self._pose_est_v5.num_frames, dtype=bool)
+        rows[[3, 10, 11, 250]] = True
+        per_frame, window = self.read(rows)
+        all_per_frame, all_window = self.read()
+
+        for feature, values in all_per_frame.items():
+            np.testing.assert_array_equal(per_frame[feature], values[rows])
+        for feature, ops in all_window.items():
+            for op, values in ops.items():
+                np.testing.assert_array_equal(window[feature][op],
+                                              values[rows])
+
+        per_frame, _ = self.read(np.zeros_like(rows))
+        self.assertEqual(per_frame['angles'].shape[0], 0)
+
+    def test_stale_features(self) -> None:
+        with self.assertRaises(PoseHashException):
+            self._store.read(0, self._window_size, 'not the pose hash',
+                             self._scale)
+        with self.assertRaises(KeyError):
+            self._store.read(0, self._window_size + 1,
+                             self._pose_est_v5.hash, self._scale)
+
+    def test_compression(self) -> None:
+        store = FeatureStore(self._tmpdir_path / 'compressed.h5',
+                             compression='lzf')
+        self._features.save_to_store(store, self._window_size)
+        per_frame, window = store.read(0, self._window_size,
+                                       self._pose_est_v5.hash, self._scale)
+        expected_per_frame, expected_window = self.read()
+        np.testing.assert_array_equal(
+            Classifier.combine_data(per_frame, window),
+            Classifier.combine_data(expected_per_frame, expected_window))
+
+    def test_read_label_blocks(self) -> None:
+        """
+        reading label blocks returns the labeled frames, and the rows read
+        are kept for reading the labeled frames again
+        """
+        store = FeatureStore.for_video(self._feature_dir,
+                                       'sample_pose_est_v5.h5')
+        key = (0, self._window_size)
+
+        blocks = [{'start': 20, 'end': 29, 'present': True},
+                  {'start': 400, 'end': 402, 'present': False}]
+        rows = np.zeros(self._pose_est_v5.num_frames, dtype=bool)
+        rows[20:30] = True
+        rows[400:403] = True
+
+        per_frame, window = store.read(
+            0, self._window_size, self._pose_est_v5.hash, self._scale,
+            label_blocks=blocks)
+        all_per_frame, all_window = self.read()
+        np.testing.assert_array_equal(
+            Classifier.combine_data(per_frame, window),
+            Classifier.combine_data(all_per_frame, all_window)[rows])
+        np.testing.assert_array_equal(store._row_cache[key][1],
+                                      np.flatnonzero(rows))
+
+        # add a label block, the rows of the new frames are added to the rows
+        # that were already read
+        blocks.insert(1, {'start': 100, 'end': 104, 'present': False})
+        rows[100:105] = True
+        per_frame, window = store.read(
+            0, self._window_size, self._pose_est_v5.hash, self._scale,
+            label_blocks=blocks)
+        np.testing.assert_array_equal(
+            Classifier.combine_data(per_frame, window),
+            Classifier.combine_data(all_per_frame, all_window)[rows])
+        np.testing.assert_array_equal(store._row_cache[key][1],
+                                      np.flatnonzero(rows))
+
+    def test_row_cache_invalidated_by_write(self) -> None:
+        store = FeatureStore(self._tmpdir_path / 'rewritten.h5')
+        self._features.save_to_store(store, self._window_size)
+        blocks = [{'start': 0, 'end': 9, 'present': True}]
+        args = (0, self._window_size, self._pose_est_v5.hash, self._scale)
+        per_frame, _ = store.read(*args, label_blocks=blocks)
+
+        # replace the stored features with different values
+        modified = {k: v + 1 for k, v in self._features.get_per_frame(
+            True).items()}
+        store.write(0, self._window_size, modified, {},
+                    {k: [str(i) for i in range(1 if v.ndim == 1
+                                               else v.shape[1])]
+                     for k, v in modified.items()},
+                    *args[2:])
+        new_per_frame, _ = store.read(*args, label_blocks=blocks)
+        np.testing.assert_array_equal(new_per_frame['angles'],
+                                      per_frame['angles'] + 1)
+
+    def test_row_cache_bytes(self) -> None:
+        """ rows are not kept beyond the store's row cache size limit """
+        blocks = [{'start': 0, 'end': 9, 'present': True}]
+        args = (0, self._window_size, self._pose_est_v5.hash, self._scale)
+
+        store = FeatureStore(self._store.path, row_cache_bytes=0)
+        per_frame, _ = store.read(*args, label_blocks=blocks)
+        self.assertEqual(len(store._row_cache), 0)
+
+        # each store has its own rows
+        other = FeatureStore(self._store.path)
+        other.read(*args, label_blocks=blocks)
+        self.assertEqual(len(other._row_cache), 1)
+        self.assertEqual(len(store._row_cache), 0)
+        np.testing.assert_array_equal(
+            store.read(*args, label_blocks=blocks)[0]['angles'],
+            per_frame['angles'])
+
+    def test_corrupt_store(self) -> None:
+        """ a store that can't be opened is started again when writing """
+        store = FeatureStore(self._tmpdir_path / 'corrupt.h5')
+        store.path.write_bytes(b'not an h5 file')
+        args = (0, self._window_size, self._pose_est_v5.hash, self._scale)
+        with self.assertRaises(OSError):
+            store.check(*args)
+
+        self._features.save_to_store(store, self._window_size)
+        store.check(*args)
+        per_frame, window = store.read(*args)
+        expected_per_frame, expected_window = self.read()
+        np.testing.assert_array_equal(
+            Classifier.combine_data(per_frame, window),
+            Classifier.combine_data(expected_per_frame, expected_window))
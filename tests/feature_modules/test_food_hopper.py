@@ -58,6 +58,25 @@ class TestCornerFeatures(TestFeatureBase):
                     hopper_pts, (pts[i, 0], pts[i, 1]), True)
                 self.assertAlmostEqual(signed_dist, values[i, key_point])
 
+    def test_matches_point_polygon_test(self) -> None:
+        """ vectorized distances are identical to cv2.pointPolygonTest """
+        hopper = self._pose_est_v5.static_objects['food_hopper']
+        hopper = hopper * self._pose_est_v5.cm_per_pixel
+        hopper_pts = hopper[:, [1, 0]].astype(np.float32)
+
+        for identity in self._pose_est_v5.identities:
+            values = self.food_hopper_feature.per_frame(identity)
+            points, _ = self._pose_est_v5.get_identity_poses(
+                identity, self._pose_est_v5.cm_per_pixel)
+
+            for key_point in PoseEstimation.KeypointIndex:
+                if key_point in _EXCLUDED_POINTS:
+                    continue
+                pts = points[:, key_point.value, [1, 0]]
+                expected = [cv2.pointPolygonTest(hopper_pts, (p[0], p[1]), True)
+                            for p in pts]
+                np.testing.assert_array_equal(values[:, key_point], expected)
+
     def test_frame_out_of_range(self) -> None:
         with self.assertRaises(IndexError):
             _ = self.food_hopper_feature.per_frame(0)[100000]
@@ -0,0 +1,169 @@
+from unittest import mock
+
+import numpy as np
+
+from src.feature_extraction import FeatureStore
+from src.feature_extraction.features import IdentityFeatures
+from tests.feature_modules.base import TestFeatureBase
+
+
+class TestChunkedFeatures(TestFeatureBase):
+
+    _window_sizes = [2, 5]
+    _chunk_size = 317
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls._scale = cls._pose_est_v5.cm_per_pixel
+        cls._features = IdentityFeatures(
+            None, 0, None, cls._pose_est_v5,
+            distance_scale_factor=cls._scale)
+
+    def assert_window_features_match(self, actual, expected):
+        self.assertEqual(actual.keys(), expected.keys())
+        for feature in expected:
+            self.assertEqual(actual[feature].keys(), expected[feature].keys())
+            for op in expected[feature]:
+                # mean and std_dev are computed from cumulative sums, so
+                # they can differ slightly when computed in chunks
+                np.testing.assert_allclose(
+                    actual[feature][op], expected[feature][op],
+                    rtol=1e-5, atol=1e-4, err_msg=f"{feature} {op}")
+
+    def test_iter_features_matches_get_features(self) -> None:
+        window_size = self._window_sizes[1]
+        expected = self._features.get_features(window_size, True)
+        chunks = list(self._features.iter_features(
+            window_size, True, chunk_size=self._chunk_size))
+
+        self.assertEqual(len(chunks), -(-self._pose_est_v5.num_frames //
+                                        self._chunk_size))
+        np.testing.assert_array_equal(
+            np.concatenate([c['frame_indexes'] for c in chunks]),
+            expected['frame_indexes'])
+
+        for feature, values in expected['per_frame'].items():
+            np.testing.assert_array_equal(
+                np.concatenate([c['per_frame'][feature] for c in chunks]),
+                values)
+
+        self.assert_window_features_match(
+            {
+                feature: {
+                    op: np.concatenate([c['window'][feature][op]
+                                        for c in chunks])
+                    for op in ops
+                }
+                for feature, ops in expected['window'].items()
+            },
+            expected['window'])
+
+    def test_cache_window_features(self) -> None:
+        """
+        window features saved in chunks load the same as window features
+        computed for the whole video at once
+        """
+        feature_dir = self._tmpdir_path / 'features'
+        features = IdentityFeatures(
+            'sample_pose_est_v5.h5', 0, feature_dir, self._pose_est_v5,
+            distance_scale_factor=self._scale)
+        features.cache_window_features(self._window_sizes,
+                                       chunk_size=self._chunk_size)
+
+        identity_dir = feature_dir / 'sample_pose_est_v5' / '0'
+        for window_size in self._window_sizes:
+            self.assertTrue(
+                (identity_dir / f"window_features_{window_size}.h5").exists())
+        self.assertEqual(list(identity_dir.glob('*.tmp')), [])
+
+        expected = self._features.get_multi_window_features(
+            self._window_sizes, True)
+        actual = features.get_multi_window_features(self._window_sizes, True)
+        for window_size in self._window_sizes:
+            self.assert_window_features_match(actual[window_size],
+                                              expected[window_size])
+
+        # chunks read back from the saved window features match as well
+        chunks = list(features.iter_features(self._window_sizes[0], True,
+                                             chunk_size=self._chunk_size))
+        expected = self._features.get_features(self._window_sizes[0], True)
+        for feature, ops in expected['window'].items():
+            for op, values in ops.items():
+                np.testing.assert_array_equal(
+                    np.concatenate([c['window'][feature][op]
+                                    for c in chunks]),
+                    actual[self._window_sizes[0]][feature][op][
+                        expected['frame_indexes']])
+
+    def test_cache_window_features_failure(self) -> None:
+        """ temporary files are removed if computing the features fails """
+        feature_dir = self._tmpdir_path / 'failed_features'
+        features = IdentityFeatures(
+            'sample_pose_est_v5.h5', 0, feature_dir, self._pose_est_v5,
+            distance_scale_factor=self._scale)
+
+        with mock.patch.object(IdentityFeatures,
+                               '_IdentityFeatures__iter_window_chunks',
+                               side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                features.cache_window_features(self._window_sizes,
+                                               chunk_size=self._chunk_size)
+
+        identity_dir = feature_dir / 'sample_pose_est_v5' / '0'
+        self.assertEqual(list(identity_dir.glob('window_features_*')), [])
+
+
+class TestFeatureMatrix(TestFeatureBase):
+
+    _window_size = 5
+    _chunk_size = 317
+
+    def iter_feature_matrix(self, features, use_social, store=None):
+        chunks = list(features.iter_feature_matrix(
+            self._window_size, use_social, store, self._chunk_size))
+        return (np.concatenate([c['data'] for c in chunks]),
+                np.concatenate([c['frame_indexes'] for c in chunks]))
+
+    def test_feature_matrix(self) -> None:
+        """ the chunks read from the feature store match get_features() """
+        scale = self._pose_est_v5.cm_per_pixel
+        feature_dir = self._tmpdir_path / 'features'
+        features = IdentityFeatures(
+            'sample_pose_est_v5.h5', 0, feature_dir, self._pose_est_v5,
+            distance_scale_factor=scale)
+        store = FeatureStore.for_video(feature_dir, 'sample_pose_est_v5.h5')
+
+        for use_social in [True, False]:
+            expected = features.get_features(self._window_size, use_social)
+            expected_data = IdentityFeatures.combine_features(
+                expected['per_frame'], expected['window'])
+
+            data, frame_indexes = self.iter_feature_matrix(
+                features, use_social, store)
+            self.assertEqual(data.dtype, np.float32)
+            np.testing.assert_array_equal(data,
+                                          expected_data.astype(np.float32))
+            np.testing.assert_array_equal(frame_indexes,
+                                          expected['frame_indexes'])
+            self.assertEqual(
+                data.shape[1],
+                len(features.get_feature_column_names(use_social)))
+
+        # the features were written to the store for the identity
+        store.check(0, self._window_size, self._pose_est_v5.hash,
+                    float(scale))
+
+    def test_feature_matrix_without_store(self) -> None:
+        features = IdentityFeatures(
+            None, 0, None, self._pose_est_v5,
+            distance_scale_factor=self._pose_est_v5.cm_per_pixel)
+        expected = features.get_features(self._window_size, True)
+        data, frame_indexes = self.iter_feature_matrix(features, True)
+        # the window features are computed in chunks, see TestChunkedFeatures
+        np.testing.assert_allclose(
+            data, IdentityFeatures.combine_features(
+                expected['per_frame'], expected['window']),
+            rtol=1e-5, atol=1e-4)
+        np.testing.assert_array_equal(frame_indexes,
+                                      expected['frame_indexes'])
@@ -0,0 +1,89 @@
+import numpy as np
+
+from src.feature_extraction.base_features import PairwisePointDistances
+from src.feature_extraction.social_features.social_distance import \
+    ClosestIdentityInfo
+from src.pose_estimation import PoseEstimation
+from src.utils import geometry
+from src.utils.geometry import point_pair_distances
+from tests.feature_modules.base import TestFeatureBase
+
+
+class TestPairwisePointDistances(TestFeatureBase):
+
+    def test_matches_reference(self) -> None:
+        """ compare to computing each pair of points one at a time """
+        pixel_scale = self._pose_est_v5.cm_per_pixel
+        feature = PairwisePointDistances(self._pose_est_v5, pixel_scale)
+        npoints = len(PoseEstimation.KeypointIndex)
+
+        for identity in self._pose_est_v5.identities:
+            points, _ = self._pose_est_v5.get_identity_poses(identity,
+                                                             pixel_scale)
+            expected = []
+            for i in range(npoints):
+                for j in range(i + 1, npoints):
+                    expected.append(np.sqrt(
+                        np.square(points[:, i, 0] - points[:, j, 0]) +
+                        np.square(points[:, i, 1] - points[:, j, 1])))
+            expected = np.stack(expected, axis=1).astype(np.float32)
+
+            values = feature.per_frame(identity)
+            self.assertEqual(values.dtype, np.float32)
+            self.assertEqual(values.shape[1], len(feature._feature_names))
+            np.testing.assert_array_equal(values, expected)
+
+    def test_chunks(self) -> None:
+        """ the result does not depend on how the frames are chunked """
+        rng = np.random.default_rng(0)
+        points = rng.integers(0, 800, (1000, 12, 2)).astype(np.uint16)
+        i, j = np.triu_indices(12, k=1)
+
+        expected = point_pair_distances(points, points, i, j)
+        chunk_size = geometry._CHUNK_SIZE
+        try:
+            geometry._CHUNK_SIZE = 7
+            np.testing.assert_array_equal(
+                point_pair_distances(points, points, i, j), expected)
+        finally:
+            geometry._CHUNK_SIZE = chunk_size
+
+        # unsigned coordinates must not wrap around when subtracted
+        np.testing.assert_array_equal(
+            expected, np.hypot(*np.moveaxis(
+                points[:, i].astype(np.float64) -
+                points[:, j].astype(np.float64), -1, 0)).astype(np.float32))
+
+    def test_social_pairwise_distances(self) -> None:
+        """
+        social pairwise distances match the distances between every point of
+        the identity and every point of the closest identity
+        """
+        poses = self._pose_est_v5
+        pixel_scale = poses.cm_per_pixel
+        social_points = [PoseEstimation.KeypointIndex.NOSE,
+                         PoseEstimation.KeypointIndex.BASE_NECK,
+                         PoseEstimation.KeypointIndex.BASE_TAIL]
+        indexes = [p.value for p in social_points]
+
+        for identity in poses.identities:
+            info = ClosestIdentityInfo(poses, identity, pixel_scale)
+            closest = info.closest_identities
+            values = info.compute_pairwise_social_distances(social_points,
+                                                            closest)
+            points, _ = poses.get_identity_poses(identity, pixel_scale)
+            mask = poses.identity_mask(identity)
+
+            for frame in range(0, poses.num_frames, 25):
+                if mask[frame] == 0 or closest[frame] == -1:
+                    self.assertTrue((values[frame] == 0).all())
+                    continue
+                other, _ = poses.get_identity_poses(closest[frame],
+                                                    pixel_scale)
+                expected = [
+                    np.hypot(*(points[frame, a].astype(np.float64) -
+                               other[frame, b]))
+                    for a in indexes for b in indexes
+                ]
+                np.testing.assert_array_equal(
+                    values[frame], np.asarray(expected, dtype=np.float32))
@@ -0,0 +1,53 @@
+import numpy as np
+
+from src.feature_extraction.base_features import BaseFeatureGroup
+from src.feature_extraction.base_features.point_velocities import (
+    PointVelocityDir, PointVelocityMag)
+from src.utils.utilities import smooth
+from tests.feature_modules.base import TestFeatureBase
+
+
+def point_velocity_reference(poses, identity, pixel_scale, point_index,
+                             direction):
+    """ compute a point velocity feature one keypoint at a time """
+    points, mask = poses.get_identity_poses(identity, pixel_scale)
+    bearings = poses.compute_all_bearings(identity)
+    indexes = np.arange(poses.num_frames)[mask[:, point_index] == 1]
+    points = points[indexes, point_index]
+    values = np.zeros(poses.num_frames, dtype=np.float32)
+
+    if indexes.shape[0] > 1:
+        v = np.gradient(points, indexes, axis=0)
+        if direction:
+            values[indexes] = (((np.degrees(np.arctan2(v[:, 1], v[:, 0])) -
+                                 bearings[indexes]) + 360) % 360) - 180
+        else:
+            values[indexes] = np.sqrt(
+                np.square(v[:, 0]) + np.square(v[:, 1])) * poses.fps
+        values = smooth(values, smoothing_window=5)
+    return values
+
+
+class TestPointVelocities(TestFeatureBase):
+
+    def test_matches_reference(self) -> None:
+        """
+        the velocity features computed together by the feature group match
+        the features computed one keypoint at a time, for both float32 and
+        float64 scale factors
+        """
+        for pixel_scale in [self._pose_est_v5.cm_per_pixel,
+                            float(self._pose_est_v5.cm_per_pixel)]:
+            group = BaseFeatureGroup(self._pose_est_v5, pixel_scale)
+            for identity in self._pose_est_v5.identities:
+                values = group.per_frame(identity)
+                for name, feature in group._features.items():
+                    if not issubclass(feature,
+                                      (PointVelocityDir, PointVelocityMag)):
+                        continue
+                    expected = point_velocity_reference(
+                        self._pose_est_v5, identity, pixel_scale,
+                        feature._point_index,
+                        issubclass(feature, PointVelocityDir))
+                    np.testing.assert_array_equal(values[name], expected,
+                                                  err_msg=name)
@@ -0,0 +1,33 @@
+import collections
+
+import src.pose_estimation
+from src.feature_extraction.features import IdentityFeatures
+from tests.feature_modules.base import TestFeatureBase
+
+
+class TestSharedQuantities(TestFeatureBase):
+
+    def test_computed_once_per_identity(self) -> None:
+        """
+        quantities derived from the pose data are computed once per identity
+        and shared by all feature modules
+        """
+        poses = src.pose_estimation.open_pose_file(
+            self._tmpdir_path / 'sample_pose_est_v5.h5')
+        poses.static_objects.update(self._pose_est_v5.static_objects)
+
+        IdentityFeatures(None, 0, None, poses, force=True,
+                         distance_scale_factor=poses.cm_per_pixel)
+
+        # every cached quantity was computed exactly once
+        counts = poses.compute_counts
+        self.assertEqual(
+            counts, collections.Counter(key[0] for key in poses._derived_cache))
+        self.assertEqual(counts['bearings'], 1)
+        # the social features also need the hulls of the other identities
+        self.assertEqual(counts['convex_hulls'], poses.num_identities)
+
+        bearings = poses.compute_all_bearings(0)
+        self.assertIs(poses.compute_all_bearings(0), bearings)
+        self.assertFalse(bearings.flags.writeable)
+        self.assertEqual(poses.compute_counts['bearings'], 1)
@@ -0,0 +1,95 @@
+import numpy as np
+
+from src.feature_extraction.social_features.social_distance import \
+    ClosestIdentityInfo, IdentityDistanceMatrix
+from src.pose_estimation import PoseEstimation
+from tests.feature_modules.base import TestFeatureBase
+
+
+class TestClosestIdentityInfo(TestFeatureBase):
+
+    def _reference(self, identity, pixel_scale):
+        """
+        compute closest identities and fov angles frame by frame using the
+        shapely convex hulls
+        """
+        idx = PoseEstimation.KeypointIndex
+        poses = self._pose_est_v5
+        closest = np.full(poses.num_frames, -1, dtype=np.int16)
+        closest_fov = np.full(poses.num_frames, -1, dtype=np.int16)
+        fov_angles = np.zeros(poses.num_frames, dtype=np.float32)
+        distances = np.zeros(poses.num_frames, dtype=np.float32)
+
+        hulls = {i: poses.get_identity_convex_hulls(i)
+                 for i in poses.identities}
+        for frame in range(poses.num_frames):
+            points, mask = poses.get_points(frame, identity, pixel_scale)
+            self_shape = hulls[identity][frame]
+            if (points is None or self_shape is None or not mask[idx.NOSE]
+                    or not mask[idx.BASE_NECK]):
+                continue
+
+            closest_dist = None
+            closest_fov_dist = None
+            for other in poses.identities:
+                other_shape = hulls[other][frame]
+                if other == identity or other_shape is None:
+                    continue
+                dist = self_shape.distance(other_shape)
+                if closest_dist is None or dist < closest_dist:
+                    closest[frame] = other
+                    distances[frame] = dist
+                    closest_dist = dist
+                angle = ClosestIdentityInfo.compute_angle(
+                    points[idx.NOSE], points[idx.BASE_NECK],
+                    np.array(other_shape.centroid))
+                if angle > 180:
+                    angle -= 360
+                if abs(angle) <= ClosestIdentityInfo._half_fov_deg and (
+                        closest_fov_dist is None or dist < closest_fov_dist):
+                    closest_fov[frame] = other
+                    fov_angles[frame] = angle
+                    closest_fov_dist = dist
+
+        return closest, closest_fov, fov_angles, distances
+
+    def test_matches_shapely(self) -> None:
+        pixel_scale = self._pose_est_v5.cm_per_pixel
+        for identity in self._pose_est_v5.identities:
+            info = ClosestIdentityInfo(self._pose_est_v5, identity,
+                                       pixel_scale)
+            closest, closest_fov, fov_angles, distances = self._reference(
+                identity, pixel_scale)
+
+            np.testing.assert_array_equal(info.closest_identities, closest)
+            np.testing.assert_array_equal(info.closest_fov_identities,
+                                          closest_fov)
+            np.testing.assert_array_equal(info.closest_fov_angles,
+                                          fov_angles)
+            np.testing.assert_array_equal(
+                info.compute_distances(info.closest_identities), distances)
+
+    def test_shared_distance_matrix(self) -> None:
+        poses = self._pose_est_v5
+        matrix = IdentityDistanceMatrix.for_poses(poses)
+        self.assertIs(IdentityDistanceMatrix.for_poses(poses), matrix)
+
+        hulls = {i: poses.get_identity_convex_hulls(i)
+                 for i in poses.identities}
+        for a in poses.identities:
+            for b in poses.identities:
+                if a == b:
+                    self.assertTrue(
+                        np.isposinf(matrix.distances(a, [b])).all())
+                    continue
+                np.testing.assert_array_equal(
+                    matrix.distances(a, [b])[0], matrix.distances(b, [a])[0])
+                for frame in range(0, poses.num_frames, 50):
+                    if hulls[a][frame] is None or hulls[b][frame] is None:
+                        self.assertEqual(matrix.distances(a, [b])[0, frame],
+                                         np.inf)
+                    else:
+                        self.assertEqual(
+                            matrix.distances(a, [b])[0, frame],
+                            hulls[a][frame].distance(hulls[b][frame]))
+
@@ -0,0 +1,271 @@
+import numpy as np
+
+from src.feature_extraction.base_features import (Angles,
+                                                  PairwisePointDistances)
+from src.feature_extraction.window_statistics import (
+    CircularWindowStatistics, WindowStatistics)
+from tests.feature_modules.base import TestFeatureBase
+
+
+class TestWindowStatistics(TestFeatureBase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+
+        pixel_scale = cls._pose_est_v5.cm_per_pixel
+        cls._feature = PairwisePointDistances(cls._pose_est_v5, pixel_scale)
+        cls._per_frame = cls._feature.per_frame(0)
+
+        # use a frame mask with gaps, including a gap longer than any of the
+        # windows tested so some windows do not have any valid frames
+        rng = np.random.default_rng(0)
+        cls._frame_mask = (rng.random(cls._pose_est_v5.num_frames) > 0.2)\
+            .astype(np.uint8)
+        cls._frame_mask[100:130] = 0
+
+    def assert_matches_masked_array(self, values, frame_mask, window_size):
+        """
+        compare WindowStatistics to the numpy masked array implementation in
+        Feature._compute_window_feature
+        """
+        window_stats = WindowStatistics(values, frame_mask)
+
+        # masked arrays do not produce meaningful values for windows that are
+        # completely masked, so only compare windows with valid frames
+        has_values = window_stats.count(window_size) > 0
+
+        for op, func in self._feature._window_operations.items():
+            expected = self._feature._compute_window_feature(
+                values, frame_mask, window_size, func)
+            actual = window_stats.compute(op, window_size)
+
+            self.assertEqual(actual.shape, expected.shape)
+            self.assertEqual(actual.dtype, expected.dtype)
+            np.testing.assert_allclose(actual[has_values],
+                                       expected[has_values],
+                                       rtol=1e-5, atol=1e-4, err_msg=op)
+            self.assertTrue((actual[~has_values] == 0).all())
+
+    def test_parity_2d(self) -> None:
+        for window_size in [1, 2, 5, 20]:
+            self.assert_matches_masked_array(
+                self._per_frame, self._frame_mask, window_size)
+
+    def test_parity_1d(self) -> None:
+        for window_size in [1, 5]:
+            self.assert_matches_masked_array(
+                self._per_frame[:, 0], self._frame_mask, window_size)
+
+    def test_window_matches_reference(self) -> None:
+        """ Feature.window() returns the same dict as the reference """
+        window_size = 5
+        frame_mask = self._pose_est_v5.identity_mask(0)
+        values = self._feature.window(0, window_size, self._per_frame)
+
+        self.assertEqual(set(values.keys()),
+                         set(self._feature._window_operations.keys()))
+        for op, func in self._feature._window_operations.items():
+            expected = self._feature._compute_window_feature(
+                self._per_frame, frame_mask, window_size, func)
+            has_values = WindowStatistics(
+                self._per_frame, frame_mask).count(window_size) > 0
+            np.testing.assert_allclose(values[op][has_values],
+                                       expected[has_values],
+                                       rtol=1e-5, atol=1e-4, err_msg=op)
+
+    def test_constant_values_have_zero_std_dev(self) -> None:
+        values = np.full(self._pose_est_v5.num_frames, 1234.5678,
+                         dtype=np.float32)
+        std_dev = WindowStatistics(values, self._frame_mask).compute(
+            'std_dev', 5)
+        self.assertTrue((std_dev < 1e-4).all())
+
+    def test_nan_only_affects_windows_containing_it(self) -> None:
+        """ a NaN in a valid frame only makes the windows around it NaN """
+        values = np.arange(100, dtype=np.float32)
+        values[10] = np.nan
+        frame_mask = np.ones(100, dtype=np.uint8)
+        window_stats = WindowStatistics(values, frame_mask)
+
+        expected = np.zeros(100, dtype=bool)
+        expected[8:13] = True
+        for op in ['mean', 'std_dev']:
+            result = window_stats.compute(op, 2)
+            np.testing.assert_array_equal(np.isnan(result), expected,
+                                          err_msg=op)
+        np.testing.assert_allclose(window_stats.compute('mean', 2)[20:98],
+                                   values[20:98], rtol=1e-6)
+
+        # a NaN in a frame that isn't valid is ignored
+        frame_mask[10] = 0
+        result = WindowStatistics(values, frame_mask).compute('mean', 2)
+        self.assertFalse(np.isnan(result).any())
+
+
+class TestCircularWindowStatistics(TestFeatureBase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+
+        pixel_scale = cls._pose_est_v5.cm_per_pixel
+        cls._feature = Angles(cls._pose_est_v5, pixel_scale)
+        cls._frame_mask = cls._pose_est_v5.identity_mask(0)
+        cls._per_frame = cls._feature.per_frame(0)
+
+    def well_defined(self, per_frame, window_size):
+        """
+        the circular mean is not well defined when the angles in the window
+        nearly cancel out, find the windows where it is
+        """
+        frames = np.arange(self._pose_est_v5.num_frames)
+        resultant = np.zeros(per_frame.shape)
+        for i in frames[self._frame_mask == 1]:
+            start = max(0, i - window_size)
+            valid = self._frame_mask[start:i + window_size + 1] == 1
+            with np.errstate(invalid='ignore'):
+                radians = np.deg2rad(
+                    per_frame[start:i + window_size + 1][valid])
+                resultant[i] = np.hypot(np.sin(radians).mean(axis=0),
+                                        np.cos(radians).mean(axis=0))
+        return resultant > 1e-3
+
+    def test_nan_only_affects_windows_containing_it(self) -> None:
+        values = np.full(100, 45, dtype=np.float32)
+        values[10] = np.nan
+        window_stats = CircularWindowStatistics(
+            values, np.ones(100, dtype=np.uint8), -180, 180)
+
+        expected = np.zeros(100, dtype=bool)
+        expected[8:13] = True
+        np.testing.assert_array_equal(
+            np.isnan(window_stats.compute('mean', 2)), expected)
+
+        # like the scipy work around, the std_dev of these windows is 0
+        std_dev = window_stats.compute('std_dev', 2)
+        self.assertFalse(np.isnan(std_dev).any())
+        np.testing.assert_array_equal(std_dev[expected], 0)
+
+    def per_frame_with_nan(self):
+        """
+        per frame angles with nan in some values, including values in
+        invalid frames, and one inf
+        """
+        per_frame = self._per_frame.astype(np.float64)
+        rng = np.random.default_rng(0)
+        frames = rng.choice(len(per_frame), 20, replace=False)
+        per_frame[frames, rng.integers(0, per_frame.shape[1], 20)] = np.nan
+        per_frame[frames[0], 0] = np.inf
+        return per_frame
+
+    def assert_matches_scipy(self, per_frame, window_size, op, actual):
+        """
+        compare window values to the scipy.stats based implementation in
+        Feature._compute_window_features_circular
+        """
+        low, high = self._feature._circular_range
+        expected = self._feature._compute_window_features_circular(
+            per_frame, self._frame_mask, window_size,
+            self._feature._window_operations[op], op == 'std_dev')
+
+        np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected),
+                                      err_msg=op)
+        if op == 'mean':
+            well_defined = self.well_defined(per_frame, window_size)
+            diff = np.abs(actual - expected) % (high - low)
+            diff = np.minimum(diff, (high - low) - diff)
+            self.assertLess(diff[well_defined].max(), 1e-2)
+        else:
+            # windows with a non-finite value are 0 in both
+            np.testing.assert_array_equal(actual[expected == 0] == 0, True)
+            np.testing.assert_allclose(actual, expected,
+                                       rtol=1e-4, atol=1e-2)
+
+    def test_parity_with_nan(self) -> None:
+        """
+        compare to the scipy.stats based implementation when some of the
+        per frame values are not finite
+        """
+        low, high = self._feature._circular_range
+        per_frame = self.per_frame_with_nan()
+        window_stats = CircularWindowStatistics(
+            per_frame, self._frame_mask, low, high)
+
+        window_size = 5
+        for op in CircularWindowStatistics.OPERATIONS:
+            self.assert_matches_scipy(per_frame, window_size, op,
+                                      window_stats.compute(op, window_size))
+
+    def test_window_matches_reference_with_nan(self) -> None:
+        """
+        Feature.window() for a circular feature returns the same dict as the
+        scipy.stats based implementation when some values are not finite
+        """
+        per_frame = self.per_frame_with_nan()
+        window_size = 5
+        values = self._feature.window(0, window_size, per_frame)
+
+        self.assertEqual(set(values.keys()),
+                         set(self._feature._window_operations.keys()))
+        for op in values:
+            self.assert_matches_scipy(per_frame, window_size, op, values[op])
+
+    def test_parity(self) -> None:
+        """
+        compare CircularWindowStatistics to the scipy.stats based
+        implementation in Feature._compute_window_features_circular
+        """
+        low, high = self._feature._circular_range
+        window_stats = CircularWindowStatistics(
+            self._per_frame, self._frame_mask, low, high)
+
+        for window_size in [1, 5]:
+            well_defined = self.well_defined(self._per_frame, window_size)
+
+            for op in CircularWindowStatistics.OPERATIONS:
+                # scipy loses precision for windows of nearly identical
+                # values when given float32 input, so compare to the
+                # reference computed in float64
+                expected = self._feature._compute_window_features_circular(
+                    self._per_frame.astype(np.float64), self._frame_mask,
+                    window_size, self._feature._window_operations[op],
+                    op == 'std_dev')
+                actual = window_stats.compute(op, window_size)
+
+                self.assertEqual(actual.shape, expected.shape)
+                self.assertEqual(actual.dtype, self._per_frame.dtype)
+
+                if op == 'mean':
+                    # compare the angular difference so that values on
+                    # either side of the wrap around point match
+                    diff = np.abs(actual - expected) % (high - low)
+                    diff = np.minimum(diff, (high - low) - diff)
+                    self.assertLess(diff[well_defined].max(), 1e-2)
+                else:
+                    np.testing.assert_allclose(actual[well_defined],
+                                               expected[well_defined],
+                                               rtol=1e-4, atol=1e-2)
+                self.assertTrue((actual[self._frame_mask == 0] == 0).all())
+
+
+class TestMultiWindow(TestFeatureBase):
+
+    def test_window_multi_matches_window(self) -> None:
+        """
+        window_multi returns the same values as separate calls to window for
+        both linear and circular features
+        """
+        pixel_scale = self._pose_est_v5.cm_per_pixel
+        window_sizes = [2, 5, 10]
+        for feature in [PairwisePointDistances(self._pose_est_v5, pixel_scale),
+                        Angles(self._pose_est_v5, pixel_scale)]:
+            per_frame = feature.per_frame(0)
+            multi = feature.window_multi(0, window_sizes, per_frame)
+            self.assertEqual(list(multi.keys()), window_sizes)
+            for window_size in window_sizes:
+                single = feature.window(0, window_size, per_frame)
+                self.assertEqual(multi[window_size].keys(), single.keys())
+                for op in single:
+                    np.testing.assert_array_equal(multi[window_size][op],
+                                                  single[op])
@@ -0,0 +1,173 @@
+import unittest
+
+import numpy as np
+
+from src.classifier import Classifier
+from src.project.track_labels import TrackLabels
+
+
+class TestLeaveOneGroupOut(unittest.TestCase):
+    """ test Classifier.leave_one_group_out """
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        num_rows = 500
+        # groups interleaved in the rows, group 7 does not have enough labels
+        # of both classes to be used as test data
+        self._groups = rng.choice([3, 5, 7, 11], num_rows)
+        self._labels = rng.choice(
+            [TrackLabels.Label.NOT_BEHAVIOR, TrackLabels.Label.BEHAVIOR],
+            num_rows)
+        self._labels[self._groups == 7] = TrackLabels.Label.NOT_BEHAVIOR
+        self._per_frame = {'a': rng.uniform(size=(num_rows, 2))}
+        self._window = {'b': {'mean': rng.uniform(size=num_rows)}}
+        self._x = Classifier.combine_data(self._per_frame, self._window)
+
+    def test_splits(self) -> None:
+        splits = list(Classifier.leave_one_group_out(
+            self._per_frame, self._window, self._labels, self._groups))
+        self.assertEqual(sorted(s['test_group'] for s in splits), [3, 5, 11])
+
+        for split in splits:
+            test = self._groups == split['test_group']
+            np.testing.assert_array_equal(split['test_data'], self._x[test])
+            np.testing.assert_array_equal(split['test_labels'],
+                                          self._labels[test])
+
+            # training rows are in group order
+            order = np.argsort(self._groups[~test], kind='stable')
+            np.testing.assert_array_equal(split['training_data'],
+                                          self._x[~test][order])
+            np.testing.assert_array_equal(split['training_labels'],
+                                          self._labels[~test][order])
+
+        # the test data of every split is a view of the same sorted rows
+        self.assertTrue(all(s['test_data'].base is splits[0]['test_data'].base
+                            for s in splits))
+
+    def test_unable_to_split(self) -> None:
+        with self.assertRaises(ValueError):
+            next(Classifier.leave_one_group_out(
+                self._per_frame, self._window, self._labels,
+                np.zeros_like(self._groups)))
+
+        labels = np.full_like(self._labels, TrackLabels.Label.BEHAVIOR)
+        with self.assertRaises(ValueError):
+            next(Classifier.leave_one_group_out(
+                self._per_frame, self._window, labels, self._groups))
+
+
+class TestWarmStart(unittest.TestCase):
+    """ test Classifier.train(warm_start=True) """
+
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self._x = rng.uniform(size=(1000, 4))
+        self._labels = np.where(self._x[:, 0] > 0.5,
+                                TrackLabels.Label.BEHAVIOR,
+                                TrackLabels.Label.NOT_BEHAVIOR)
+        # ten videos with 100 labeled frames each
+        self._sources = {f'{i}.avi': ('signature', 100) for i in range(10)}
+        self._classifier = self.train(self._sources, Classifier())
+
+    def train(self, sources, classifier):
+        classifier.train({
+            'training_data': self._x,
+            'training_labels': self._labels,
+            'sources': sources
+        }, 'behavior', 5, False, {}, None, random_seed=0, warm_start=True)
+        return classifier
+
+    def test_unchanged(self) -> None:
+        trees = list(self._classifier._classifier.estimators_)
+        self.train(dict(self._sources), self._classifier)
+        self.assertEqual(self._classifier._classifier.estimators_, trees)
+
+    def test_replaces_trees(self) -> None:
+        """ trees are replaced in proportion to the changed data """
+        estimator = self._classifier._classifier
+        trees = list(estimator.estimators_)
+        sources = dict(self._sources, **{'0.avi': ('changed', 100)})
+        self.train(sources, self._classifier)
+
+        self.assertIs(self._classifier._classifier, estimator)
+        self.assertEqual(len(estimator.estimators_), len(trees))
+        self.assertEqual(estimator.estimators_[:-10], trees[10:])
+        self.assertTrue(all(t not in trees
+                            for t in estimator.estimators_[-10:]))
+
+    def test_update_is_reproducible(self) -> None:
+        """ updating with the same seed grows the same trees """
+        sources = dict(self._sources, **{'0.avi': ('changed', 100)})
+        first = self.train(sources, self.train(self._sources, Classifier()))
+        second = self.train(sources, self.train(self._sources, Classifier()))
+        np.testing.assert_array_equal(
+            first._classifier.predict_proba(self._x),
+            second._classifier.predict_proba(self._x))
+
+    def test_retrains_after_large_change(self) -> None:
+        estimator = self._classifier._classifier
+        sources = dict(self._sources, **{'0.avi': ('changed', 100),
+                                         '1.avi': ('changed', 100)})
+        self.train(sources, self._classifier)
+        self.assertIsNot(self._classifier._classifier, estimator)
+
+        # other settings are always trained again
+        estimator = self._classifier._classifier
+        self._classifier.train({
+            'training_data': self._x,
+            'training_labels': self._labels,
+            'sources': sources
+        }, 'behavior', 10, False, {}, None, warm_start=True)
+        self.assertIsNot(self._classifier._classifier, estimator)
+
+
+class TestPredictWithProbability(unittest.TestCase):
+    """ test Classifier.predict_with_probability """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        rng = np.random.default_rng(0)
+        x = rng.uniform(size=(500, 4))
+        labels = np.where(x[:, 0] + rng.normal(0, 0.2, 500) > 0.5,
+                          TrackLabels.Label.BEHAVIOR,
+                          TrackLabels.Label.NOT_BEHAVIOR)
+        cls._x = rng.uniform(size=(2000, 4))
+        cls._classifier = Classifier()
+        cls._classifier.train({
+            'training_data': x,
+            'training_labels': labels
+        }, 'behavior', 5, False, {}, None, random_seed=0)
+
+    def test_matches_estimator(self) -> None:
+        """ the default threshold predicts the same as the estimator """
+        estimator = self._classifier._classifier
+        expected = estimator.predict(self._x)
+        prob = estimator.predict_proba(self._x)
+
+        predictions, probabilities = \
+            self._classifier.predict_with_probability(self._x)
+        np.testing.assert_array_equal(predictions, expected)
+        np.testing.assert_array_equal(
+            probabilities, prob[np.arange(len(prob)), expected])
+        np.testing.assert_array_equal(self._classifier.predict(self._x),
+                                      expected)
+
+    def test_threshold(self) -> None:
+        not_behavior_prob, behavior_prob = \
+            self._classifier._classifier.predict_proba(self._x).T
+        try:
+            self._classifier.threshold = 0.8
+            predictions, probabilities = \
+                self._classifier.predict_with_probability(self._x)
+        finally:
+            self._classifier.threshold = Classifier.DEFAULT_THRESHOLD
+
+        np.testing.assert_array_equal(
+            predictions == TrackLabels.Label.BEHAVIOR, behavior_prob > 0.8)
+        np.testing.assert_array_equal(
+            probabilities, np.where(behavior_prob > 0.8, behavior_prob,
+                                    not_behavior_prob))
+
+        with self.assertRaises(ValueError):
+            self._classifier.threshold = 1.5
@@ -0,0 +1,75 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from shapely.geometry import MultiPoint
+
+import src.pose_estimation
+from src.utils.geometry import (convex_hulls, hull_areas, hull_centroids,
+                                hull_distances, HullSequence)
+from tests.feature_modules.base import TestFeatureBase
+
+
+class TestGeometry(TestFeatureBase):
+
+    def test_random_hulls_match_shapely(self) -> None:
+        """
+        hulls of small integer grids have lots of duplicate and collinear
+        points, which produce degenerate hulls
+        """
+        rng = np.random.default_rng(0)
+        points = rng.integers(0, 6, (2000, 10, 2)).astype(np.uint16)
+        mask = rng.random((2000, 10)) > 0.3
+        mask[:20, 3:] = False
+
+        vertices, num_vertices = convex_hulls(points, mask)
+        centroids = hull_centroids(vertices, num_vertices)
+        areas = hull_areas(vertices, num_vertices)
+        sequence = HullSequence(vertices, num_vertices)
+        distances = hull_distances(vertices, num_vertices,
+                                   vertices[::-1], num_vertices[::-1])
+
+        hulls = [MultiPoint(p[m]).convex_hull if m.sum() >= 3 else None
+                 for p, m in zip(points, mask)]
+        for frame, hull in enumerate(hulls):
+            other = hulls[len(hulls) - frame - 1]
+            if hull is None:
+                self.assertEqual(num_vertices[frame], 0)
+                continue
+            if hull.geom_type == 'Polygon':
+                np.testing.assert_array_equal(
+                    vertices[frame, :num_vertices[frame]],
+                    np.asarray(hull.exterior.coords)[:-1])
+            self.assertEqual(tuple(centroids[frame]),
+                             (hull.centroid.x, hull.centroid.y))
+            self.assertEqual(areas[frame], hull.area)
+            self.assertTrue(sequence[frame].equals(hull))
+            if other is not None:
+                self.assertEqual(distances[frame], hull.distance(other))
+
+    def test_convex_hull_cache(self) -> None:
+        """ convex hulls read back from the cache match the computed hulls """
+        pose_path = self._tmpdir_path / 'sample_pose_est_v5.h5'
+        with tempfile.TemporaryDirectory() as cache_dir:
+            poses = src.pose_estimation.open_pose_file(pose_path,
+                                                       Path(cache_dir))
+            expected = poses.get_identity_convex_hull_arrays(0)
+            expected_centroids = poses.get_identity_hull_centroids(0)
+
+            cached = src.pose_estimation.open_pose_file(pose_path,
+                                                        Path(cache_dir))
+            vertices, num_vertices = cached.get_identity_convex_hull_arrays(0)
+            np.testing.assert_array_equal(vertices, expected[0])
+            np.testing.assert_array_equal(num_vertices, expected[1])
+            np.testing.assert_array_equal(
+                cached.get_identity_hull_centroids(0), expected_centroids)
+
+            hulls = cached.get_identity_convex_hulls(0)
+            self.assertEqual(len(hulls), cached.num_frames)
+            for frame in range(0, cached.num_frames, 100):
+                if num_vertices[frame] == 0:
+                    self.assertIsNone(hulls[frame])
+                else:
+                    self.assertEqual(
+                        (hulls[frame].centroid.x, hulls[frame].centroid.y),
+                        tuple(expected_centroids[frame]))
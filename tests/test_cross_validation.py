@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+from src.classifier import ClassifierType
+from src.classifier.cross_validation import budget_cores, cross_validate
+from src.project.track_labels import TrackLabels
+
+
+class TestCrossValidation(unittest.TestCase):
+    """ test classifier.cross_validation """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # four groups, each with enough labels of both classes, where the
+        # first feature separates the classes
+        rng = np.random.default_rng(0)
+        cls._labels = np.tile(np.repeat(
+            [TrackLabels.Label.NOT_BEHAVIOR, TrackLabels.Label.BEHAVIOR], 30),
+            4)
+        cls._groups = np.repeat(np.arange(4), 60)
+        cls._per_frame = {
+            'feature': np.column_stack((
+                cls._labels + rng.uniform(-0.2, 0.2, len(cls._labels)),
+                rng.uniform(size=len(cls._labels))))
+        }
+        cls._window = {'window_feature': {
+            'mean': rng.uniform(size=len(cls._labels))}}
+
+    def cross_validate(self, k=None, processes=None):
+        return list(cross_validate(ClassifierType.RANDOM_FOREST,
+                                   self._per_frame, self._window, self._labels,
+                                   self._groups, k, processes))
+
+    def test_parallel_folds(self) -> None:
+        """ every fold is run, and each result is for its own test group """
+        for processes in [1, 2]:
+            results = self.cross_validate(processes=processes)
+            self.assertEqual(sorted(r['fold'] for r in results),
+                             list(range(4)))
+            self.assertEqual(sorted(r['test_group'] for r in results),
+                             list(range(4)))
+            for r in results:
+                self.assertEqual(r['accuracy'], 1.0)
+                self.assertEqual(r['confusion'].sum(), 60)
+                self.assertEqual(len(r['feature_importances']), 3)
+
+    def test_k(self) -> None:
+        results = self.cross_validate(k=2, processes=2)
+        self.assertEqual(sorted(r['fold'] for r in results), [0, 1])
+
+    def test_unable_to_split(self) -> None:
+        with self.assertRaises(ValueError):
+            list(cross_validate(ClassifierType.RANDOM_FOREST, self._per_frame,
+                                self._window, self._labels,
+                                np.zeros_like(self._groups)))
+
+    def test_budget_cores(self) -> None:
+        self.assertEqual(budget_cores(10, 32), (10, 3))
+        self.assertEqual(budget_cores(10, 4), (4, 1))
+        self.assertEqual(budget_cores(1, 8), (1, 8))
+
+        # the number of concurrent folds is limited by memory, and the cores
+        # go to the estimators instead
+        self.assertEqual(budget_cores(10, 32, fold_bytes=100, memory=450),
+                         (4, 8))
+        self.assertEqual(budget_cores(10, 32, fold_bytes=100, memory=50),
+                         (1, 32))
@@ -0,0 +1,48 @@
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.utils import hash_file, hash_file_cached, utilities
+
+
+class TestHashFile(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._path = Path(self._tmpdir.name) / 'pose_est_v3.h5'
+        self._contents = os.urandom(3 * 1024 * 1024 + 17)
+        self._path.write_bytes(self._contents)
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_hash_file(self) -> None:
+        expected = hashlib.blake2b(self._contents, digest_size=20).hexdigest()
+        self.assertEqual(hash_file(self._path), expected)
+
+    def test_memo_is_persisted(self) -> None:
+        memo_dir = Path(self._tmpdir.name) / 'cache'
+        expected = hash_file(self._path)
+        self.assertEqual(hash_file_cached(self._path, memo_dir), expected)
+
+        # a saved memo with a matching stat key is used without reading the
+        # file again
+        memo_path = memo_dir / 'file_hashes' / 'pose_est_v3.h5.json'
+        memo = json.loads(memo_path.read_text())
+        memo['hash'] = 'from memo'
+        memo_path.write_text(json.dumps(memo))
+        utilities._hash_memo.clear()
+        self.assertEqual(hash_file_cached(self._path, memo_dir), 'from memo')
+
+    def test_modified_file_is_rehashed(self) -> None:
+        memo_dir = Path(self._tmpdir.name) / 'cache'
+        hash_file_cached(self._path, memo_dir)
+
+        contents = b'modified' + self._contents
+        self._path.write_bytes(contents)
+        self.assertEqual(
+            hash_file_cached(self._path, memo_dir),
+            hashlib.blake2b(contents, digest_size=20).hexdigest())
@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from src.project.labeled_feature_cache import LabeledFeatureCache
+
+
+class TestLabeledFeatureCache(unittest.TestCase):
+    """ test project.labeled_feature_cache.LabeledFeatureCache """
+
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._path = Path(self._tmpdir.name) / 'labeled_features.h5'
+
+        rng = np.random.default_rng(0)
+        self._identities = [
+            (identity, {'angles': rng.uniform(size=(n, 3)).astype(np.float32)},
+             {'angles': {'mean': rng.uniform(size=(n, 3)),
+                         'max': rng.uniform(size=(n, 3))}},
+             rng.integers(1, 3, n))
+            for identity, n in [(0, 10), (2, 0)]
+        ]
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def assert_identities_equal(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for (identity, per_frame, window, labels), expected_identity in zip(
+                actual, expected):
+            self.assertEqual(identity, expected_identity[0])
+            for feature, values in expected_identity[1].items():
+                np.testing.assert_array_equal(per_frame[feature], values)
+            for feature, ops in expected_identity[2].items():
+                for op, values in ops.items():
+                    np.testing.assert_array_equal(window[feature][op], values)
+            np.testing.assert_array_equal(labels, expected_identity[3])
+
+    def test_save_and_load(self) -> None:
+        cache = LabeledFeatureCache(self._path, 'key')
+        self.assertIsNone(cache.get('a.avi', 'signature'))
+
+        cache.put('a.avi', 'signature', self._identities)
+        cache.put('b.avi', 'signature', self._identities[:1])
+        cache.column_names = ['x', 'y', 'z']
+        cache.save(['a.avi', 'b.avi'])
+
+        loaded = LabeledFeatureCache(self._path, 'key')
+        self.assertEqual(loaded.column_names, ['x', 'y', 'z'])
+        self.assert_identities_equal(loaded.get('a.avi', 'signature'),
+                                     self._identities)
+        self.assertIsNone(loaded.get('a.avi', 'changed signature'))
+
+        # videos no longer in the project are removed from the file
+        loaded.save(['a.avi'])
+        loaded = LabeledFeatureCache(self._path, 'key')
+        self.assertIsNone(loaded.get('b.avi', 'signature'))
+        self.assertIsNotNone(loaded.get('a.avi', 'signature'))
+
+    def test_other_key(self) -> None:
+        cache = LabeledFeatureCache(self._path, 'key')
+        cache.put('a.avi', 'signature', self._identities)
+        cache.save(['a.avi'])
+
+        cache = LabeledFeatureCache(self._path, 'other key')
+        self.assertIsNone(cache.get('a.avi', 'signature'))
+        cache.put('b.avi', 'signature', self._identities)
+        cache.save(['a.avi', 'b.avi'])
+
+        cache = LabeledFeatureCache(self._path, 'other key')
+        self.assertIsNone(cache.get('a.avi', 'signature'))
+        self.assertIsNotNone(cache.get('b.avi', 'signature'))
+
+    def test_other_key_column_names(self) -> None:
+        """ column names saved with another key are not used """
+        cache = LabeledFeatureCache(self._path, 'key')
+        cache.put('a.avi', 'signature', self._identities)
+        cache.column_names = ['x', 'y', 'z']
+        cache.save(['a.avi'])
+
+        cache = LabeledFeatureCache(self._path, 'other key')
+        self.assertIsNone(cache.column_names)
+        cache.put('a.avi', 'signature', self._identities)
+        cache.save(['a.avi'])
+        self.assertIsNone(LabeledFeatureCache(self._path,
+                                              'other key').column_names)
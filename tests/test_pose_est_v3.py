@@ -0,0 +1,111 @@
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+import src.pose_estimation
+from src.pose_estimation import pose_est
+
+
+class TestPoseEstimationV3Tracks(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._tmpdir = tempfile.TemporaryDirectory()
+        cls._path = Path(cls._tmpdir.name) / 'tracks_pose_est_v3.h5'
+
+        # track 1 ends at frame 2 and returns at frame 4, which keeps its
+        # original identity even though track 3 was given that identity
+        track_ids = [[1, 2], [1, 2], [2, 0], [3, 2], [3, 1], [4, 0]]
+        instance_count = [2, 2, 1, 2, 2, 1]
+
+        rng = np.random.default_rng(0)
+        cls._points = rng.integers(0, 800, (6, 2, 12, 2), dtype=np.uint16)
+        with h5py.File(cls._path, 'w') as pose_h5:
+            group = pose_h5.create_group('poseest')
+            group.attrs['version'] = np.array([3, 0], dtype=np.uint16)
+            group.create_dataset('points', data=cls._points)
+            group.create_dataset('confidence',
+                                 data=np.ones((6, 2, 12), dtype=np.float32))
+            group.create_dataset('instance_count',
+                                 data=np.array(instance_count, dtype=np.uint8))
+            group.create_dataset('instance_track_id',
+                                 data=np.array(track_ids, dtype=np.uint32))
+
+        cls._pose_est = src.pose_estimation.open_pose_file(cls._path)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls._tmpdir.cleanup()
+
+    def test_identity_assignment(self) -> None:
+        self.assertEqual(self._pose_est.identities, [0, 1])
+        self.assertEqual(
+            {int(k): v for k, v in self._pose_est._identity_map.items()},
+            {1: 0, 2: 1, 3: 0, 4: 0})
+
+    def test_track_points(self) -> None:
+        """ track 2 is present in frames 0-3, always as instance 1 or 0 """
+        points, mask = self._pose_est.get_identity_poses(1)
+        expected = [self._points[0, 1], self._points[1, 1],
+                    self._points[2, 0], self._points[3, 1]]
+        np.testing.assert_array_equal(points[:4], expected)
+        np.testing.assert_array_equal(mask[:4], 1)
+        np.testing.assert_array_equal(
+            self._pose_est.identity_mask(1), [1, 1, 1, 1, 0, 0])
+        np.testing.assert_array_equal(
+            self._pose_est.identity_to_track[1], [2, 2, 2, 2, -1, -1])
+
+    def test_read_from_cache(self) -> None:
+        """ the cached pose arrays are memory mapped and match the source """
+        cache_dir = Path(self._tmpdir.name) / 'cache'
+        cache_dir.mkdir()
+        PoseEstimationV3 = src.pose_estimation.PoseEstimationV3
+        PoseEstimationV3(self._path, cache_dir)
+        cached = PoseEstimationV3(self._path, cache_dir)
+
+        self.assertIsInstance(cached._points.base, np.memmap)
+        for identity in self._pose_est.identities:
+            points, mask = cached.get_identity_poses(identity)
+            expected_points, expected_mask = \
+                self._pose_est.get_identity_poses(identity)
+            np.testing.assert_array_equal(points, expected_points)
+            np.testing.assert_array_equal(mask, expected_mask)
+            np.testing.assert_array_equal(
+                cached.identity_to_track[identity],
+                self._pose_est.identity_to_track[identity])
+
+    def test_scaled_poses_are_shared(self) -> None:
+        scale = np.float32(0.5)
+        points, _ = self._pose_est.get_identity_poses(0, scale)
+        self.assertIs(self._pose_est.get_identity_poses(0, scale)[0], points)
+        self.assertEqual(points.dtype, np.float32)
+        np.testing.assert_array_equal(
+            points, self._pose_est.get_identity_poses(0)[0] * scale)
+        self.assertEqual(self._pose_est.get_identity_poses(0, 0.5)[0].dtype,
+                         np.float64)
+
+
+class TestWriteH5Atomic(unittest.TestCase):
+
+    def test_file_in_use_is_kept(self) -> None:
+        """
+        a file that can't be replaced because it is in use is kept, and the
+        temporary file is removed
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'cache.h5'
+            with h5py.File(path, 'w') as h5:
+                h5.attrs['value'] = 1
+
+            with unittest.mock.patch('os.replace',
+                                     side_effect=PermissionError):
+                with pose_est._write_h5_atomic(path) as h5:
+                    h5.attrs['value'] = 2
+
+            with h5py.File(path, 'r') as h5:
+                self.assertEqual(h5.attrs['value'], 1)
+            self.assertEqual(list(Path(tmpdir).glob('*.tmp')), [])
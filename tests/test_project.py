@@ -79,6 +79,8 @@ class TestProject(unittest.TestCase):
     def test_create(self):
         """ test creating a new empty Project """
         project_dir = Path('test_project_dir')
+        # remove the project dir even if the test fails
+        self.addCleanup(shutil.rmtree, project_dir, ignore_errors=True)
         _ = Project(project_dir)
 
         # make sure that the empty project directory was created
@@ -95,9 +97,6 @@ class TestProject(unittest.TestCase):
         self.assertTrue(
             (project_dir / Project._PROJ_DIR / 'predictions').exists())
 
-        # remove project dir
-        shutil.rmtree(project_dir)
-
     def test_get_video_list(self):
         """ get list of video files in an existing project """
         self.assertListEqual(self.project.videos, self._FILENAMES)